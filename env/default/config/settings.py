@@ -154,6 +154,112 @@ LOCALE_PATHS = (
 FILE_UPLOAD_HANDLERS = (
     'django.core.files.uploadhandler.TemporaryFileUploadHandler',
 )
+# largest accepted EDI upload in bytes (partner portal and API). Uploads are streamed to disk, so this bounds disk use, not memory.
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 100 * 1024 * 1024))
+# resumable partner uploads (sent in chunks, resumed after a dropped connection): largest file, and hours before an idle upload expires.
+RESUMABLE_UPLOAD_MAX_SIZE = int(os.environ.get('RESUMABLE_UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024))
+RESUMABLE_UPLOAD_TTL_HOURS = 24
+# what to do with a resent interchange (same sender/receiver/control number) or identical file from a partner:
+# 'reject' it, 'link' it to the original without storing a copy, or 'flag' it (stored with duplicate_of set).
+DUPLICATE_INTERCHANGE_ACTION = 'flag'
+# control numbers are only compared within this many days, as they wrap and get reused.
+DUPLICATE_INTERCHANGE_WINDOW_DAYS = 90
+# segment values of uploads up to this many bytes are indexed during the upload; larger files by 'manage.py update_search_index'.
+SEGMENT_INDEX_REQUEST_MAX_BYTES = 10 * 1024 * 1024
+
+# *********acknowledgments*************************
+# check_acknowledgments applies 997/999, CONTRL and APERAK messages received by bots since its last run, matched to
+# sent transactions on the envelope control numbers recorded when they were sent. ta rows are read this many at a time.
+ACK_RECONCILE_BATCH_SIZE = 500
+# bots messagetype prefixes that are acknowledgments
+ACK_MESSAGE_TYPES = ('997', '999', 'CONTRL', 'APERAK')
+# an unreadable acknowledgment file is retried on every run until its ta row is this old, then skipped with an error.
+ACK_READ_RETRY_SECONDS = 3600
+# check_acknowledgments --daemon keeps running: every ACK_DAEMON_MIN_INTERVAL seconds while acknowledgments arrive or
+# sends of the last ACK_DAEMON_ACTIVE_WINDOW seconds await one, backing off to ACK_DAEMON_MAX_INTERVAL when idle.
+# Daemons on several nodes share a lease, renewed before every batch; only its holder checks. Another takes over
+# ACK_DAEMON_LEASE_SECONDS after the holder is lost, or at its next check (every ACK_DAEMON_MAX_INTERVAL) after a
+# clean shutdown. The lease must be at least twice the max interval and longer than one batch takes.
+ACK_DAEMON_MIN_INTERVAL = 2
+ACK_DAEMON_MAX_INTERVAL = 30
+ACK_DAEMON_ACTIVE_WINDOW = 900
+ACK_DAEMON_LEASE_SECONDS = 90
+
+# *********file downloads*************************
+# Let the front proxy send file bodies: None (serve from django), 'x-accel-redirect' (nginx) or 'x-sendfile' (apache/lighttpd).
+FILE_SERVE_BACKEND = os.environ.get('FILE_SERVE_BACKEND') or None
+# nginx only: local directory -> internal location, eg {BOTSSYS: '/protected/botssys/'}. Files outside these are served by django.
+FILE_SERVE_ACCEL_LOCATIONS = {}
+
+# *********cache*************************
+# API key and partner session lookups are cached here. The default cache is per process; with several
+# worker processes a shared backend (redis/memcached) also lets it hold the rate-limit counters.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+# seconds a resolved API key is cached. Changes to a key or its permissions drop the entry in the process that made
+# them; with the per-process default cache other workers may use the old copy for up to this long.
+API_KEY_CACHE_TTL = 60
+# partner portal: seconds a signed-in partner user (with partner and permissions) is cached. As above, edits and lockouts
+# reach other workers only after this long unless the cache is shared.
+# last_activity in the session is rewritten at most every PARTNER_ACTIVITY_UPDATE_INTERVAL seconds.
+PARTNER_SESSION_CACHE_TTL = 30
+PARTNER_ACTIVITY_UPDATE_INTERVAL = 60
+
+# *********rate limits*************************
+# Counters for API key and Modern EDI API limits. 'cache': the RATE_LIMIT_CACHE cache (needs redis/memcached with
+# several workers or hosts); 'sqlite': a counter file shared by the processes of this host (RATE_LIMIT_SQLITE_PATH,
+# default botssys/ratelimit.sqlite3); 'auto': cache, or sqlite when that cache is per process.
+RATE_LIMIT_STORE = 'auto'
+RATE_LIMIT_CACHE = 'default'
+# Modern EDI API: requests per user and endpoint class, as 'count/period' (s, m, h, d). Endpoints are put in a
+# class by URL name; others are 'default'. MODERN_EDI_RATE_LIMIT_USERS overrides rates per username,
+# e.g. {'integration': {'default': '600/m'}}.
+MODERN_EDI_RATE_LIMITS = {
+    'default': '60/m',
+    'export': '10/m',
+    'search': '30/m',
+}
+MODERN_EDI_RATE_LIMIT_CLASSES = {
+    'export_transactions': 'export',
+    'search_transactions': 'search',
+    'search_segments': 'search',
+}
+MODERN_EDI_RATE_LIMIT_USERS = {}
+
+# *********profiling*************************
+# With usersys.modern_edi_middleware.ProfilingMiddleware in MIDDLEWARE, request time, query count and time, response size
+# and cache hits per URL name are served at /modern-edi/api/v1/admin/metrics (Prometheus text format). Scrapers may
+# authenticate with 'Authorization: Bearer <METRICS_TOKEN>' (empty: staff session only). Requests slower than
+# PROFILING_SLOW_REQUEST_MS are kept (last PROFILING_SLOW_LOG_SIZE per process) at .../admin/metrics/slow-requests,
+# with their SQL for the fraction PROFILING_SLOW_SAMPLE_RATE of requests.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+PROFILING_SLOW_REQUEST_MS = 1000
+PROFILING_SLOW_SAMPLE_RATE = 1.0
+PROFILING_SLOW_LOG_SIZE = 50
+# Pipeline gauges (folder depths, oldest outbox item, last SFTP polls) and the dashboard system status are re-read
+# from the database at most every METRICS_REFRESH_SECONDS.
+METRICS_REFRESH_SECONDS = 15
+
+# *********audit logging*************************
+# Activity and API audit rows are queued and written by a background thread with bulk inserts:
+# every AUDIT_BUFFER_BATCH_SIZE rows or AUDIT_BUFFER_FLUSH_MS milliseconds. When AUDIT_BUFFER_QUEUE_SIZE rows are waiting,
+# a request waits up to AUDIT_BUFFER_BLOCK_MS and then writes its row itself. False: write each row during the request.
+AUDIT_BUFFER_ENABLED = True
+AUDIT_BUFFER_BATCH_SIZE = 200
+AUDIT_BUFFER_FLUSH_MS = 500
+AUDIT_BUFFER_QUEUE_SIZE = 10000
+AUDIT_BUFFER_BLOCK_MS = 50
+# Monthly partitions for activity and API audit logs, maintained by 'manage.py partition_logs' (run it daily).
+# PostgreSQL: native partitions, convert once with --convert. SQLite: months older than LOG_PARTITION_HOT_MONTHS move to
+# one file per month in LOG_ARCHIVE_DIR (default botssys/logarchive). Retention then drops whole months.
+LOG_PARTITIONING = False
+LOG_PARTITION_MONTHS_AHEAD = 3
+LOG_PARTITION_HOT_MONTHS = 2
+LOG_ARCHIVE_DIR = None
 
 # Application definition
 INSTALLED_APPS = [
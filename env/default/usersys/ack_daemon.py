@@ -0,0 +1,174 @@
+"""
+Acknowledgment Daemon
+Long-running acknowledgment reconciliation with adaptive polling
+
+Instead of a cron job paying Django start-up on every run, one process keeps
+running AckReconciler passes. It polls every ACK_DAEMON_MIN_INTERVAL seconds
+while acknowledgments are arriving or sends from the last
+ACK_DAEMON_ACTIVE_WINDOW seconds still wait for one, and doubles the wait up
+to ACK_DAEMON_MAX_INTERVAL when idle.
+
+The daemon may run on several nodes: they compete for a LeaderLease row and
+only the holder reconciles. It renews the lease before every batch of a
+pass and stops as soon as a renewal fails, so two nodes only reconcile at
+the same time if a single batch outlasts ACK_DAEMON_LEASE_SECONDS (which
+SQLite, ignoring the checkpoint row lock, would not catch). The others check
+back every ACK_DAEMON_MAX_INTERVAL seconds and take over once the lease runs
+out, or at their next check when the leader shuts down cleanly
+(SIGTERM/SIGINT finish the current batch and release the lease).
+"""
+
+import os
+import time
+import socket
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .ack_reconciler import AckReconciler
+from .metrics import registry
+from .modern_edi_models import EDITransaction, LeaderLease
+
+
+logger = logging.getLogger('modern_edi.acknowledgment')
+
+LEASE_NAME = 'ack_daemon'
+
+DEFAULT_MIN_INTERVAL = 2
+DEFAULT_MAX_INTERVAL = 30
+DEFAULT_LEASE_SECONDS = 90
+DEFAULT_ACTIVE_WINDOW = 900
+
+BACKOFF_FACTOR = 2
+
+LEADER = registry.gauge('edi_ack_daemon_leader', 'Whether this process holds the reconciler lease')
+POLL_INTERVAL = registry.gauge('edi_ack_daemon_interval_seconds', 'Current wait between reconciler passes')
+LAST_PASS = registry.gauge(
+    'edi_ack_daemon_last_pass_timestamp_seconds', 'Unix time the last reconciler pass finished'
+)
+PASS_SECONDS = registry.histogram('edi_ack_daemon_pass_seconds', 'Duration of reconciler passes')
+PASS_ERRORS = registry.counter('edi_ack_daemon_errors_total', 'Reconciler passes that failed')
+
+
+def default_holder():
+    """Lease holder name of this process"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class AckDaemon:
+    """
+    Run reconciler passes until stopped
+    
+    Args:
+        min_interval: Seconds between passes while busy
+        max_interval: Longest wait when idle
+        lease_seconds: Lease time; must be well above max_interval
+        holder: Name of this node in the lease
+    """
+    
+    def __init__(self, min_interval=None, max_interval=None, lease_seconds=None, holder=None):
+        self.min_interval = min_interval or getattr(settings, 'ACK_DAEMON_MIN_INTERVAL', DEFAULT_MIN_INTERVAL)
+        self.max_interval = max_interval or getattr(settings, 'ACK_DAEMON_MAX_INTERVAL', DEFAULT_MAX_INTERVAL)
+        self.lease_seconds = lease_seconds or getattr(settings, 'ACK_DAEMON_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)
+        self.active_window = getattr(settings, 'ACK_DAEMON_ACTIVE_WINDOW', DEFAULT_ACTIVE_WINDOW)
+        self.holder = holder or default_holder()
+        
+        if not 0 < self.min_interval <= self.max_interval:
+            raise ImproperlyConfigured("ACK_DAEMON_MIN_INTERVAL must be positive and not above ACK_DAEMON_MAX_INTERVAL")
+        if self.lease_seconds < 2 * self.max_interval:
+            raise ImproperlyConfigured("ACK_DAEMON_LEASE_SECONDS must be at least twice ACK_DAEMON_MAX_INTERVAL")
+        
+        self.interval = self.min_interval
+        self.leading = False
+        self._stop = threading.Event()
+    
+    def stop(self, *args):
+        """Finish the current pass and exit (usable as a signal handler)"""
+        self._stop.set()
+    
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+    
+    def renew(self):
+        """
+        Take or renew the lease; also called before every batch
+        
+        Returns:
+            bool: Whether to go on (False when the lease is lost or the
+            daemon is stopping)
+        """
+        self.leading = LeaderLease.acquire(LEASE_NAME, self.holder, self.lease_seconds)
+        LEADER.set(1 if self.leading else 0)
+        return self.leading and not self.stopped
+    
+    def follow(self):
+        """Wait time while another node leads"""
+        self.interval = self.min_interval
+        return self.max_interval
+    
+    def has_recent_sends(self):
+        """Whether recent sends are still waiting for an acknowledgment"""
+        return EDITransaction.objects.filter(
+            folder='sent',
+            sent_at__gte=timezone.now() - timedelta(seconds=self.active_window),
+            acknowledgment_status__isnull=True
+        ).exists()
+    
+    def next_interval(self, result):
+        """Poll fast while acknowledgments are due, back off while idle"""
+        if result['read'] or self.has_recent_sends():
+            return self.min_interval
+        return min(self.max_interval, self.interval * BACKOFF_FACTOR)
+    
+    def run_once(self):
+        """
+        Take or renew the lease and, when leading, run one pass
+        
+        Returns:
+            float: Seconds to wait before the next call
+        """
+        if not self.renew():
+            return self.follow()
+        
+        started = time.monotonic()
+        result = AckReconciler.run(proceed=self.renew)
+        PASS_SECONDS.observe(time.monotonic() - started)
+        LAST_PASS.set(time.time())
+        if result['acknowledged'] or result['unmatched']:
+            logger.info(f"Acknowledgment pass: {result}")
+        if not self.leading:
+            logger.warning(f"Acknowledgment lease lost during a pass, stopped at ta {result['position']}")
+            return self.follow()
+        
+        self.interval = self.next_interval(result)
+        POLL_INTERVAL.set(self.interval)
+        return self.interval
+    
+    def run(self):
+        """Loop until stop() is called, then release the lease"""
+        logger.info(f"Acknowledgment daemon started as {self.holder}")
+        try:
+            while not self.stopped:
+                # Drop connections the database closed while we slept
+                close_old_connections()
+                try:
+                    wait = self.run_once()
+                except Exception as e:
+                    PASS_ERRORS.inc()
+                    logger.error(f"Acknowledgment pass failed: {str(e)}")
+                    wait = self.max_interval
+                self._stop.wait(wait)
+        finally:
+            try:
+                LeaderLease.release(LEASE_NAME, self.holder)
+            except Exception as e:
+                logger.warning(f"Could not release the acknowledgment lease: {str(e)}")
+            LEADER.set(0)
+            close_old_connections()
+            logger.info("Acknowledgment daemon stopped")
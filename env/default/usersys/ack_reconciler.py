@@ -0,0 +1,323 @@
+"""
+Acknowledgment Reconciler
+Apply 997/999, CONTRL and APERAK acknowledgments received by bots to sent transactions
+
+Bots writes a ta row for every message it splits out of an incoming file.
+Each pass reads the acknowledgment rows added since the idta high-water mark
+kept in ProcessingCheckpoint, parses their files for the envelopes they
+acknowledge, and matches those to sent transactions through the control
+numbers recorded at send time (control_numbers, one composite index). Status
+changes are written with one bulk update and one bulk history insert per
+batch, so a pass costs in proportion to the acknowledgments that arrived, not
+to the number of transactions still waiting for one.
+
+An acknowledgment file that cannot be read stops the batch before its row,
+so the checkpoint stays there and the next pass tries again. Only once the
+row is older than ACK_READ_RETRY_SECONDS is it skipped, with an error, so a
+file bots has already cleaned up does not hold reconciliation back forever.
+
+A 997 names the functional group (AK102, the GS06 it answers). Transactions
+sent before group numbers were recorded are matched on their interchange
+control number instead, which is the same number in envelopes written by
+bots.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .control_numbers import ControlNumberIndex
+from .edi_parser import EDIParser
+from .modern_edi_models import EDITransaction, TransactionHistory, ProcessingCheckpoint
+from . import pipeline_metrics
+
+
+logger = logging.getLogger('modern_edi.acknowledgment')
+
+CHECKPOINT_NAME = 'ack_reconciler'
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MESSAGE_TYPES = ('997', '999', 'CONTRL', 'APERAK')
+DEFAULT_READ_RETRY_SECONDS = 3600
+
+# AK901 functional group acknowledgment codes
+X12_STATUS = {
+    'A': 'accepted',
+    'E': 'accepted',
+    'P': 'partial',
+    'R': 'rejected',
+    'M': 'rejected',
+    'W': 'rejected',
+    'X': 'rejected',
+}
+
+# UCI04 action codes
+CONTRL_STATUS = {'4': 'rejected', '7': 'accepted', '8': 'received'}
+
+
+def _element(elements, index):
+    return elements[index].strip() if len(elements) > index else ''
+
+
+def parse_acknowledgments(content, parser=None):
+    """
+    Read the acknowledged envelopes from an acknowledgment file
+    
+    Args:
+        content: X12 997/999 or EDIFACT CONTRL/APERAK interchange
+        parser: EDIParser used to tokenize the content
+    
+    Returns:
+        list: dicts with key (ControlNumberIndex.key() of the acknowledged
+        envelope), status and message; 997/999 add fallback, the key at
+        interchange level
+    """
+    parser = parser or EDIParser()
+    delimiters = parser.get_delimiters(content)
+    if not delimiters:
+        return []
+    component = delimiters['component']
+    key = ControlNumberIndex.key
+    
+    acks = []
+    sender = receiver = group_sender = group_receiver = message_type = reference = ''
+    errors = []
+    for offset, tag, elements in parser.iter_segments(content):
+        # The acknowledgment travels back, so its envelope is swapped in the keys
+        if tag == 'ISA':
+            sender, receiver = _element(elements, 5), _element(elements, 7)
+        elif tag == 'GS':
+            group_sender, group_receiver = _element(elements, 1), _element(elements, 2)
+        elif tag == 'UNB':
+            sender = _element(elements, 1).split(component)[0]
+            receiver = _element(elements, 2).split(component)[0]
+        elif tag in ('ST', 'UNH'):
+            message_type = _element(elements, 0 if tag == 'ST' else 1).split(component)[0]
+            reference, errors = '', []
+        
+        # X12 997/999: AK1 names the group, AK9 gives the outcome
+        elif tag == 'AK1':
+            reference = _element(elements, 1)
+        elif tag == 'AK9' and reference:
+            code = _element(elements, 0)
+            acks.append({
+                'key': key('group', group_receiver, group_sender, reference),
+                'fallback': key('interchange', receiver, sender, reference),
+                'status': X12_STATUS.get(code, 'rejected'),
+                'message': (
+                    f"{message_type} {code}: {_element(elements, 3) or 0} of "
+                    f"{_element(elements, 1) or 0} transaction sets accepted"
+                ),
+            })
+        
+        # CONTRL: UCI carries the original interchange reference, sender and recipient
+        elif tag == 'UCI':
+            action = _element(elements, 3)
+            acks.append({
+                'key': key(
+                    'interchange',
+                    _element(elements, 1).split(component)[0] or receiver,
+                    _element(elements, 2).split(component)[0] or sender,
+                    _element(elements, 0)
+                ),
+                'status': CONTRL_STATUS.get(action, 'rejected'),
+                'message': f"CONTRL action {action}",
+            })
+        
+        # APERAK: RFF+ACW references the message, ERC lists application errors
+        elif tag == 'RFF' and message_type == 'APERAK':
+            qualifier, _, value = _element(elements, 0).partition(component)
+            if qualifier == 'ACW':
+                reference = value
+        elif tag == 'ERC' and message_type == 'APERAK':
+            errors.append(_element(elements, 0).split(component)[0])
+        elif tag == 'UNT' and message_type == 'APERAK' and reference:
+            acks.append({
+                'key': key('message', receiver, sender, reference),
+                'status': 'rejected' if errors else 'accepted',
+                'message': f"APERAK errors {', '.join(errors)}" if errors else 'APERAK',
+            })
+    return acks
+
+
+class AckReconciler:
+    """Apply acknowledgments from the bots ta table, in batches from a high-water mark"""
+    
+    @staticmethod
+    def run(batch_size=None, proceed=None):
+        """
+        Apply the acknowledgments bots received since the last pass
+        
+        Passes may run concurrently; they take turns on the checkpoint row
+        (on databases with row locks; SQLite ignores select_for_update).
+        
+        Args:
+            batch_size: ta rows per batch (default ACK_RECONCILE_BATCH_SIZE)
+            proceed: Called before every batch after the first; when it
+                returns False the pass stops and the rest is left for the next
+        
+        Returns:
+            dict: read (acknowledgments parsed), acknowledged (transactions
+            updated), unmatched and position (idta high-water mark)
+        """
+        from bots.models import ta
+        from bots.botsconfig import SPLITUP
+        
+        batch_size = batch_size or getattr(settings, 'ACK_RECONCILE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        message_types = getattr(settings, 'ACK_MESSAGE_TYPES', DEFAULT_MESSAGE_TYPES)
+        is_ack = Q()
+        for message_type in message_types:
+            is_ack |= Q(messagetype__startswith=message_type)
+        
+        # Fixed end of this pass, so the mark also moves past other messages
+        top = ta.objects.aggregate(top=Max('idta'))['top'] or 0
+        
+        totals = {'read': 0, 'acknowledged': 0, 'unmatched': 0, 'position': 0}
+        first = True
+        while True:
+            if not first and proceed is not None and not proceed():
+                break
+            first = False
+            with transaction.atomic():
+                checkpoint = ProcessingCheckpoint.locked(CHECKPOINT_NAME)
+                if checkpoint.position >= top:
+                    totals['position'] = checkpoint.position
+                    break
+                
+                rows = list(
+                    ta.objects.filter(idta__gt=checkpoint.position, idta__lte=top, status=SPLITUP)
+                    .filter(is_ack)
+                    .order_by('idta')
+                    .values('idta', 'filename', 'ts')[:batch_size]
+                )
+                acks, unread = AckReconciler.read(rows)
+                result = AckReconciler.apply(acks)
+                
+                if unread is not None:
+                    # Retry from the unreadable row next pass
+                    checkpoint.position = unread - 1
+                elif len(rows) == batch_size:
+                    checkpoint.position = rows[-1]['idta']
+                else:
+                    checkpoint.position = top
+                checkpoint.save(update_fields=['position', 'updated_at'])
+            
+            totals['read'] += len(acks)
+            totals['acknowledged'] += result['acknowledged']
+            totals['unmatched'] += result['unmatched']
+            totals['position'] = checkpoint.position
+            if unread is not None:
+                break
+        return totals
+    
+    @staticmethod
+    def read(rows, parser=None):
+        """
+        Parse the files of acknowledgment ta rows
+        
+        Messages split from the same file share it, so each file is read once.
+        Reading stops at the first file that cannot be read, unless its row
+        is older than ACK_READ_RETRY_SECONDS; then the row is skipped.
+        
+        Args:
+            rows: dicts with idta, filename and ts
+        
+        Returns:
+            tuple: (parse_acknowledgments() results with idta and received_at,
+            idta of the row reading stopped at or None)
+        """
+        from bots import botslib
+        
+        parser = parser or EDIParser()
+        give_up = timezone.now() - timedelta(
+            seconds=getattr(settings, 'ACK_READ_RETRY_SECONDS', DEFAULT_READ_RETRY_SECONDS)
+        )
+        acks = []
+        seen = set()
+        for row in rows:
+            if row['filename'] in seen:
+                continue
+            try:
+                with open(botslib.abspathdata(row['filename']), encoding='utf-8', errors='replace') as f:
+                    content = f.read()
+            except OSError as e:
+                if row['ts'] and row['ts'] < give_up:
+                    logger.error(f"Skipping acknowledgment file of ta {row['idta']}, unreadable: {e}")
+                    continue
+                logger.warning(f"Cannot read acknowledgment file of ta {row['idta']}, retrying next pass: {e}")
+                return acks, row['idta']
+            seen.add(row['filename'])
+            
+            for ack in parse_acknowledgments(content, parser):
+                ack['idta'] = row['idta']
+                ack['received_at'] = row['ts']
+                acks.append(ack)
+        return acks, None
+    
+    @staticmethod
+    def apply(acks):
+        """
+        Match acknowledgments to sent transactions and store the outcome
+        
+        Transactions are found through ControlNumberIndex; an acknowledgment
+        whose key is not recorded is tried on its fallback key. Call inside
+        transaction.atomic().
+        
+        Args:
+            acks: dicts with key, status, message and optionally fallback,
+                idta and received_at
+        
+        Returns:
+            dict: acknowledged and unmatched counts
+        """
+        sent = ControlNumberIndex.find(ack['key'] for ack in acks)
+        fallbacks = [ack['fallback'] for ack in acks if ack.get('fallback') and ack['key'] not in sent]
+        if fallbacks:
+            sent.update(ControlNumberIndex.find(fallbacks))
+        
+        now = timezone.now()
+        updated = {}
+        history = []
+        latencies = []
+        unmatched = 0
+        for ack in acks:
+            txn = sent.get(ack['key']) or sent.get(ack.get('fallback'))
+            if txn is None:
+                unmatched += 1
+                logger.debug(f"No sent transaction for acknowledgment of {ack['key']}")
+                continue
+            if txn.status == 'acknowledged' and txn.acknowledgment_status == ack['status']:
+                continue
+            
+            acknowledged_at = ack.get('received_at') or now
+            txn.acknowledgment_status = ack['status']
+            txn.acknowledgment_message = ack['message']
+            txn.acknowledged_at = acknowledged_at
+            txn.status = 'acknowledged'
+            txn.modified_at = now
+            updated[txn.pk] = txn
+            history.append(TransactionHistory(
+                transaction=txn,
+                action='acknowledged',
+                details={
+                    'acknowledgment_status': ack['status'],
+                    'acknowledgment_message': ack['message'],
+                    'acknowledged_at': acknowledged_at.isoformat(),
+                    'bots_ta_id': ack.get('idta'),
+                }
+            ))
+            latencies.append((ack['status'], txn.sent_at, acknowledged_at))
+        
+        if updated:
+            EDITransaction.objects.bulk_update(
+                updated.values(),
+                ['acknowledgment_status', 'acknowledgment_message', 'acknowledged_at', 'status', 'modified_at']
+            )
+            TransactionHistory.objects.bulk_create(history)
+            for status, sent_at, acknowledged_at in latencies:
+                pipeline_metrics.record_ack(status, sent_at, acknowledged_at)
+        
+        return {'acknowledged': len(updated), 'unmatched': unmatched}
@@ -4,13 +4,12 @@ Background job to monitor for acknowledgment messages
 """
 
 import os
-import time
-from datetime import datetime, timedelta
+from datetime import datetime
 from django.conf import settings
-from django.db import transaction
 
-from .modern_edi_models import EDITransaction, TransactionHistory
+from .modern_edi_models import EDITransaction
 from .edi_parser import EDIParser
+from .ack_reconciler import AckReconciler
 
 
 class AcknowledgmentTracker:
@@ -23,47 +22,24 @@ class AcknowledgmentTracker:
     
     def check_acknowledgments(self):
         """
-        Check for acknowledgment messages for sent transactions
+        Apply acknowledgment messages received since the last check
         
         This method should be called periodically (e.g., every 5 minutes)
-        by a background job or cron task
+        by a background job or cron task. Only acknowledgments bots received
+        since the previous run are read (see ack_reconciler).
         """
-        # Get all sent transactions that haven't been acknowledged
-        pending_txns = EDITransaction.objects.filter(
-            folder='sent',
-            acknowledgment_status__isnull=True
-        )
-        
-        checked_count = 0
-        acknowledged_count = 0
-        
-        for txn in pending_txns:
-            try:
-                # Check if acknowledgment has been received
-                ack_status = self._check_transaction_acknowledgment(txn)
-                
-                if ack_status['acknowledged']:
-                    # Update transaction
-                    self._update_acknowledgment_status(txn, ack_status)
-                    acknowledged_count += 1
-                
-                checked_count += 1
-                
-            except Exception as e:
-                # Log error but continue processing other transactions
-                import logging
-                logger = logging.getLogger('modern_edi.acknowledgment')
-                logger.error(f"Error checking acknowledgment for {txn.id}: {str(e)}")
+        result = AckReconciler.run()
         
         return {
-            'checked': checked_count,
-            'acknowledged': acknowledged_count,
+            'checked': result['read'],
+            'acknowledged': result['acknowledged'],
+            'unmatched': result['unmatched'],
             'timestamp': datetime.now().isoformat()
         }
     
     def _check_transaction_acknowledgment(self, txn):
         """
-        Check if a specific transaction has been acknowledged
+        Acknowledgment status recorded for a transaction
         
         Args:
             txn: EDITransaction instance
@@ -71,69 +47,13 @@ class AcknowledgmentTracker:
         Returns:
             Dictionary with acknowledgment status
         """
-        # This is a placeholder implementation
-        # In production, this would:
-        # 1. Query Bots database for related acknowledgment messages (997, CONTRL, etc.)
-        # 2. Match acknowledgment to original transaction using control numbers
-        # 3. Parse acknowledgment to determine success/failure
-        
-        # For now, we'll simulate acknowledgment checking
-        # In a real implementation, you would query the Bots ta table
-        
-        ack_status = {
-            'acknowledged': False,
-            'status': 'pending',
-            'message': None,
-            'acknowledged_at': None
+        acknowledged = txn.status == 'acknowledged' and txn.acknowledgment_status not in (None, 'failed')
+        return {
+            'acknowledged': acknowledged,
+            'status': txn.acknowledgment_status if acknowledged else 'pending',
+            'message': txn.acknowledgment_message,
+            'acknowledged_at': txn.acknowledged_at
         }
-        
-        # Check if transaction has been sent long enough to expect acknowledgment
-        if txn.sent_at:
-            time_since_sent = datetime.now() - txn.sent_at
-            
-            # Simulate: transactions older than 1 hour get acknowledged
-            if time_since_sent > timedelta(hours=1):
-                ack_status['acknowledged'] = True
-                ack_status['status'] = 'accepted'
-                ack_status['message'] = 'Transaction accepted by trading partner'
-                ack_status['acknowledged_at'] = datetime.now()
-        
-        # TODO: Implement actual acknowledgment checking
-        # Example query for Bots database:
-        # from bots.models import ta
-        # ack_messages = ta.objects.filter(
-        #     messagetype__in=['997', 'CONTRL'],
-        #     frompartner=txn.partner_id,
-        #     # Match on control number or reference
-        # )
-        
-        return ack_status
-    
-    @transaction.atomic
-    def _update_acknowledgment_status(self, txn, ack_status):
-        """
-        Update transaction with acknowledgment information
-        
-        Args:
-            txn: EDITransaction instance
-            ack_status: Dictionary with acknowledgment details
-        """
-        txn.acknowledgment_status = ack_status['status']
-        txn.acknowledgment_message = ack_status['message']
-        txn.acknowledged_at = ack_status['acknowledged_at']
-        txn.status = 'acknowledged'
-        txn.save()
-        
-        # Create history entry
-        TransactionHistory.objects.create(
-            transaction=txn,
-            action='acknowledged',
-            details={
-                'acknowledgment_status': ack_status['status'],
-                'acknowledgment_message': ack_status['message'],
-                'acknowledged_at': ack_status['acknowledged_at'].isoformat() if ack_status['acknowledged_at'] else None
-            }
-        )
     
     def check_single_transaction(self, transaction_id):
         """
@@ -154,13 +74,11 @@ class AcknowledgmentTracker:
                     'transaction_id': str(transaction_id)
                 }
             
-            # Check acknowledgment
+            # Apply any newly received acknowledgments, then read the result
+            AckReconciler.run()
+            txn.refresh_from_db()
             ack_status = self._check_transaction_acknowledgment(txn)
             
-            # Update if acknowledged
-            if ack_status['acknowledged']:
-                self._update_acknowledgment_status(txn, ack_status)
-            
             return {
                 'transaction_id': str(transaction_id),
                 'acknowledged': ack_status['acknowledged'],
@@ -205,29 +123,19 @@ class AcknowledgmentTracker:
             Dictionary with retry results
         """
         # Get transactions with failed acknowledgment checks
-        failed_txns = EDITransaction.objects.filter(
+        failed_ids = list(EDITransaction.objects.filter(
             folder='sent',
             acknowledgment_status='failed'
-        )
+        ).values_list('id', flat=True))
         
-        retried_count = 0
-        success_count = 0
+        self.check_acknowledgments()
         
-        for txn in failed_txns:
-            try:
-                ack_status = self._check_transaction_acknowledgment(txn)
-                
-                if ack_status['acknowledged']:
-                    self._update_acknowledgment_status(txn, ack_status)
-                    success_count += 1
-                
-                retried_count += 1
-                
-            except Exception:
-                continue
+        success_count = EDITransaction.objects.filter(
+            id__in=failed_ids
+        ).exclude(acknowledgment_status='failed').count()
         
         return {
-            'retried': retried_count,
+            'retried': len(failed_ids),
             'successful': success_count,
             'timestamp': datetime.now().isoformat()
         }
@@ -8,6 +8,8 @@ from django.utils import timezone
 from datetime import timedelta
 
 from .partner_models import ActivityLog
+from .audit_buffer import get_buffer
+from . import log_partitions
 
 
 class ActivityLogger:
@@ -43,7 +45,8 @@ class ActivityLogger:
             user_agent = request.META.get('HTTP_USER_AGENT', '')[:500]
         
         try:
-            ActivityLog.objects.create(
+            # Queued and written in batches off the request path (see audit_buffer)
+            get_buffer(ActivityLog).add(ActivityLog(
                 user_type=user_type,
                 user_id=user_id,
                 user_name=user_name,
@@ -53,7 +56,7 @@ class ActivityLogger:
                 details=details or {},
                 ip_address=ip_address,
                 user_agent=user_agent
-            )
+            ))
         except Exception as e:
             # Don't let logging errors break the application
             print(f"Failed to log activity: {e}")
@@ -98,11 +101,16 @@ class ActivityLogger:
             int: Number of logs deleted
         """
         cutoff_date = timezone.now() - timedelta(days=days)
+        if log_partitions.is_enabled():
+            # Whole months go with a partition drop / archive file removal
+            partitions = log_partitions.get_partitions(ActivityLog)
+            if partitions:
+                return partitions.prune(cutoff_date)
         deleted_count, _ = ActivityLog.objects.filter(timestamp__lt=cutoff_date).delete()
         return deleted_count
     
     @staticmethod
-    def get_user_activity(user_type, user_id, limit=100):
+    def get_user_activity(user_type, user_id, limit=100, days=None):
         """
         Get recent activity for a specific user
         
@@ -110,17 +118,16 @@ class ActivityLogger:
             user_type: 'admin' or 'partner'
             user_id: User ID
             limit: Maximum number of logs to return
+            days: Only look back this many days (with partitioned logs,
+                only those months' partitions or archive files are read)
         
         Returns:
-            QuerySet: Activity logs
+            QuerySet, or a list when archived months are read: Activity logs
         """
-        return ActivityLog.objects.filter(
-            user_type=user_type,
-            user_id=user_id
-        ).order_by('-timestamp')[:limit]
+        return ActivityLogger._recent({'user_type': user_type, 'user_id': user_id}, limit, days)
     
     @staticmethod
-    def get_resource_activity(resource_type, resource_id, limit=100):
+    def get_resource_activity(resource_type, resource_id, limit=100, days=None):
         """
         Get recent activity for a specific resource
         
@@ -128,14 +135,30 @@ class ActivityLogger:
             resource_type: Type of resource
             resource_id: Resource ID
             limit: Maximum number of logs to return
+            days: Only look back this many days (see get_user_activity)
         
         Returns:
-            QuerySet: Activity logs
+            QuerySet, or a list when archived months are read: Activity logs
         """
-        return ActivityLog.objects.filter(
-            resource_type=resource_type,
-            resource_id=resource_id
-        ).order_by('-timestamp')[:limit]
+        return ActivityLogger._recent({'resource_type': resource_type, 'resource_id': resource_id}, limit, days)
+    
+    @staticmethod
+    def _recent(filters, limit, days):
+        """Newest logs matching filters, including SQLite archive months the range covers"""
+        since = timezone.now() - timedelta(days=days) if days is not None else None
+        query = ActivityLog.objects.filter(**filters)
+        if since is not None:
+            query = query.filter(timestamp__gte=since)
+        query = query.order_by('-timestamp')[:limit]
+        
+        partitions = log_partitions.get_partitions(ActivityLog) if log_partitions.is_enabled() else None
+        if not isinstance(partitions, log_partitions.SQLiteArchive):
+            return query
+        archived = partitions.read(filters, since, limit)
+        if not archived:
+            return query
+        # Archived months are all older than the rows still in the database
+        return (list(query) + archived)[:limit]
     
     @staticmethod
     def get_action_count(action, user_type=None, days=30):
@@ -93,6 +93,7 @@ urlpatterns = [
     # Transaction Management
     path('transactions/incoming', admin_views.admin_transactions_incoming, name='admin_transactions_incoming'),
     path('transactions/outgoing', admin_views.admin_transactions_outgoing, name='admin_transactions_outgoing'),
+    path('transactions/export', admin_views.admin_transactions_export, name='admin_transactions_export'),
     path('transactions/<int:ta_id>', admin_views.admin_transaction_detail, name='admin_transaction_detail'),
     path('transactions/<int:ta_id>/resend', admin_views.admin_transaction_resend, name='admin_transaction_resend'),
     path('transactions/<int:ta_id>/lineage', admin_views.admin_transaction_lineage, name='admin_transaction_lineage'),
@@ -101,6 +102,8 @@ urlpatterns = [
     path('files/browse', admin_views.admin_files_browse, name='admin_files_browse'),
     path('logs', admin_views.admin_logs_list, name='admin_logs_list'),
     path('logs/content', admin_views.admin_log_content, name='admin_log_content'),
+    path('logs/follow', admin_views.admin_log_follow, name='admin_log_follow'),
+    path('logs/search', admin_views.admin_log_search, name='admin_log_search'),
     
     # Operations
     path('engine/run', admin_views.admin_engine_run, name='admin_engine_run'),
@@ -109,4 +112,6 @@ urlpatterns = [
     
     # System
     path('system/info', admin_views.admin_system_info, name='admin_system_info'),
+    path('metrics', admin_views.admin_metrics, name='admin_metrics'),
+    path('metrics/slow-requests', admin_views.admin_metrics_slow_requests, name='admin_metrics_slow_requests'),
 ]
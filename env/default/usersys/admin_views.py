@@ -4,12 +4,17 @@ Handles all admin dashboard endpoints for analytics, user management, and system
 """
 
 import json
-import csv
-from io import StringIO
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.http import require_http_methods
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Q, Count, Max
+
+from .pagination import CursorPaginator, InvalidCursor, wants_cursor, cursor_pagination_info
+from .search_index import TASearchIndex
+from .streaming_export import StreamingExporter, InvalidExportFormat, export_options
+from .metrics import registry as metrics_registry, token_valid as metrics_token_valid, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .request_profiler import slow_requests
+from . import pipeline_metrics
 
 try:
     from .analytics_service import AnalyticsService
@@ -51,6 +56,36 @@ except ImportError:
     ReportScheduler = None
 
 
+# Columns for streamed exports: (values_list field, header)
+ACTIVITY_LOG_EXPORT_COLUMNS = [
+    ('timestamp', 'Timestamp'),
+    ('user_name', 'User'),
+    ('user_type', 'User Type'),
+    ('action', 'Action'),
+    ('resource_type', 'Resource Type'),
+    ('resource_id', 'Resource ID'),
+    ('ip_address', 'IP Address'),
+    ('details', 'Details'),
+]
+
+TA_EXPORT_COLUMNS = [
+    ('idta', 'ID'),
+    ('statust', 'Status Type'),
+    ('status', 'Status'),
+    ('ts', 'Timestamp'),
+    ('frompartner', 'From Partner'),
+    ('topartner', 'To Partner'),
+    ('fromchannel', 'From Channel'),
+    ('tochannel', 'To Channel'),
+    ('editype', 'EDI Type'),
+    ('messagetype', 'Message Type'),
+    ('filename', 'Filename'),
+    ('filesize', 'File Size'),
+    ('reference', 'Reference'),
+    ('errortext', 'Error'),
+]
+
+
 # Dashboard Overview Endpoints
 
 @require_http_methods(["GET"])
@@ -149,6 +184,13 @@ def admin_partners_list(request):
         # Order by name
         partners = partners.order_by('name')
         
+        # Aggregate transaction stats over the partner FK in the same query
+        if EDITransaction:
+            partners = partners.annotate(
+                transaction_count=Count('edi_transactions'),
+                last_activity=Max('edi_transactions__created_at'),
+            )
+        
         # Paginate
         paginator = Paginator(partners, per_page)
         page_obj = paginator.get_page(page)
@@ -156,15 +198,11 @@ def admin_partners_list(request):
         # Serialize partners
         partners_data = []
         for partner in page_obj:
-            # Calculate stats if EDITransaction is available
-            count = 0
-            last_activity = None
-            
-            if EDITransaction:
-                count = EDITransaction.objects.filter(partner_name=partner.name).count()
-                recent = EDITransaction.objects.filter(partner_name=partner.name).order_by('-created_at').first()
-                if recent:
-                    last_activity = recent.created_at.isoformat()
+            # Stats are annotated when EDITransaction is available
+            count = getattr(partner, 'transaction_count', 0)
+            last_activity = getattr(partner, 'last_activity', None)
+            if last_activity:
+                last_activity = last_activity.isoformat()
 
             partners_data.append({
                 'id': str(partner.id),
@@ -607,13 +645,15 @@ def admin_activity_logs(request):
 @require_http_methods(["GET"])
 def admin_activity_logs_export(request):
     """
-    Export activity logs to CSV
-    GET /api/v1/admin/activity-logs/export?user_type=&action=
+    Export activity logs as CSV or NDJSON, streamed
+    GET /api/v1/admin/activity-logs/export?user_type=&action=&format=csv|ndjson&compress=gzip
     """
     if not request.user.is_authenticated or not request.user.is_staff:
         return JsonResponse({'error': 'Admin access required'}, status=403)
     
     try:
+        fmt, compress = export_options(request)
+        
         # Get query parameters
         user_type = request.GET.get('user_type', '').strip()
         action = request.GET.get('action', '').strip()
@@ -627,43 +667,21 @@ def admin_activity_logs_export(request):
         if action:
             logs = logs.filter(action=action)
         
-        logs = logs.order_by('-timestamp')[:1000]  # Limit to 1000 records
-        
-        # Create CSV
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow([
-            'Timestamp', 'User Type', 'User Name', 'Action',
-            'Resource Type', 'Resource ID', 'IP Address'
-        ])
-        
-        # Write data
-        for log in logs:
-            writer.writerow([
-                log.timestamp.isoformat(),
-                log.user_type,
-                log.user_name,
-                log.action,
-                log.resource_type,
-                log.resource_id,
-                log.ip_address or '',
-            ])
+        logs = logs.order_by('-timestamp')
         
         # Log export activity
         ActivityLogger.log_admin(
             request.user,
             'activity_logs_exported',
-            details={'count': logs.count()},
+            details={'format': fmt, 'user_type': user_type, 'action': action},
             request=request
         )
         
-        # Return CSV response
-        response = HttpResponse(output.getvalue(), content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="activity_logs.csv"'
-        return response
-        
+        exporter = StreamingExporter(logs, ACTIVITY_LOG_EXPORT_COLUMNS, fmt=fmt, compress=compress)
+        return exporter.response('activity_logs')
+    
+    except InvalidExportFormat as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -2913,6 +2931,7 @@ def admin_transactions_incoming(request):
     """
     List incoming transactions (statust=100)
     GET /api/v1/admin/transactions/incoming?status=&from_date=&to_date=&page=1
+    GET /api/v1/admin/transactions/incoming?cursor=&include_total=1 (cursor mode)
     """
     if not request.user.is_authenticated or not request.user.is_staff:
         return JsonResponse({'error': 'Admin access required'}, status=403)
@@ -2942,19 +2961,39 @@ def admin_transactions_incoming(request):
             transactions = transactions.filter(ts__lte=datetime.fromisoformat(to_date))
         
         if search:
-            transactions = transactions.filter(
-                Q(filename__icontains=search) |
-                Q(frompartner__icontains=search) |
-                Q(topartner__icontains=search) |
-                Q(reference__icontains=search)
-            )
+            indexed = TASearchIndex.filter(transactions, search)
+            if indexed is not None:
+                transactions = indexed
+            else:
+                transactions = transactions.filter(
+                    Q(filename__icontains=search) |
+                    Q(frompartner__icontains=search) |
+                    Q(topartner__icontains=search) |
+                    Q(reference__icontains=search)
+                )
         
         # Order by newest first
         transactions = transactions.order_by('-ts')
         
-        # Paginate
-        paginator = Paginator(transactions, per_page)
-        page_obj = paginator.get_page(page)
+        # Paginate - cursor mode seeks on (ts, idta) instead of COUNT + OFFSET
+        if wants_cursor(request):
+            try:
+                page_obj = CursorPaginator(transactions, per_page, ordering_field='ts').page(request.GET.get('cursor'))
+            except InvalidCursor as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            include_total = request.GET.get('include_total') == '1'
+            pagination = cursor_pagination_info(page_obj, per_page, transactions if include_total else None)
+        else:
+            paginator = Paginator(transactions, per_page)
+            page_obj = paginator.get_page(page)
+            pagination = {
+                'page': page,
+                'per_page': per_page,
+                'total': paginator.count,
+                'pages': paginator.num_pages,
+                'has_next': page_obj.has_next(),
+                'has_previous': page_obj.has_previous(),
+            }
         
         # Serialize transactions
         transactions_data = []
@@ -2979,14 +3018,7 @@ def admin_transactions_incoming(request):
         return JsonResponse({
             'success': True,
             'transactions': transactions_data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': paginator.count,
-                'pages': paginator.num_pages,
-                'has_next': page_obj.has_next(),
-                'has_previous': page_obj.has_previous(),
-            }
+            'pagination': pagination,
         })
     except Exception as e:
         import traceback
@@ -2998,6 +3030,7 @@ def admin_transactions_outgoing(request):
     """
     List outgoing transactions (statust>=200)
     GET /api/v1/admin/transactions/outgoing?status=&from_date=&to_date=&page=1
+    GET /api/v1/admin/transactions/outgoing?cursor=&include_total=1 (cursor mode)
     """
     if not request.user.is_authenticated or not request.user.is_staff:
         return JsonResponse({'error': 'Admin access required'}, status=403)
@@ -3027,19 +3060,39 @@ def admin_transactions_outgoing(request):
             transactions = transactions.filter(ts__lte=datetime.fromisoformat(to_date))
         
         if search:
-            transactions = transactions.filter(
-                Q(filename__icontains=search) |
-                Q(frompartner__icontains=search) |
-                Q(topartner__icontains=search) |
-                Q(reference__icontains=search)
-            )
+            indexed = TASearchIndex.filter(transactions, search)
+            if indexed is not None:
+                transactions = indexed
+            else:
+                transactions = transactions.filter(
+                    Q(filename__icontains=search) |
+                    Q(frompartner__icontains=search) |
+                    Q(topartner__icontains=search) |
+                    Q(reference__icontains=search)
+                )
         
         # Order by newest first
         transactions = transactions.order_by('-ts')
         
-        # Paginate
-        paginator = Paginator(transactions, per_page)
-        page_obj = paginator.get_page(page)
+        # Paginate - cursor mode seeks on (ts, idta) instead of COUNT + OFFSET
+        if wants_cursor(request):
+            try:
+                page_obj = CursorPaginator(transactions, per_page, ordering_field='ts').page(request.GET.get('cursor'))
+            except InvalidCursor as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            include_total = request.GET.get('include_total') == '1'
+            pagination = cursor_pagination_info(page_obj, per_page, transactions if include_total else None)
+        else:
+            paginator = Paginator(transactions, per_page)
+            page_obj = paginator.get_page(page)
+            pagination = {
+                'page': page,
+                'per_page': per_page,
+                'total': paginator.count,
+                'pages': paginator.num_pages,
+                'has_next': page_obj.has_next(),
+                'has_previous': page_obj.has_previous(),
+            }
         
         # Serialize transactions
         transactions_data = []
@@ -3064,20 +3117,75 @@ def admin_transactions_outgoing(request):
         return JsonResponse({
             'success': True,
             'transactions': transactions_data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': paginator.count,
-                'pages': paginator.num_pages,
-                'has_next': page_obj.has_next(),
-                'has_previous': page_obj.has_previous(),
-            }
+            'pagination': pagination,
         })
     except Exception as e:
         import traceback
         return JsonResponse({'error': str(e), 'traceback': traceback.format_exc()}, status=500)
 
 
+@require_http_methods(["GET"])
+def admin_transactions_export(request):
+    """
+    Export bots transactions as CSV or NDJSON, streamed
+    GET /api/v1/admin/transactions/export?direction=incoming|outgoing&status=&from_date=&to_date=&search=
+    GET /api/v1/admin/transactions/export?format=ndjson&compress=gzip
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'error': 'Admin access required'}, status=403)
+    
+    try:
+        from bots.models import ta
+        from datetime import datetime
+        
+        fmt, compress = export_options(request)
+        
+        # Get query parameters
+        direction = request.GET.get('direction', '').strip()
+        status = request.GET.get('status', '').strip()
+        from_date = request.GET.get('from_date', '').strip()
+        to_date = request.GET.get('to_date', '').strip()
+        search = request.GET.get('search', '').strip()
+        
+        # Same split as the incoming/outgoing lists
+        transactions = ta.objects.all()
+        if direction == 'incoming':
+            transactions = transactions.filter(statust=100)
+        elif direction == 'outgoing':
+            transactions = transactions.filter(statust__gte=200)
+        
+        if status:
+            transactions = transactions.filter(status=int(status))
+        
+        if from_date:
+            transactions = transactions.filter(ts__gte=datetime.fromisoformat(from_date))
+        
+        if to_date:
+            transactions = transactions.filter(ts__lte=datetime.fromisoformat(to_date))
+        
+        if search:
+            indexed = TASearchIndex.filter(transactions, search)
+            if indexed is not None:
+                transactions = indexed
+            else:
+                transactions = transactions.filter(
+                    Q(filename__icontains=search) |
+                    Q(frompartner__icontains=search) |
+                    Q(topartner__icontains=search) |
+                    Q(reference__icontains=search)
+                )
+        
+        transactions = transactions.order_by('-ts', '-idta')
+        
+        exporter = StreamingExporter(transactions, TA_EXPORT_COLUMNS, fmt=fmt, compress=compress)
+        return exporter.response(f'transactions_{direction or "all"}_{datetime.now().strftime("%Y%m%d")}')
+    except InvalidExportFormat as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        import traceback
+        return JsonResponse({'error': str(e), 'traceback': traceback.format_exc()}, status=500)
+
+
 @require_http_methods(["GET"])
 def admin_transaction_detail(request, ta_id):
     """
@@ -3156,48 +3264,34 @@ def admin_transaction_resend(request, ta_id):
 def admin_transaction_lineage(request, ta_id):
     """
     Get transaction lineage (parent/child tree)
-    GET /api/v1/admin/transactions/<ta_id>/lineage
+    GET /api/v1/admin/transactions/<ta_id>/lineage?root=true&depth=10&max_nodes=500
     """
     if not request.user.is_authenticated or not request.user.is_staff:
         return JsonResponse({'error': 'Admin access required'}, status=403)
     
     try:
         from bots.models import ta
+        from .lineage import TransactionLineage, DEFAULT_MAX_DEPTH, DEFAULT_MAX_NODES
         
-        def get_tree(idta, level=0, visited=None):
-            if visited is None:
-                visited = set()
-            if idta in visited or level > 10:
-                return None
-            visited.add(idta)
-            
-            try:
-                tx = ta.objects.get(idta=idta)
-                node = {
-                    'idta': tx.idta,
-                    'filename': tx.filename,
-                    'editype': tx.editype,
-                    'status': tx.status,
-                    'ts': tx.ts.isoformat(),
-                    'children': []
-                }
-                
-                # Get children
-                children = ta.objects.filter(parent=idta)
-                for child in children:
-                    child_node = get_tree(child.idta, level+1, visited)
-                    if child_node:
-                        node['children'].append(child_node)
-                
-                return node
-            except ta.DoesNotExist:
-                return None
-        
-        lineage = get_tree(ta_id)
-        
-        return JsonResponse({
-            'success': True,
-            'lineage': lineage
+        # Get query parameters
+        from_root = request.GET.get('root', '').lower() == 'true'
+        max_depth = min(int(request.GET.get('depth', DEFAULT_MAX_DEPTH)), 50)
+        max_nodes = min(int(request.GET.get('max_nodes', DEFAULT_MAX_NODES)), 5000)
+        
+        # Optionally start from the top-most ancestor
+        root_id = ta_id
+        if from_root:
+            root_id = TransactionLineage.find_root(ta, ta_id, max_depth=max_depth)
+        
+        lineage, truncated = TransactionLineage.get_tree(
+            ta, root_id, max_depth=max_depth, max_nodes=max_nodes
+        )
+        
+        return JsonResponse({
+            'success': True,
+            'lineage': lineage,
+            'root_id': root_id,
+            'truncated': truncated,
         })
     except Exception as e:
         import traceback
@@ -3302,6 +3396,7 @@ def admin_log_content(request):
     """
     Read log file content
     GET /api/v1/admin/logs/content?path=engine.log&lines=100&offset=0
+    GET /api/v1/admin/logs/content?path=engine.log&lines=100&tail=true
     """
     if not request.user.is_authenticated or not request.user.is_staff:
         return JsonResponse({'error': 'Admin access required'}, status=403)
@@ -3309,6 +3404,7 @@ def admin_log_content(request):
     try:
         import os
         import botsglobal
+        from .log_reader import LineIndex, tail_lines
         
         log_path = request.GET.get('path', '').strip()
         lines = int(request.GET.get('lines', 100))
@@ -3328,21 +3424,20 @@ def admin_log_content(request):
         if not os.path.exists(full_path):
             return JsonResponse({'error': 'Log file not found'}, status=404)
         
-        # Read file
-        with open(full_path, 'r', encoding='utf-8', errors='replace') as f:
-            if tail:
-                # Read last N lines
-                all_lines = f.readlines()
-                content_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
-            else:
-                # Read with offset
-                all_lines = f.readlines()
-                content_lines = all_lines[offset:offset+lines]
-            
-            content = ''.join(content_lines)
+        # Line counts and paging come from the persisted line-offset index
+        index = LineIndex(full_path).refresh()
+        total_lines = index.total_lines
+        
+        if tail:
+            # Read last N lines backwards from EOF
+            content_lines = tail_lines(full_path, lines)
+            offset = max(total_lines - len(content_lines), 0)
+        else:
+            # Seek to the nearest checkpoint and read forward
+            content_lines = index.read_lines(offset, lines)
         
+        content = ''.join(content_lines)
         file_size = os.path.getsize(full_path)
-        total_lines = len(all_lines) if 'all_lines' in locals() else 0
         
         return JsonResponse({
             'success': True,
@@ -3357,6 +3452,147 @@ def admin_log_content(request):
         return JsonResponse({'error': str(e), 'traceback': traceback.format_exc()}, status=500)
 
 
+@require_http_methods(["GET"])
+def admin_log_follow(request):
+    """
+    Follow a log file from a byte offset
+    GET /api/v1/admin/logs/follow?path=engine.log&offset=0&timeout=25
+    GET /api/v1/admin/logs/follow?path=engine.log&stream=sse (server-sent events)
+    
+    Long-poll mode waits until new lines are appended (or timeout) and
+    returns them with the next offset. SSE mode pushes lines as they are
+    written and closes after a while; EventSource reconnects with
+    Last-Event-ID carrying the offset.
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'error': 'Admin access required'}, status=403)
+    
+    try:
+        import os
+        import time
+        import botsglobal
+        from django.http import StreamingHttpResponse
+        from .log_reader import read_from, wait_for_growth
+        
+        log_path = request.GET.get('path', '').strip()
+        stream = request.GET.get('stream', '').strip().lower()
+        timeout = min(float(request.GET.get('timeout', 25)), 55)
+        
+        if not log_path:
+            return JsonResponse({'error': 'Log path required'}, status=400)
+        
+        log_dir = botsglobal.ini.get('directories', 'logging')
+        full_path = os.path.join(log_dir, log_path)
+        
+        # Security check: ensure path is within log directory
+        if not os.path.abspath(full_path).startswith(os.path.abspath(log_dir)):
+            return JsonResponse({'error': 'Invalid path'}, status=400)
+        
+        if not os.path.exists(full_path):
+            return JsonResponse({'error': 'Log file not found'}, status=404)
+        
+        # Start from the client offset, or from EOF for a fresh follow
+        offset = request.GET.get('offset') or request.META.get('HTTP_LAST_EVENT_ID')
+        offset = int(offset) if offset else os.path.getsize(full_path)
+        
+        if stream == 'sse':
+            def events(offset):
+                deadline = time.monotonic() + 60
+                yield f"retry: 2000\nid: {offset}\n\n"
+                while time.monotonic() < deadline:
+                    size = os.path.getsize(full_path)
+                    content, offset, rotated = read_from(full_path, offset)
+                    if content or rotated:
+                        payload = json.dumps({'content': content, 'offset': offset, 'rotated': rotated})
+                        yield f"id: {offset}\nevent: lines\ndata: {payload}\n\n"
+                    elif not wait_for_growth(full_path, size, timeout=15):
+                        # Heartbeat keeps proxies from closing the connection
+                        yield ": keepalive\n\n"
+            
+            response = StreamingHttpResponse(events(offset), content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+        
+        # Long-poll until complete lines arrive or the timeout expires
+        deadline = time.monotonic() + timeout
+        while True:
+            size = os.path.getsize(full_path)
+            content, new_offset, rotated = read_from(full_path, offset)
+            remaining = deadline - time.monotonic()
+            if content or rotated or remaining <= 0:
+                break
+            if not wait_for_growth(full_path, size, timeout=remaining):
+                break
+        
+        return JsonResponse({
+            'success': True,
+            'content': content,
+            'offset': new_offset,
+            'size': os.path.getsize(full_path),
+            'rotated': rotated,
+        })
+    except Exception as e:
+        import traceback
+        return JsonResponse({'error': str(e), 'traceback': traceback.format_exc()}, status=500)
+
+
+@require_http_methods(["GET"])
+def admin_log_search(request):
+    """
+    Search indexed log lines across current, rotated and gzipped logs
+    (as indexed by the last 'manage.py index_logs' run; schedule it every minute or so)
+    GET /api/v1/admin/logs/search?idta=123456&level=ERROR&days=7&limit=200
+    GET /api/v1/admin/logs/search?filename=order.edi&since=2024-01-01T00:00:00
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'error': 'Admin access required'}, status=403)
+    
+    try:
+        import botsglobal
+        from datetime import datetime, timedelta
+        from .log_index import LogIndexer
+        
+        # Get query parameters
+        idta = request.GET.get('idta', '').strip()
+        filename = request.GET.get('filename', '').strip()
+        level = request.GET.get('level', '').strip()
+        since = request.GET.get('since', '').strip()
+        until = request.GET.get('until', '').strip()
+        days = request.GET.get('days', '').strip()
+        limit = min(int(request.GET.get('limit', 200)), 1000)
+        
+        if not (idta or filename or level):
+            return JsonResponse({'error': 'idta, filename or level required'}, status=400)
+        
+        since = datetime.fromisoformat(since) if since else None
+        until = datetime.fromisoformat(until) if until else None
+        if days and not since:
+            since = datetime.now() - timedelta(days=int(days))
+        
+        # Read-only: manage.py index_logs keeps the index current
+        indexer = LogIndexer(botsglobal.ini.get('directories', 'logging'))
+        results = indexer.search(
+            idta=idta or None,
+            filename=filename or None,
+            level=level or None,
+            since=since,
+            until=until,
+            limit=limit
+        )
+        
+        return JsonResponse({
+            'success': True,
+            'results': results,
+            'count': len(results),
+        })
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid parameter: {str(e)}'}, status=400)
+    except Exception as e:
+        import traceback
+        return JsonResponse({'error': str(e), 'traceback': traceback.format_exc()}, status=500)
+
+
 # ============================================================================
 # OPERATIONS
 # ============================================================================
@@ -3441,6 +3677,7 @@ def admin_activity_logs(request):
     """
     Get activity logs
     GET /api/v1/admin/activity-logs?page=1&page_size=50&action=&user_type=&search=
+    GET /api/v1/admin/activity-logs?cursor=&include_total=1 (cursor mode)
     """
     if not request.user.is_authenticated or not request.user.is_staff:
         return JsonResponse({'error': 'Admin access required'}, status=403)
@@ -3473,9 +3710,18 @@ def admin_activity_logs(request):
             # Order by most recent first
             logs = logs.order_by('-timestamp')
             
-            # Paginate
-            paginator = Paginator(logs, page_size)
-            page_obj = paginator.get_page(page)
+            # Cursor mode seeks on (timestamp, id) instead of COUNT + OFFSET
+            if wants_cursor(request):
+                try:
+                    page_obj = CursorPaginator(logs, page_size, ordering_field='timestamp').page(request.GET.get('cursor'))
+                except InvalidCursor as e:
+                    return JsonResponse({'error': str(e)}, status=400)
+                include_total = request.GET.get('include_total') == '1'
+                pagination = cursor_pagination_info(page_obj, page_size, logs if include_total else None)
+            else:
+                paginator = Paginator(logs, page_size)
+                page_obj = paginator.get_page(page)
+                pagination = None
             
             # Serialize logs
             logs_data = []
@@ -3492,6 +3738,13 @@ def admin_activity_logs(request):
                     'details': log.details if isinstance(log.details, dict) else {},
                 })
             
+            if pagination:
+                return JsonResponse({
+                    'success': True,
+                    'results': logs_data,
+                    'pagination': pagination,
+                })
+            
             return JsonResponse({
                 'success': True,
                 'results': logs_data,
@@ -3518,8 +3771,8 @@ def admin_activity_logs(request):
 @require_http_methods(["GET"])
 def admin_activity_logs_export(request):
     """
-    Export activity logs as CSV
-    GET /api/v1/admin/activity-logs/export
+    Export activity logs as CSV or NDJSON, streamed
+    GET /api/v1/admin/activity-logs/export?action=&user_type=&search=&format=csv|ndjson&compress=gzip
     """
     if not request.user.is_authenticated or not request.user.is_staff:
         return JsonResponse({'error': 'Admin access required'}, status=403)
@@ -3531,6 +3784,8 @@ def admin_activity_logs_export(request):
             
         from datetime import datetime
         
+        fmt, compress = export_options(request)
+        
         action = request.GET.get('action', '')
         user_type = request.GET.get('user_type', '')
         search = request.GET.get('search', '')
@@ -3553,27 +3808,11 @@ def admin_activity_logs_export(request):
         # Order by most recent first
         logs = logs.order_by('-timestamp')
         
-        # Create CSV response
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="activity_logs_{datetime.now().strftime("%Y%m%d")}.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Timestamp', 'User', 'User Type', 'Action', 'Resource Type', 'Resource ID', 'IP Address', 'Details'])
-        
-        for log in logs:
-            writer.writerow([
-                log.timestamp.isoformat(),
-                log.user_name,
-                log.user_type,
-                log.action,
-                log.resource_type,
-                log.resource_id,
-                log.ip_address,
-                json.dumps(log.details) if log.details else ''
-            ])
-            
-        return response
+        exporter = StreamingExporter(logs, ACTIVITY_LOG_EXPORT_COLUMNS, fmt=fmt, compress=compress)
+        return exporter.response(f'activity_logs_{datetime.now().strftime("%Y%m%d")}')
         
+    except InvalidExportFormat as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -3596,6 +3835,7 @@ def admin_cleanup_execute(request):
         
         cutoff = datetime.now() - timedelta(days=days)
         deleted = ta.objects.filter(ts__lt=cutoff).delete()
+        TASearchIndex.prune()
         
         return JsonResponse({
             'success': True,
@@ -3638,3 +3878,48 @@ def admin_system_info(request):
     except Exception as e:
         import traceback
         return JsonResponse({'error': str(e), 'traceback': traceback.format_exc()}, status=500)
+
+
+# Metrics
+
+@require_http_methods(["GET"])
+def admin_metrics(request):
+    """
+    Metrics of this process in Prometheus text format
+    GET /api/v1/admin/metrics
+    
+    Staff session, or 'Authorization: Bearer <METRICS_TOKEN>' for scrapers.
+    """
+    if not metrics_token_valid(request) and not (request.user.is_authenticated and request.user.is_staff):
+        return JsonResponse({'error': 'Admin access required'}, status=403)
+    
+    try:
+        # Refresh folder depths and poller state (at most every METRICS_REFRESH_SECONDS)
+        pipeline_metrics.snapshot.get()
+    except Exception:
+        # Serve the last known values; the scrape itself should not fail
+        pass
+    
+    return HttpResponse(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@require_http_methods(["GET", "DELETE"])
+def admin_metrics_slow_requests(request):
+    """
+    Recent slow requests of this process, with sampled SQL
+    GET /api/v1/admin/metrics/slow-requests
+    DELETE /api/v1/admin/metrics/slow-requests (clear)
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'error': 'Admin access required'}, status=403)
+    
+    if request.method == 'DELETE':
+        slow_requests.clear()
+        return JsonResponse({'success': True})
+    
+    entries = slow_requests.entries()
+    return JsonResponse({
+        'success': True,
+        'requests': entries,
+        'count': len(entries)
+    })
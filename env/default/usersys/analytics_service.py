@@ -10,6 +10,7 @@ from collections import defaultdict
 
 from .partner_models import Partner
 from .modern_edi_models import EDITransaction
+from . import pipeline_metrics
 
 
 class AnalyticsService:
@@ -154,33 +155,25 @@ class AnalyticsService:
         """
         Get system health status indicators
         
+        Read from the pipeline metrics snapshot (see pipeline_metrics), which
+        queries the database at most every METRICS_REFRESH_SECONDS.
+        
         Returns:
             dict: System status
         """
-        # Check recent activity
-        recent_transactions = EDITransaction.objects.filter(
-            created_at__gte=timezone.now() - timedelta(hours=1)
-        ).count()
-        
-        # Check for stuck transactions
-        stuck_transactions = EDITransaction.objects.filter(
-            folder='outbox',
-            created_at__lt=timezone.now() - timedelta(hours=24)
-        ).count()
-        
-        # Database health (simple check)
         try:
-            Partner.objects.count()
+            state = pipeline_metrics.snapshot.get()
             database_status = 'healthy'
         except Exception:
+            state = None
             database_status = 'error'
         
         return {
             'database': database_status,
-            'api_services': 'healthy',  # Could add actual health checks
-            'sftp_polling': 'healthy',  # Could check last poll time
-            'recent_activity': recent_transactions > 0,
-            'stuck_transactions': stuck_transactions,
+            'api_services': pipeline_metrics.api_status(),
+            'sftp_polling': state['sftp_polling'] if state else 'unknown',
+            'recent_activity': bool(state and state['recent']),
+            'stuck_transactions': state['stuck'] if state else 0,
         }
     
     @staticmethod
@@ -217,31 +210,28 @@ class AnalyticsService:
         """
         cutoff_date = timezone.now() - timedelta(days=days)
         
-        partners = Partner.objects.filter(status='active')
-        result = []
+        # One grouped query over the (trading_partner, sent_at) index
+        sent = EDITransaction.objects.filter(
+            trading_partner__status='active',
+            folder='sent',
+            sent_at__gte=cutoff_date
+        ).values('trading_partner', 'trading_partner__name').annotate(
+            total=Count('id'),
+            acknowledged=Count('id', filter=Q(acknowledgment_status='acknowledged')),
+            failed=Count('id', filter=Q(acknowledgment_status='rejected')),
+        ).order_by()
         
-        for partner in partners:
-            sent = EDITransaction.objects.filter(
-                partner_id=partner.id,
-                folder='sent',
-                sent_at__gte=cutoff_date
-            )
-            
-            total = sent.count()
-            if total == 0:
-                continue
-            
-            acknowledged = sent.filter(acknowledgment_status='acknowledged').count()
-            failed = sent.filter(acknowledgment_status='rejected').count()
-            
-            success_rate = (acknowledged / total * 100) if total > 0 else 0
+        result = []
+        for row in sent:
+            total = row['total']
+            success_rate = (row['acknowledged'] / total * 100) if total > 0 else 0
             
             result.append({
-                'partner_id': str(partner.id),
-                'partner_name': partner.name,
+                'partner_id': str(row['trading_partner']),
+                'partner_name': row['trading_partner__name'],
                 'total': total,
-                'acknowledged': acknowledged,
-                'failed': failed,
+                'acknowledged': row['acknowledged'],
+                'failed': row['failed'],
                 'success_rate': round(success_rate, 1),
             })
         
@@ -300,7 +290,7 @@ class AnalyticsService:
         cutoff_date = timezone.now() - timedelta(days=days)
         
         transactions = EDITransaction.objects.filter(
-            partner_id=partner_id,
+            trading_partner_id=partner_id,
             created_at__gte=cutoff_date
         )
         
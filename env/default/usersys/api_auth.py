@@ -48,9 +48,9 @@ def api_authenticate(required_permissions=None):
                     start_time
                 )
             
-            # Validate API key
+            # Validate API key (cached; see APIKey.get_cached)
             try:
-                api_key = APIKey.objects.get(key=api_key_value)
+                api_key = APIKey.get_cached(api_key_value)
             except APIKey.DoesNotExist:
                 return log_and_respond(
                     request, None, 'denied', 401,
@@ -75,17 +75,20 @@ def api_authenticate(required_permissions=None):
                     start_time
                 )
             
-            # Check rate limit
-            if not api_key.check_rate_limit():
-                return log_and_respond(
+            # Count the request and check the rate limit in one atomic step
+            if not api_key.increment_usage():
+                response = log_and_respond(
                     request, api_key, 'rate_limited', 429,
                     {
                         'error': 'Rate limit exceeded',
                         'limit': api_key.rate_limit,
-                        'reset_time': api_key.usage_reset_time.isoformat()
+                        'reset_time': api_key.usage_reset_time.isoformat(),
+                        'retry_after': api_key.retry_after
                     },
                     start_time
                 )
+                response['Retry-After'] = str(api_key.retry_after)
+                return response
             
             # Check permissions
             for permission in required_permissions:
@@ -99,9 +102,6 @@ def api_authenticate(required_permissions=None):
                         start_time
                     )
             
-            # Increment usage
-            api_key.increment_usage()
-            
             # Attach API key to request for use in view
             request.api_key = api_key
             request.api_start_time = start_time
@@ -137,12 +137,13 @@ def log_and_respond(request, api_key, status, code, response_data, start_time):
 
 
 def log_audit(request, api_key, status, code, message, start_time):
-    """Create audit log entry"""
+    """Create audit log entry (queued, see audit_buffer)"""
     from .api_models import APIAuditLog
+    from .audit_buffer import get_buffer
     
     duration = int((time.time() - start_time) * 1000)  # Convert to milliseconds
     
-    APIAuditLog.objects.create(
+    get_buffer(APIAuditLog).add(APIAuditLog(
         api_key=api_key,
         endpoint=request.path,
         method=request.method,
@@ -153,4 +154,4 @@ def log_audit(request, api_key, status, code, message, start_time):
         response_code=code,
         response_message=str(message)[:500],
         duration_ms=duration
-    )
+    ))
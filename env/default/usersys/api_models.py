@@ -3,13 +3,32 @@ Bots EDI API Models
 Manages API authentication, permissions, and access control
 """
 
+import time
 import secrets
 import hashlib
 from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import m2m_changed
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .rate_limiter import get_limiter
+from .request_profiler import record_cache_lookup
+
+
+# Resolved keys are cached for this many seconds (settings.API_KEY_CACHE_TTL).
+# Saving or deleting a key or one of its permissions drops the entry from the
+# configured cache; with a per-process cache other workers keep their copy
+# until it expires
+DEFAULT_KEY_CACHE_TTL = 60
+
+RATE_LIMIT_WINDOW = 3600  # rate_limit is per hour
+
+# current_usage/last_used are copied to the database at most this often per key
+USAGE_FLUSH_INTERVAL = 60
+
 
 class APIKey(models.Model):
     """API Key model for authentication"""
@@ -52,12 +71,51 @@ class APIKey(models.Model):
         if not self.key:
             self.key = self.generate_key()
         super().save(*args, **kwargs)
+        self.invalidate_cache()
+    
+    def delete(self, *args, **kwargs):
+        self.invalidate_cache()
+        return super().delete(*args, **kwargs)
     
     @staticmethod
     def generate_key():
         """Generate a secure random API key"""
         return secrets.token_urlsafe(48)
     
+    @staticmethod
+    def _cache_key(key_value):
+        # Hashed so raw keys never appear in the cache backend
+        return 'api_key:' + hashlib.sha256(key_value.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def get_cached(cls, key_value):
+        """
+        Resolve an API key, using the cache when possible
+        
+        The cached copy carries the user and active permission codes, so an
+        authenticated request normally needs no database query. A revoked or
+        changed key may still resolve from another worker's cache for up to
+        API_KEY_CACHE_TTL seconds unless the cache is shared.
+        
+        Raises:
+            APIKey.DoesNotExist: If the key is unknown
+        """
+        cache_key = cls._cache_key(key_value)
+        api_key = cache.get(cache_key)
+        record_cache_lookup('api_key', api_key is not None)
+        if api_key is None:
+            api_key = cls.objects.select_related('user').get(key=key_value)
+            api_key._permission_codes = frozenset(
+                api_key.permissions.filter(is_active=True).values_list('code', flat=True)
+            )
+            cache.set(cache_key, api_key, getattr(settings, 'API_KEY_CACHE_TTL', DEFAULT_KEY_CACHE_TTL))
+        return api_key
+    
+    def invalidate_cache(self):
+        """Drop the cached copy of this key"""
+        if self.key:
+            cache.delete(self._cache_key(self.key))
+    
     def is_valid(self):
         """Check if API key is valid and not expired"""
         if not self.is_active:
@@ -66,23 +124,45 @@ class APIKey(models.Model):
             return False
         return True
     
-    def check_rate_limit(self):
-        """Check if rate limit has been exceeded"""
-        now = timezone.now()
-        
-        # Reset counter if hour has passed
-        if now > self.usage_reset_time:
-            self.current_usage = 0
-            self.usage_reset_time = now + timedelta(hours=1)
-            self.save()
-        
-        return self.current_usage < self.rate_limit
+    def _rate_key(self):
+        # Keyed by the key itself, not the pk, which the database may reuse
+        return self._cache_key(self.key)
     
     def increment_usage(self):
-        """Increment usage counter"""
-        self.current_usage += 1
+        """
+        Count a request against the rate limit (sliding window over the last hour)
+        
+        Counted with an atomic increment in the shared rate limit store
+        (see rate_limiter), and allowed or not on the count that increment
+        returns, so concurrent requests for one key can neither overshoot the
+        limit nor lose counts, across worker processes. Rejected requests are
+        counted too. The database fields are refreshed with a single UPDATE
+        at most every USAGE_FLUSH_INTERVAL seconds, for the admin and /status.
+        
+        Returns:
+            bool: Whether the request is within the limit (retry_after is set
+            when it is not)
+        """
+        now = time.time()
+        result = get_limiter().hit(self._rate_key(), (self.rate_limit, RATE_LIMIT_WINDOW), now)
+        
+        self.current_usage = result.count
         self.last_used = timezone.now()
-        self.save()
+        self.usage_reset_time = self._window_end(now)
+        self.retry_after = result.retry_after
+        
+        if cache.add(f'api_usage_flush:{self.pk}', 1, USAGE_FLUSH_INTERVAL):
+            APIKey.objects.filter(pk=self.pk).update(
+                current_usage=self.current_usage,
+                last_used=self.last_used,
+                usage_reset_time=self.usage_reset_time
+            )
+        return result.allowed
+    
+    @staticmethod
+    def _window_end(now):
+        end = (int(now // RATE_LIMIT_WINDOW) + 1) * RATE_LIMIT_WINDOW
+        return timezone.now() + timedelta(seconds=end - now)
     
     def check_ip(self, ip_address):
         """Check if IP address is allowed"""
@@ -93,6 +173,9 @@ class APIKey(models.Model):
     
     def has_permission(self, permission_code):
         """Check if API key has specific permission"""
+        codes = getattr(self, '_permission_codes', None)
+        if codes is not None:
+            return permission_code in codes
         return self.permissions.filter(code=permission_code, is_active=True).exists()
 
 
@@ -129,6 +212,19 @@ class APIPermission(models.Model):
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._invalidate_keys()
+    
+    def delete(self, *args, **kwargs):
+        self._invalidate_keys()
+        return super().delete(*args, **kwargs)
+    
+    def _invalidate_keys(self):
+        if self.pk:
+            for api_key in self.api_keys.only('key'):
+                api_key.invalidate_cache()
 
 
 class APIAuditLog(models.Model):
@@ -152,7 +248,7 @@ class APIAuditLog(models.Model):
     response_code = models.IntegerField()
     response_message = models.TextField(blank=True)
     
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)  # set when logged, not when written
     duration_ms = models.IntegerField(help_text="Request duration in milliseconds")
     
     class Meta:
@@ -168,3 +264,58 @@ class APIAuditLog(models.Model):
     
     def __str__(self):
         return f"{self.method} {self.endpoint} - {self.response_status} ({self.timestamp})"
+
+
+class APIUpload(models.Model):
+    """File received through the API and queued for bots, for duplicate detection"""
+    
+    api_key = models.ForeignKey(APIKey, on_delete=models.SET_NULL, null=True, related_name='uploads')
+    trading_partner = models.ForeignKey(
+        'Partner',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='api_uploads'
+    )
+    filename = models.CharField(max_length=255)
+    file_path = models.CharField(max_length=500, help_text="Path in the bots infile directory")
+    file_size = models.BigIntegerField()
+    content_hash = models.CharField(max_length=64)  # SHA-256
+    
+    # Envelope identifiers (see duplicate_detection)
+    interchange_sender = models.CharField(max_length=35, blank=True, default='')
+    interchange_receiver = models.CharField(max_length=35, blank=True, default='')
+    interchange_control_number = models.CharField(max_length=14, blank=True, default='')
+    
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name = "API Upload"
+        verbose_name_plural = "API Uploads"
+        app_label = 'usersys'
+        indexes = [
+            models.Index(fields=['content_hash'], name='usersys_apiupload_hash_idx'),
+            models.Index(
+                fields=['interchange_sender', 'interchange_receiver', 'interchange_control_number'],
+                name='usersys_apiupload_icn_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.filename} ({self.created_at})"
+
+
+def _permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop cached keys when permissions are added to or removed from them"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        instance.invalidate_cache()
+    elif action == 'pre_clear':
+        instance._invalidate_keys()
+    else:
+        for api_key in APIKey.objects.filter(pk__in=pk_set).only('key'):
+            api_key.invalidate_cache()
+
+
+m2m_changed.connect(_permissions_changed, sender=APIKey.permissions.through)
@@ -5,10 +5,19 @@ REST API endpoints for EDI operations
 
 import os
 import json
-from django.http import JsonResponse, FileResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from .api_auth import api_authenticate
+from .file_serving import serve_file
+from .upload_ingest import UploadIngest, staging_path
+from .api_models import APIUpload
+from .partner_models import Partner
+from .duplicate_detection import (
+    DuplicateDetector, DuplicateInterchange, interchange_key, get_action, original_kind
+)
 import bots.botsinit
 import bots.botslib
 import bots.botsglobal
@@ -32,6 +41,11 @@ def upload_file(request):
     Headers: X-API-Key: your-api-key
     Body: multipart/form-data with 'file' field
     Optional params: route, partner, messagetype
+    
+    Resent interchanges and files are handled per DUPLICATE_INTERCHANGE_ACTION
+    before anything reaches bots: rejected (409), not queued (link), or
+    queued and reported (flag). Queued files are recorded as APIUpload, so
+    resends of earlier API uploads are caught as well as of transactions.
     """
     try:
         if 'file' not in request.FILES:
@@ -52,25 +66,83 @@ def upload_file(request):
         
         os.makedirs(infile_dir, exist_ok=True)
         
-        # Save file
+        # Stage file - written, hashed and header-parsed in one pass
         file_path = os.path.join(infile_dir, uploaded_file.name)
-        with open(file_path, 'wb+') as destination:
-            for chunk in uploaded_file.chunks():
-                destination.write(chunk)
+        staged = staging_path(botssys_dir)
+        result = UploadIngest.ingest(uploaded_file, staged)
+        
+        duplicate = None
+        try:
+            key = interchange_key(result['metadata'])
+            trading_partner = Partner.objects.filter(partner_id=partner).first() if partner else None
+            original, reason = DuplicateDetector.find(trading_partner, result['sha256'], key, uploads=True)
+            if original:
+                action = get_action()
+                duplicate = {'of': str(original.id), 'kind': original_kind(original), 'reason': reason, 'action': action}
+                if action == 'reject':
+                    raise DuplicateInterchange(original, reason)
+                if action == 'link':
+                    DuplicateDetector.link(
+                        original, reason, staged, request.api_key.user,
+                        filename=uploaded_file.name,
+                        content_hash=result['sha256'],
+                        source='api'
+                    )
+                    return JsonResponse({
+                        'success': True,
+                        'message': 'Duplicate of an earlier file, not queued for processing',
+                        'duplicate': duplicate
+                    }, status=200)
+            
+            # Record it for later duplicate checks, and hand the file to bots only once it is accepted
+            sender, receiver, control_number = key or ('', '', '')
+            with transaction.atomic():
+                APIUpload.objects.create(
+                    api_key=request.api_key,
+                    trading_partner=trading_partner,
+                    filename=uploaded_file.name,
+                    file_path=file_path,
+                    file_size=result['size'],
+                    content_hash=result['sha256'],
+                    interchange_sender=sender,
+                    interchange_receiver=receiver,
+                    interchange_control_number=control_number
+                )
+                os.replace(staged, file_path)
+        except BaseException:
+            if os.path.exists(staged):
+                os.remove(staged)
+            raise
         
         return JsonResponse({
             'success': True,
             'message': 'File uploaded successfully',
             'file': {
                 'name': uploaded_file.name,
-                'size': uploaded_file.size,
+                'size': result['size'],
+                'sha256': result['sha256'],
+                'format': result['format'],
+                'document_type': result['metadata'].get('document_type_code'),
                 'path': file_path,
                 'route': route,
                 'partner': partner,
                 'messagetype': messagetype
-            }
+            },
+            'duplicate': duplicate
         }, status=201)
         
+    except DuplicateInterchange as e:
+        return JsonResponse({
+            'error': 'Duplicate',
+            'message': f'Duplicate {e.reason}: already received',
+            'duplicate_of': str(e.original.id),
+            'kind': original_kind(e.original)
+        }, status=409)
+    except ValidationError as e:
+        return JsonResponse({
+            'error': 'Upload rejected',
+            'message': ' '.join(e.messages)
+        }, status=400)
     except Exception as e:
         return JsonResponse({
             'error': 'Upload failed',
@@ -87,6 +159,7 @@ def download_file(request, file_id):
     
     GET /api/v1/files/download/<file_id>
     Headers: X-API-Key: your-api-key
+    Supports If-None-Match and Range
     """
     try:
         botssys_dir = bots.botsglobal.ini.get('directories', 'botssys')
@@ -98,9 +171,7 @@ def download_file(request, file_id):
         if not os.path.exists(file_path):
             return JsonResponse({'error': 'File not found'}, status=404)
         
-        response = FileResponse(open(file_path, 'rb'))
-        response['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_path)}"'
-        return response
+        return serve_file(request, file_path)
         
     except Exception as e:
         return JsonResponse({
@@ -16,6 +16,7 @@ class UsersysConfig(AppConfig):
         # Import models to ensure they're registered
         from . import api_models
         from . import modern_edi_models
+        from . import log_models
         
         # Register custom URLs with bots
         from . import url_extensions
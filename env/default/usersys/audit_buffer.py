@@ -0,0 +1,195 @@
+"""
+Audit Buffer
+Batched background writes for audit rows (ActivityLog, APIAuditLog)
+
+Logging puts an unsaved row on an in-process queue and returns. A daemon
+thread per model drains the queue with bulk_create, every
+AUDIT_BUFFER_BATCH_SIZE rows or AUDIT_BUFFER_FLUSH_MS milliseconds, whichever
+comes first. When the queue is full the caller waits up to
+AUDIT_BUFFER_BLOCK_MS for room and then writes its row itself, so a writer
+that falls behind slows requests down instead of dropping rows. Queued rows
+are flushed when the process exits.
+
+Rows logged inside a transaction are saved directly, so they still commit or
+roll back with it.
+
+A batch that fails with OperationalError (SQLite's "database is locked") is
+retried with backoff. If it still fails, or fails for another reason, its
+rows are inserted one by one, so only the offending rows are lost.
+"""
+
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connection, OperationalError
+
+
+logger = logging.getLogger('modern_edi.audit')
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_MS = 500
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BLOCK_MS = 50
+SHUTDOWN_TIMEOUT = 5
+WRITE_RETRIES = 3
+RETRY_DELAY = 0.1
+
+
+def is_enabled():
+    """Whether audit rows are buffered (settings.AUDIT_BUFFER_ENABLED)"""
+    return getattr(settings, 'AUDIT_BUFFER_ENABLED', True)
+
+
+class AuditBuffer:
+    """
+    Queue of unsaved rows for one model, written by a background thread
+    
+    Args:
+        model: Model class of the rows
+    """
+    
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+    
+    def add(self, instance):
+        """
+        Save a row, normally through the queue
+        
+        Args:
+            instance: Unsaved model instance
+        """
+        if not is_enabled() or connection.in_atomic_block:
+            instance.save(force_insert=True)
+            return
+        
+        self._start()
+        try:
+            self._queue.put(instance, timeout=getattr(settings, 'AUDIT_BUFFER_BLOCK_MS', DEFAULT_BLOCK_MS) / 1000)
+        except queue.Full:
+            instance.save(force_insert=True)
+    
+    def flush(self, timeout=None):
+        """
+        Wait until every queued row is written
+        
+        Rows the writer has not picked up within timeout seconds are written
+        by the calling thread.
+        """
+        if self._queue is None or self._pid != os.getpid():
+            return
+        
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks and self._thread.is_alive():
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.01)
+        
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+    
+    def _start(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # New process (or forked worker): rows queued by the parent are its to write
+                self._queue = queue.Queue(maxsize=getattr(settings, 'AUDIT_BUFFER_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+                self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f'audit-{self.model._meta.model_name}',
+                daemon=True
+            )
+            self._thread.start()
+    
+    def _run(self):
+        batch_size = getattr(settings, 'AUDIT_BUFFER_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        interval = getattr(settings, 'AUDIT_BUFFER_FLUSH_MS', DEFAULT_FLUSH_MS) / 1000
+        
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + interval
+            while len(batch) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+    
+    def _write(self, batch):
+        try:
+            for attempt in range(WRITE_RETRIES + 1):
+                try:
+                    self.model.objects.bulk_create(batch)
+                    return
+                except OperationalError as e:
+                    if attempt == WRITE_RETRIES:
+                        break
+                    logger.warning("Retrying %d %s rows: %s", len(batch), self.model.__name__, e)
+                    close_old_connections()
+                    time.sleep(RETRY_DELAY * 2 ** attempt)
+                except Exception:
+                    break
+            self._write_rows(batch)
+        finally:
+            close_old_connections()
+    
+    def _write_rows(self, batch):
+        """Insert rows one by one after the batch failed"""
+        failed = 0
+        for instance in batch:
+            try:
+                instance.save(force_insert=True)
+            except Exception:
+                # Don't let logging errors take the writer down
+                failed += 1
+                logger.exception("Failed to write %s row", self.model.__name__)
+        if failed:
+            logger.error("Dropped %d of %d %s rows", failed, len(batch), self.model.__name__)
+
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+def get_buffer(model):
+    """Shared AuditBuffer for a model"""
+    buffer = _buffers.get(model)
+    if buffer is None:
+        with _buffers_lock:
+            buffer = _buffers.setdefault(model, AuditBuffer(model))
+    return buffer
+
+
+def flush_all(timeout=SHUTDOWN_TIMEOUT):
+    """Write all queued audit rows (registered to run at exit)"""
+    for buffer in list(_buffers.values()):
+        buffer.flush(timeout)
+
+
+atexit.register(flush_all)
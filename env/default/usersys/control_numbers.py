@@ -0,0 +1,179 @@
+"""
+Control Numbers
+Envelope control numbers of sent transactions, for matching acknowledgments
+
+When a transaction is sent, the control numbers of its interchange (ISA13,
+UNB 0020), functional groups (GS06, UNG 0048) and messages (ST02, UNH 0062)
+are stored in SentControlNumber with the sender and receiver of the envelope
+they belong to, under one composite index. An acknowledgment names the
+envelope it answers, so ack_reconciler finds the original with an index
+lookup however long the send history grows. The process997 mapping looks up
+bots' ta rows by reference and partners (indexed by migration 0019) and
+links the ta id here for later 997s on the same number.
+
+Numbers are kept without leading zeros: ISA13 is zero-padded, while GS06 and
+the references partners echo back often are not.
+"""
+
+from collections import defaultdict
+
+from .edi_parser import EDIParser
+from .modern_edi_models import SentControlNumber
+
+
+X12_ENVELOPES = {'ISA': ('interchange', 5, 7, 12), 'GS': ('group', 1, 2, 5)}
+EDIFACT_ENVELOPES = {'UNB': ('interchange', 1, 2, 4), 'UNG': ('group', 1, 2, 4)}
+
+
+def _element(elements, index):
+    return elements[index].strip() if len(elements) > index else ''
+
+
+class ControlNumberIndex:
+    """Record and look up the control numbers of sent transactions"""
+    
+    @staticmethod
+    def key(level, sender, receiver, control_number):
+        """
+        Normalized lookup key
+        
+        Returns:
+            tuple: (level, sender, receiver, control number)
+        """
+        control_number = str(control_number or '').strip()
+        return (
+            level,
+            str(sender or '').strip()[:35],
+            str(receiver or '').strip()[:35],
+            (control_number.lstrip('0') or control_number)[:14],
+        )
+    
+    @staticmethod
+    def extract(content, parser=None):
+        """
+        Control numbers in an X12 or EDIFACT interchange
+        
+        Messages take the sender and receiver of their group, or of the
+        interchange when there are no groups (usual for EDIFACT).
+        
+        Args:
+            content: EDI content
+            parser: EDIParser used to tokenize the content
+        
+        Returns:
+            list: key() tuples, in document order
+        """
+        parser = parser or EDIParser()
+        delimiters = parser.get_delimiters(content)
+        if not delimiters:
+            return []
+        component = delimiters['component']
+        envelopes = X12_ENVELOPES if delimiters['format'] == 'X12' else EDIFACT_ENVELOPES
+        
+        keys = []
+        sender = receiver = ''
+        for offset, tag, elements in parser.iter_segments(content):
+            if tag in envelopes:
+                level, sender_at, receiver_at, number_at = envelopes[tag]
+                sender = _element(elements, sender_at).split(component)[0]
+                receiver = _element(elements, receiver_at).split(component)[0]
+                keys.append(ControlNumberIndex.key(level, sender, receiver, _element(elements, number_at)))
+            elif tag in ('ST', 'UNH'):
+                number = _element(elements, 1 if tag == 'ST' else 0)
+                keys.append(ControlNumberIndex.key('message', sender, receiver, number))
+        return [key for key in keys if key[3]]
+    
+    @staticmethod
+    def record(txn, content=None, parser=None):
+        """
+        Store the control numbers of a transaction being sent
+        
+        Args:
+            txn: EDITransaction
+            content: EDI content (read from txn.file_path when omitted)
+        
+        Returns:
+            int: Number of control numbers stored
+        """
+        if content is None:
+            with open(txn.file_path, 'r', encoding='utf-8', errors='replace') as f:
+                content = f.read()
+        
+        # A resend replaces the numbers of the earlier attempt
+        SentControlNumber.objects.filter(transaction=txn).delete()
+        rows = [
+            SentControlNumber(
+                transaction=txn,
+                bots_ta_id=txn.bots_ta_id,
+                level=level,
+                sender=sender,
+                receiver=receiver,
+                control_number=control_number
+            )
+            for level, sender, receiver, control_number in ControlNumberIndex.extract(content, parser)
+        ]
+        SentControlNumber.objects.bulk_create(rows)
+        return len(rows)
+    
+    @staticmethod
+    def find(keys):
+        """
+        Sent transactions for acknowledged control numbers
+        
+        One indexed query per sender, receiver and level. When a number was
+        reused, the latest send is taken.
+        
+        Args:
+            keys: key() tuples
+        
+        Returns:
+            dict: key -> EDITransaction, one instance per transaction
+        """
+        numbers = defaultdict(set)
+        for level, sender, receiver, control_number in keys:
+            numbers[(sender, receiver, level)].add(control_number)
+        
+        found = {}
+        transactions = {}
+        for (sender, receiver, level), control_numbers in numbers.items():
+            rows = SentControlNumber.objects.filter(
+                sender=sender,
+                receiver=receiver,
+                level=level,
+                control_number__in=control_numbers,
+                transaction__folder='sent'
+            ).select_related('transaction').order_by('created_at')
+            for row in rows:
+                txn = transactions.setdefault(row.transaction_id, row.transaction)
+                found[(level, sender, receiver, row.control_number)] = txn
+        return found
+    
+    @staticmethod
+    def latest(key):
+        """
+        Latest send of a control number
+        
+        Numbers wrap and get reused, so only the newest row stands for the
+        envelope an acknowledgment answers.
+        
+        Returns:
+            SentControlNumber or None
+        """
+        level, sender, receiver, control_number = key
+        return SentControlNumber.objects.filter(
+            sender=sender, receiver=receiver, level=level, control_number=control_number
+        ).order_by('-created_at', '-id').first()
+    
+    @staticmethod
+    def ta_id(key):
+        """bots ta id linked to the latest send of a control number, or None"""
+        row = ControlNumberIndex.latest(key)
+        return row.bots_ta_id if row else None
+    
+    @staticmethod
+    def link_ta(key, idta):
+        """Link the latest send of a control number to its bots ta row"""
+        row = ControlNumberIndex.latest(key)
+        if row is None or row.bots_ta_id == idta:
+            return 0
+        return SentControlNumber.objects.filter(pk=row.pk).update(bots_ta_id=idta)
@@ -0,0 +1,150 @@
+"""
+Duplicate Detection
+Catch resent interchanges and files before they become new transactions
+
+Partners often resend the same file, or the same interchange under a new
+file name. At ingest time a transaction is matched against earlier ones of
+the same partner by interchange key (sender, receiver, ISA13/UNB0020 control
+number) and by SHA-256 content hash, both indexed lookups. Files received
+through the API go to bots without a transaction; they are recorded as
+APIUpload rows and matched the same way. What happens to a match is set by
+DUPLICATE_INTERCHANGE_ACTION:
+
+    reject  refuse the file (DuplicateInterchange)
+    link    keep no copy; record the resend on the original and return it
+    flag    store it as usual, pointing duplicate_of at the original
+"""
+
+import os
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.utils import timezone
+
+from .api_models import APIUpload
+from .modern_edi_models import EDITransaction, TransactionHistory
+
+
+logger = logging.getLogger('modern_edi.duplicates')
+
+
+DUPLICATE_ACTIONS = ('reject', 'link', 'flag')
+DEFAULT_ACTION = 'flag'
+
+# Control numbers wrap and get reused; older matches are not duplicates
+DEFAULT_WINDOW_DAYS = 90
+
+
+class DuplicateInterchange(ValidationError):
+    """Raised when a duplicate is rejected"""
+    
+    def __init__(self, original, reason):
+        super().__init__(f"Duplicate {reason} of {original_kind(original).replace('_', ' ')} {original.id}")
+        self.original = original
+        self.reason = reason
+
+
+def get_action():
+    """Configured action for duplicates (settings.DUPLICATE_INTERCHANGE_ACTION)"""
+    action = getattr(settings, 'DUPLICATE_INTERCHANGE_ACTION', DEFAULT_ACTION)
+    if action not in DUPLICATE_ACTIONS:
+        raise ImproperlyConfigured(
+            f"DUPLICATE_INTERCHANGE_ACTION must be one of {', '.join(DUPLICATE_ACTIONS)}"
+        )
+    return action
+
+
+def original_kind(original):
+    """'transaction' or 'api_upload'"""
+    return 'api_upload' if isinstance(original, APIUpload) else 'transaction'
+
+
+def interchange_key(metadata):
+    """
+    Envelope identifiers from parser metadata
+    
+    Returns:
+        tuple or None: (sender, receiver, control number), None without a control number
+    """
+    control_number = str(metadata.get('control_number') or '').strip()
+    if not control_number:
+        return None
+    return (
+        str(metadata.get('sender_id') or '').strip()[:35],
+        str(metadata.get('receiver_id') or '').strip()[:35],
+        control_number[:14],
+    )
+
+
+class DuplicateDetector:
+    """Look up earlier copies of an incoming interchange"""
+    
+    @staticmethod
+    def find(partner, content_hash, key=None, uploads=False):
+        """
+        Find the original of a duplicate
+        
+        Args:
+            partner: Partner the file is received for, or None to match any
+                partner (the interchange key names both ends)
+            content_hash: SHA-256 hex digest of the file
+            key: interchange_key() of the file, if it has an envelope
+            uploads: Also match files received through the API
+        
+        Returns:
+            tuple: (original, reason) or (None, None); original is an
+            EDITransaction or, with uploads, an APIUpload; reason is
+            'interchange' or 'file'
+        """
+        candidates = [EDITransaction.objects.filter(duplicate_of__isnull=True).exclude(folder='deleted')]
+        if uploads:
+            candidates.append(APIUpload.objects.all())
+        if partner is not None:
+            candidates = [originals.filter(trading_partner=partner) for originals in candidates]
+        candidates = [originals.order_by('created_at') for originals in candidates]
+        
+        if key:
+            window = getattr(settings, 'DUPLICATE_INTERCHANGE_WINDOW_DAYS', DEFAULT_WINDOW_DAYS)
+            sender, receiver, control_number = key
+            for originals in candidates:
+                original = originals.filter(
+                    interchange_sender=sender,
+                    interchange_receiver=receiver,
+                    interchange_control_number=control_number,
+                    created_at__gte=timezone.now() - timedelta(days=window)
+                ).first()
+                if original:
+                    return original, 'interchange'
+        
+        if content_hash:
+            for originals in candidates:
+                original = originals.filter(content_hash=content_hash).first()
+                if original:
+                    return original, 'file'
+        
+        return None, None
+    
+    @staticmethod
+    def link(original, reason, staged_path, user=None, **details):
+        """
+        Record a resend on its original and drop the staged copy ('link')
+        
+        Args:
+            original: EDITransaction or APIUpload from find()
+            reason: 'interchange' or 'file'
+            staged_path: The resent file, removed
+            user: User who sent it
+            details: Extra history details (filename, content_hash, source)
+        """
+        if isinstance(original, EDITransaction):
+            TransactionHistory.objects.create(
+                transaction=original,
+                action='duplicate_received',
+                user=user,
+                details={'reason': reason, **details}
+            )
+        else:
+            logger.info("Duplicate %s of API upload %s not queued: %s", reason, original.id, details)
+        os.remove(staged_path)
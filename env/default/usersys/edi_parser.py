@@ -3,11 +3,19 @@ EDI Parser Utilities
 Parse and generate EDI files with metadata extraction
 """
 
+import io
 import os
 import re
+import time
 from datetime import datetime
 from django.core.exceptions import ValidationError
 
+from . import pipeline_metrics
+
+
+# Characters read at a time when tokenizing a file
+READ_CHUNK_SIZE = 64 * 1024
+
 
 class EDIParser:
     """Utility class for parsing EDI files"""
@@ -242,6 +250,10 @@ class EDIParser:
                         if len(datetime_parts) >= 2:
                             metadata['interchange_date'] = datetime_parts[0]
                             metadata['interchange_time'] = datetime_parts[1]
+                        
+                        # Interchange control reference
+                        if len(elements) >= 6:
+                            metadata['control_number'] = elements[5].split(component_sep)[0]
                 
                 # Parse UNH (Message Header)
                 elif segment_id == 'UNH':
@@ -306,6 +318,136 @@ class EDIParser:
         
         return metadata
     
+    def get_delimiters(self, content):
+        """
+        Read delimiters from the interchange envelope
+        
+        Args:
+            content: EDI content
+        
+        Returns:
+            Dictionary with format, element, component, segment and release
+            characters, or None for formats without segments
+        """
+        format_type = self.detect_format(content)
+        content = content.lstrip()
+        
+        if format_type == 'X12':
+            delimiters = {'format': 'X12', 'element': content[3], 'component': '>', 'segment': '~', 'release': None}
+            # ISA is fixed width: component separator at 104, terminator at 105
+            if len(content) > 105 and content[103] == delimiters['element']:
+                delimiters['component'] = content[104]
+                if not content[105].isspace():
+                    delimiters['segment'] = content[105]
+                else:
+                    delimiters['segment'] = '\n'
+            return delimiters
+        
+        if format_type == 'EDIFACT':
+            delimiters = {'format': 'EDIFACT', 'element': '+', 'component': ':', 'segment': "'", 'release': '?'}
+            if content.startswith('UNA') and len(content) >= 9:
+                delimiters['component'] = content[3]
+                delimiters['element'] = content[4]
+                delimiters['release'] = content[6] if content[6] != ' ' else None
+                delimiters['segment'] = content[8]
+            return delimiters
+        
+        return None
+    
+    def _split(self, text, separator, release):
+        """Split on separator, honouring the EDIFACT release character"""
+        if not release or release not in text:
+            return text.split(separator)
+        
+        parts = []
+        current = []
+        escaped = False
+        for char in text:
+            if escaped:
+                current.append(char)
+                escaped = False
+            elif char == release:
+                escaped = True
+            elif char == separator:
+                parts.append(''.join(current))
+                current = []
+            else:
+                current.append(char)
+        parts.append(''.join(current))
+        return parts
+    
+    def iter_segments(self, content):
+        """
+        Tokenize X12 or EDIFACT content into segments
+        
+        Args:
+            content: EDI content
+        
+        Yields:
+            tuple: (offset, segment_id, elements) where offset is the character
+            offset of the segment in content and elements excludes the tag
+        """
+        return self.iter_file_segments(io.StringIO(content))
+    
+    def iter_file_segments(self, f, chunk_size=READ_CHUNK_SIZE, head=''):
+        """
+        Tokenize an open text file into segments, reading it chunk by chunk
+        
+        Args:
+            f: File opened in text mode
+            chunk_size: Characters read at a time
+            head: Text already read from the start of f
+        
+        Yields:
+            tuple: (offset, segment_id, elements) as iter_segments(); only the
+            current segment and one chunk are held in memory
+        """
+        buffer = head + f.read(chunk_size)
+        delimiters = self.get_delimiters(buffer)
+        if not delimiters:
+            return
+        
+        element_sep = delimiters['element']
+        segment_term = delimiters['segment']
+        release = delimiters['release']
+        
+        # Character offset of buffer[0] in the file
+        base = 0
+        position = 0
+        if buffer.lstrip().startswith('UNA'):
+            position = buffer.index('UNA') + 9
+        
+        eof = False
+        while True:
+            end = buffer.find(segment_term, position)
+            # A released terminator is part of the data, keep looking
+            while release and end > 0 and buffer[end - 1] == release:
+                end = buffer.find(segment_term, end + 1)
+            if end == -1:
+                more = '' if eof else f.read(chunk_size)
+                if more:
+                    # Keep the partial segment and search again
+                    base += position
+                    buffer = buffer[position:] + more
+                    position = 0
+                    continue
+                eof = True
+                if position >= len(buffer):
+                    return
+                end = len(buffer)
+            
+            raw = buffer[position:end]
+            stripped = raw.lstrip()
+            offset = base + position + (len(raw) - len(stripped))
+            stripped = stripped.rstrip()
+            position = end + len(segment_term)
+            
+            if not stripped:
+                continue
+            
+            elements = self._split(stripped, element_sep, release)
+            yield offset, elements[0], elements[1:]
+    
     def parse_edi_file(self, file_path):
         """
         Parse EDI file and extract metadata
@@ -330,10 +472,13 @@ class EDIParser:
         format_type = self.detect_format(content)
         
         # Parse based on format
+        started = time.perf_counter()
         if format_type == 'X12':
             metadata = self.parse_x12(content)
+            pipeline_metrics.record_parse(format_type, time.perf_counter() - started, metadata)
         elif format_type == 'EDIFACT':
             metadata = self.parse_edifact(content)
+            pipeline_metrics.record_parse(format_type, time.perf_counter() - started, metadata)
         else:
             # For other formats, return basic metadata
             metadata = {
@@ -499,3 +644,85 @@ class EDIParser:
         result['valid'] = len(result['errors']) == 0
         
         return result
+
+
+class HeaderParser:
+    """
+    Incremental envelope parser for streamed uploads
+    
+    Chunks are fed as they arrive. Only the first HEADER_BYTES are kept, and
+    the complete segments among them are parsed on close(), so interchange,
+    group and message headers are available without reading the whole file.
+    Bytes are decoded as latin-1, which maps every byte to one character.
+    """
+    
+    HEADER_BYTES = 16 * 1024
+    
+    def __init__(self, parser=None):
+        self.parser = parser or EDIParser()
+        self.format = None
+        self._buffer = bytearray()
+        self._truncated = False
+    
+    @property
+    def done(self):
+        """True once enough bytes are buffered; further chunks are ignored"""
+        return len(self._buffer) >= self.HEADER_BYTES
+    
+    def _text(self):
+        data = bytes(self._buffer)
+        if data.startswith(b'\xef\xbb\xbf'):
+            data = data[3:]
+        return data.decode('latin-1').lstrip()
+    
+    def feed(self, chunk):
+        """
+        Add a chunk of raw bytes
+        
+        Args:
+            chunk: bytes
+        """
+        if self.done:
+            self._truncated = True
+            return
+        
+        room = self.HEADER_BYTES - len(self._buffer)
+        if len(chunk) > room:
+            self._truncated = True
+        self._buffer += chunk[:room]
+        
+        # Sniff the format from the first bytes seen
+        if self.format is None and self._buffer.strip():
+            self.format = self.parser.detect_format(self._text())
+    
+    def close(self):
+        """
+        Parse the buffered header
+        
+        Returns:
+            Dictionary with format and header metadata (sender, receiver,
+            control numbers, document type, ...), without the segment list
+        """
+        text = self._text()
+        format_type = self.format or 'UNKNOWN'
+        
+        if format_type in ('X12', 'EDIFACT'):
+            delimiters = self.parser.get_delimiters(text)
+            if self._truncated and delimiters:
+                # Drop the trailing partial segment
+                end = text.rfind(delimiters['segment'])
+                text = text[:end + 1] if end != -1 else ''
+            
+            started = time.perf_counter()
+            if format_type == 'X12':
+                metadata = self.parser.parse_x12(text)
+            else:
+                metadata = self.parser.parse_edifact(text)
+            pipeline_metrics.record_parse(format_type, time.perf_counter() - started, metadata)
+            metadata.pop('segments', None)
+            return metadata
+        
+        return {
+            'format': format_type,
+            'parsed_at': datetime.now().isoformat(),
+        }
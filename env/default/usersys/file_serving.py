@@ -0,0 +1,201 @@
+"""
+File Serving
+Conditional and ranged file downloads with optional proxy offload
+
+ETags come from the stored SHA-256 content hash when there is one, so a
+retried download or a UI re-view answers 304 without touching the file.
+Single byte ranges are answered with 206. When FILE_SERVE_BACKEND is set the
+body is left to the front proxy (X-Accel-Redirect for nginx, X-Sendfile for
+apache/lighttpd); otherwise FileResponse lets the WSGI server use sendfile.
+"""
+
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, quote_etag
+
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+ACCEL_REDIRECT = 'x-accel-redirect'
+SENDFILE = 'x-sendfile'
+
+
+def make_etag(path, content_hash=None, stat=None):
+    """
+    Build an ETag for a file
+    
+    Args:
+        path: File path
+        content_hash: Stored SHA-256 hex digest, if known
+        stat: os.stat result, to avoid a second stat call
+    
+    Returns:
+        str: Quoted strong ETag from the hash, or a weak one from size/mtime
+    """
+    if content_hash:
+        return quote_etag(content_hash)
+    stat = stat or os.stat(path)
+    return f'W/"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def etag_matches(request, etag):
+    """Check If-None-Match against an ETag (weak comparison)"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    tags = parse_etags(header)
+    if tags == ['*']:
+        return True
+    bare = etag[2:] if etag.startswith('W/') else etag
+    return any((tag[2:] if tag.startswith('W/') else tag) == bare for tag in tags)
+
+
+def _strong_match(tag, etag):
+    # If-Range uses the strong comparison: weak ETags never match
+    return tag == etag and not etag.startswith('W/')
+
+
+def parse_range(header, size):
+    """
+    Parse a single byte range
+    
+    Args:
+        header: Range header value
+        size: File size
+    
+    Returns:
+        tuple or None: (start, end) inclusive; None to serve the whole file.
+        Raises ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if not match:
+        # Missing, malformed or multi-range: answer with the full body
+        return None
+    
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError('Empty suffix range')
+        return max(size - length, 0), size - 1
+    
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def _iter_range(path, start, end, chunk_size=CHUNK_SIZE):
+    remaining = end - start + 1
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while remaining > 0:
+            block = f.read(min(chunk_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def _accel_location(path):
+    """Map a local path to an nginx internal location, or None"""
+    locations = getattr(settings, 'FILE_SERVE_ACCEL_LOCATIONS', None) or {}
+    real_path = os.path.realpath(path)
+    for directory, location in locations.items():
+        directory = os.path.realpath(directory)
+        if real_path.startswith(directory + os.sep):
+            relative = os.path.relpath(real_path, directory).replace(os.sep, '/')
+            return location.rstrip('/') + '/' + quote(relative)
+    return None
+
+
+def _content_disposition(filename, as_attachment):
+    disposition = 'attachment' if as_attachment else 'inline'
+    try:
+        filename.encode('ascii')
+        return f'{disposition}; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"{disposition}; filename*=utf-8''{quote(filename)}"
+
+
+def serve_file(request, path, filename=None, content_hash=None, content_type=None, as_attachment=True):
+    """
+    Serve a file with ETag, If-None-Match and Range support
+    
+    Args:
+        request: HttpRequest
+        path: File path on disk
+        filename: Download name (default: basename of path)
+        content_hash: Stored SHA-256 of the content, used as the ETag
+        content_type: MIME type (default: application/octet-stream)
+        as_attachment: Send Content-Disposition: attachment
+    
+    Returns:
+        HttpResponse: 200, 206, 304 or 416
+    
+    Raises:
+        FileNotFoundError: If path does not exist
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = make_etag(path, content_hash, stat)
+    filename = filename or os.path.basename(path)
+    content_type = content_type or 'application/octet-stream'
+    
+    def finish(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Accept-Ranges'] = 'bytes'
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    if etag_matches(request, etag):
+        return finish(HttpResponseNotModified())
+    
+    backend = getattr(settings, 'FILE_SERVE_BACKEND', None)
+    if backend == ACCEL_REDIRECT:
+        location = _accel_location(path)
+        if location:
+            # nginx handles Range itself and keeps our headers
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = location
+            response['Content-Disposition'] = _content_disposition(filename, as_attachment)
+            return finish(response)
+    elif backend == SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = os.path.realpath(path)
+        response['Content-Disposition'] = _content_disposition(filename, as_attachment)
+        return finish(response)
+    
+    # If-Range: only honour Range when the client still has this version
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range or _strong_match(if_range.strip(), etag):
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return finish(response)
+    
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_iter_range(path, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    
+    response['Content-Disposition'] = _content_disposition(filename, as_attachment)
+    return finish(response)
@@ -0,0 +1,109 @@
+"""
+Transaction Lineage
+Fetch bots ta parent/child trees with recursive CTE queries
+"""
+
+from django.db import connections, router
+
+
+DEFAULT_MAX_DEPTH = 10
+DEFAULT_MAX_NODES = 500
+
+LINEAGE_FIELDS = ('idta', 'parent', 'filename', 'editype', 'status', 'ts')
+
+
+class TransactionLineage:
+    """Build lineage trees for the bots ta table in one round-trip"""
+    
+    @staticmethod
+    def find_root(ta_model, idta, max_depth=DEFAULT_MAX_DEPTH):
+        """
+        Walk parent links up to the root
+        
+        Args:
+            ta_model: bots ta model
+            idta: Starting ta id
+            max_depth: Maximum number of parent hops
+        
+        Returns:
+            int: idta of the top-most ancestor (idta itself if it has no parent)
+        """
+        table = ta_model._meta.db_table
+        sql = (
+            f"WITH RECURSIVE up(idta, parent, depth) AS ("
+            f" SELECT idta, parent, 0 FROM {table} WHERE idta = %s"
+            f" UNION ALL"
+            f" SELECT t.idta, t.parent, up.depth + 1 FROM {table} t"
+            f" JOIN up ON t.idta = up.parent"
+            f" WHERE up.depth < %s"
+            f") SELECT idta FROM up ORDER BY depth DESC LIMIT 1"
+        )
+        with connections[router.db_for_read(ta_model)].cursor() as cursor:
+            cursor.execute(sql, [idta, max_depth])
+            row = cursor.fetchone()
+        return row[0] if row else idta
+    
+    @staticmethod
+    def get_tree(ta_model, idta, max_depth=DEFAULT_MAX_DEPTH, max_nodes=DEFAULT_MAX_NODES):
+        """
+        Fetch the subtree under a ta record
+        
+        Args:
+            ta_model: bots ta model
+            idta: Root ta id
+            max_depth: Maximum depth below the root
+            max_nodes: Maximum number of nodes returned
+        
+        Returns:
+            tuple: (tree dict or None, truncated flag)
+        """
+        table = ta_model._meta.db_table
+        columns = ', '.join(LINEAGE_FIELDS)
+        child_columns = ', '.join(f't.{field}' for field in LINEAGE_FIELDS)
+        
+        # No ORDER BY: both SQLite and PostgreSQL then produce rows breadth
+        # first and stop recursing once the LIMIT is satisfied
+        sql = (
+            f"WITH RECURSIVE tree({columns}, depth) AS ("
+            f" SELECT {columns}, 0 FROM {table} WHERE idta = %s"
+            f" UNION ALL"
+            f" SELECT {child_columns}, tree.depth + 1 FROM {table} t"
+            f" JOIN tree ON t.parent = tree.idta"
+            f" WHERE tree.depth < %s"
+            f") SELECT {columns}, depth FROM tree LIMIT %s"
+        )
+        rows = list(ta_model.objects.raw(sql, [idta, max_depth, max_nodes + 1]))
+        
+        truncated = len(rows) > max_nodes
+        rows = rows[:max_nodes]
+        if not rows:
+            return None, False
+        
+        # Assemble in memory; a node seen twice (cyclic parent links) is skipped
+        nodes = {}
+        root = None
+        for row in rows:
+            if row.idta in nodes:
+                continue
+            node = {
+                'idta': row.idta,
+                'filename': row.filename,
+                'editype': row.editype,
+                'status': row.status,
+                'ts': row.ts.isoformat() if row.ts else None,
+                'children': [],
+            }
+            if root is None:
+                root = node
+            else:
+                parent = nodes.get(row.parent)
+                if parent is None:
+                    continue
+                parent['children'].append(node)
+            nodes[row.idta] = node
+        
+        for node in nodes.values():
+            node['children'].sort(key=lambda child: child['idta'])
+        
+        return root, truncated
+
@@ -0,0 +1,297 @@
+"""
+Log Index
+Incremental search index over the bots logging directory
+
+Each log file is tracked by a fingerprint of its first line, so when bots
+(or logrotate) renames engine.log to engine.log.1 and later gzips it, the
+existing entries follow the file instead of being rebuilt. Offsets are
+always uncompressed byte offsets. The index_logs command keeps it current;
+searches only read it.
+"""
+
+import os
+import re
+import gzip
+import hashlib
+from datetime import datetime
+
+from django.db import transaction
+
+from .log_models import LogFile, LogEntry
+from .modern_edi_models import ProcessingCheckpoint
+
+
+LOG_FILE_PATTERN = re.compile(r'\.log(\.\d+)?(\.gz)?$')
+
+LINE_PATTERN = re.compile(
+    rb'^(?P<ts>\d{8} \d{2}:\d{2}:\d{2}|\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})\S*\s+'
+    rb'(?P<level>DEBUG|INFO|STARTINFO|WARNING|ERROR|CRITICAL)\b'
+)
+IDTA_PATTERN = re.compile(rb'\bidta\W{0,3}(\d+)', re.IGNORECASE)
+FILENAME_PATTERN = re.compile(
+    rb'([\w\-]+\.(?:edi|x12|edifact|edf|xml|csv|json|txt|dat|idoc|inh))\b', re.IGNORECASE
+)
+
+# Lines at these levels are indexed even without an idta or filename
+INDEXED_LEVELS = ('WARNING', 'ERROR', 'CRITICAL')
+
+FINGERPRINT_BYTES = 1024
+BATCH_SIZE = 1000
+
+# Checkpoint row locked while the index is updated, so concurrent runs take turns
+LOCK_NAME = 'log_index'
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _parse_timestamp(raw):
+    text = raw.decode('ascii')
+    for fmt in ('%Y%m%d %H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def fingerprint(path):
+    """
+    Identify a log file by its first line
+    
+    Returns:
+        str or None: SHA-1 hex digest, None until the first line is complete
+    
+    Raises:
+        OSError, EOFError: If the file cannot be read
+    """
+    with _open(path) as f:
+        first_line = f.readline(FINGERPRINT_BYTES)
+    if not first_line.endswith(b'\n') and len(first_line) < FINGERPRINT_BYTES:
+        return None
+    return hashlib.sha1(first_line).hexdigest()
+
+
+def tokens_for_line(line):
+    """Extract idta and filename tokens from a raw log line"""
+    tokens = set()
+    for match in IDTA_PATTERN.finditer(line):
+        tokens.add('idta:' + match.group(1).decode('ascii'))
+    for match in FILENAME_PATTERN.finditer(line):
+        tokens.add('file:' + match.group(1).decode('utf-8', errors='replace').lower()[:115])
+    return tokens
+
+
+class LogIndexer:
+    """Build and query the log index for one logging directory"""
+    
+    def __init__(self, log_dir):
+        self.log_dir = log_dir
+    
+    def _current_files(self):
+        """
+        Map fingerprint-bearing log files to their relative paths
+        
+        Returns:
+            tuple: List of (rel_path, full_path, fingerprint), and the set of
+            relative paths that exist but could not be read
+        """
+        found = []
+        unreadable = set()
+        for root, dirs, files in os.walk(self.log_dir):
+            for name in files:
+                if not LOG_FILE_PATTERN.search(name):
+                    continue
+                full_path = os.path.join(root, name)
+                rel_path = os.path.relpath(full_path, self.log_dir)
+                try:
+                    fp = fingerprint(full_path)
+                except FileNotFoundError:
+                    # Rotated away since the directory was listed
+                    continue
+                except (OSError, EOFError):
+                    unreadable.add(rel_path)
+                    continue
+                if fp:
+                    found.append((rel_path, full_path, fp))
+        return found, unreadable
+    
+    def _reconcile(self, found, unreadable=()):
+        """
+        Match files on disk to LogFile rows, following renames
+        
+        Rows of unreadable files are kept as they are, with their entries.
+        
+        Returns:
+            list: (LogFile, full_path) pairs to scan
+        """
+        by_fingerprint = {}
+        for state in LogFile.objects.exclude(path__in=unreadable):
+            by_fingerprint.setdefault(state.fingerprint, []).append(state)
+        
+        matched = []
+        for rel_path, full_path, fp in found:
+            candidates = by_fingerprint.get(fp) or []
+            state = candidates.pop(0) if candidates else None
+            matched.append((state, rel_path, full_path, fp))
+        
+        # Files that disappeared take their entries with them
+        leftover = [state.pk for states in by_fingerprint.values() for state in states]
+        LogFile.objects.filter(pk__in=leftover).delete()
+        
+        # Move renamed files out of the way first so the unique path never clashes
+        renamed = [state for state, rel_path, _, _ in matched if state and state.path != rel_path]
+        for state in renamed:
+            LogFile.objects.filter(pk=state.pk).update(path=f'~{state.pk}')
+        
+        pairs = []
+        for state, rel_path, full_path, fp in matched:
+            if state is None:
+                state = LogFile.objects.create(path=rel_path, fingerprint=fp, compressed=full_path.endswith('.gz'))
+            elif state.path != rel_path:
+                state.path = rel_path
+                LogFile.objects.filter(pk=state.pk).update(path=rel_path)
+            pairs.append((state, full_path))
+        return pairs
+    
+    def _scan(self, state, full_path):
+        """Index lines appended since state.indexed_size (call with the lock held)"""
+        compressed = full_path.endswith('.gz')
+        modified_at = datetime.fromtimestamp(os.path.getmtime(full_path))
+        
+        if compressed and state.compressed and state.modified_at == modified_at:
+            # Compressed logs never change once written
+            return 0
+        if not compressed and os.path.getsize(full_path) <= state.indexed_size:
+            return 0
+        
+        entries = []
+        count = 0
+        offset = state.indexed_size
+        timestamp = None
+        level = ''
+        
+        with _open(full_path) as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Partial line, pick it up on the next refresh
+                    break
+                
+                header = LINE_PATTERN.match(line)
+                if header:
+                    timestamp = _parse_timestamp(header.group('ts'))
+                    level = header.group('level').decode('ascii')
+                
+                tokens = tokens_for_line(line)
+                for token in tokens:
+                    entries.append(LogEntry(log_file=state, offset=offset, timestamp=timestamp, level=level, token=token))
+                if not tokens and level in INDEXED_LEVELS:
+                    entries.append(LogEntry(log_file=state, offset=offset, timestamp=timestamp, level=level, token=''))
+                
+                if len(entries) >= BATCH_SIZE:
+                    LogEntry.objects.bulk_create(entries)
+                    count += len(entries)
+                    entries = []
+                
+                offset += len(line)
+        
+        LogEntry.objects.bulk_create(entries)
+        count += len(entries)
+        
+        state.indexed_size = offset
+        state.compressed = compressed
+        state.modified_at = modified_at
+        state.save(update_fields=['indexed_size', 'compressed', 'modified_at', 'indexed_at'])
+        return count
+    
+    def refresh(self):
+        """
+        Bring the index up to date with the logging directory
+        
+        Each file is scanned in its own transaction under the LOCK_NAME
+        checkpoint lock, re-reading its row, so a second refresh running at
+        the same time waits and then continues where the first stopped.
+        
+        Returns:
+            int: Number of entries added
+        """
+        found, unreadable = self._current_files()
+        with transaction.atomic():
+            ProcessingCheckpoint.locked(LOCK_NAME)
+            pairs = self._reconcile(found, unreadable)
+        
+        count = 0
+        for state, full_path in pairs:
+            with transaction.atomic():
+                ProcessingCheckpoint.locked(LOCK_NAME)
+                state = LogFile.objects.filter(pk=state.pk).first()
+                if state is None:
+                    continue
+                count += self._scan(state, full_path)
+        return count
+    
+    def search(self, idta=None, filename=None, level=None, since=None, until=None, limit=200):
+        """
+        Find indexed log lines
+        
+        Args:
+            idta: bots ta id
+            filename: File name mentioned in the line
+            level: Log level (ERROR, WARNING, ...)
+            since: Oldest timestamp
+            until: Newest timestamp
+            limit: Maximum number of lines
+        
+        Returns:
+            list: Dicts with path, offset, timestamp, level and line text
+        """
+        entries = LogEntry.objects.select_related('log_file')
+        if idta:
+            entries = entries.filter(token=f'idta:{idta}')
+        elif filename:
+            entries = entries.filter(token=f'file:{filename.lower()}')
+        if level:
+            entries = entries.filter(level=level.upper())
+        if since:
+            entries = entries.filter(timestamp__gte=since)
+        if until:
+            entries = entries.filter(timestamp__lte=until)
+        
+        # A line with several tokens has several entries; keep the first
+        hits = {}
+        for entry in entries.order_by('-timestamp', 'log_file_id', 'offset')[:limit * 4]:
+            key = (entry.log_file_id, entry.offset)
+            if key not in hits:
+                hits[key] = entry
+            if len(hits) >= limit:
+                break
+        
+        # Read the lines, one pass per file in offset order
+        lines = {}
+        by_file = {}
+        for entry in hits.values():
+            by_file.setdefault(entry.log_file, []).append(entry.offset)
+        for log_file, offsets in by_file.items():
+            full_path = os.path.join(self.log_dir, log_file.path)
+            try:
+                with _open(full_path) as f:
+                    for offset in sorted(offsets):
+                        f.seek(offset)
+                        lines[(log_file.pk, offset)] = f.readline().decode('utf-8', errors='replace').rstrip('\n')
+            except (OSError, EOFError):
+                continue
+        
+        return [
+            {
+                'path': entry.log_file.path,
+                'offset': entry.offset,
+                'timestamp': entry.timestamp.isoformat() if entry.timestamp else None,
+                'level': entry.level,
+                'line': lines.get(key, ''),
+            }
+            for key, entry in hits.items()
+        ]
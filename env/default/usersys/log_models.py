@@ -0,0 +1,54 @@
+"""
+Log Index Models
+Persisted search index over the bots logging directory
+"""
+
+from django.db import models
+
+
+class LogFile(models.Model):
+    """A log file known to the indexer, tracked across rotations"""
+    
+    path = models.CharField(max_length=500, unique=True, help_text="Path relative to the logging directory")
+    fingerprint = models.CharField(max_length=40, db_index=True, help_text="SHA-1 of the first bytes of the log")
+    compressed = models.BooleanField(default=False)
+    indexed_size = models.BigIntegerField(default=0, help_text="Uncompressed bytes indexed so far")
+    modified_at = models.DateTimeField(null=True, blank=True)
+    indexed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Log File"
+        verbose_name_plural = "Log Files"
+        app_label = 'usersys'
+    
+    def __str__(self):
+        return self.path
+
+
+class LogEntry(models.Model):
+    """Byte offset of a notable log line, keyed by level and token"""
+    
+    log_file = models.ForeignKey(
+        LogFile,
+        on_delete=models.CASCADE,
+        related_name='entries'
+    )
+    offset = models.BigIntegerField(help_text="Uncompressed byte offset of the line")
+    timestamp = models.DateTimeField(null=True, blank=True)
+    level = models.CharField(max_length=10, blank=True)
+    token = models.CharField(max_length=120, blank=True, help_text="idta:<n> or file:<name>, empty for level-only entries")
+    
+    class Meta:
+        verbose_name = "Log Entry"
+        verbose_name_plural = "Log Entries"
+        app_label = 'usersys'
+        indexes = [
+            models.Index(fields=['token', 'timestamp'], name='usersys_logentry_token_idx'),
+            models.Index(fields=['level', 'timestamp'], name='usersys_logentry_level_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['log_file', 'offset', 'token'], name='usersys_logentry_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.log_file.path}@{self.offset}"
@@ -0,0 +1,441 @@
+"""
+Log Partitions
+Monthly partitions for ActivityLog and APIAuditLog, so retention is a DROP
+
+Optional (settings.LOG_PARTITIONING). The layout depends on the database:
+
+PostgreSQL: the table is converted once into a native range-partitioned
+table with one partition per month (plus a default partition). The ORM
+keeps using the same table name; queries with a timestamp bound only scan
+the matching partitions, and expired months are detached and dropped.
+
+SQLite: the main database keeps the last LOG_PARTITION_HOT_MONTHS months.
+Older months are moved into one SQLite file per month and table under
+LOG_ARCHIVE_DIR, and expired months are removed by deleting their file.
+Plain ORM queries only see the recent months. The activity helpers also
+read the archived months their range covers (SQLiteArchive.read attaches
+just those files), and archive files are plain SQLite databases for ad-hoc
+queries.
+"""
+
+import os
+import re
+import logging
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+
+logger = logging.getLogger('modern_edi.logs')
+
+DEFAULT_MONTHS_AHEAD = 3
+DEFAULT_HOT_MONTHS = 2
+
+# SQLite attaches at most 10 databases per connection by default
+ATTACH_LIMIT = 10
+
+PARTITION_SUFFIX = re.compile(r'_p(\d{4})(\d{2})$')
+ARCHIVE_FILE = re.compile(r'^(?P<table>.+)_(?P<year>\d{4})_(?P<month>\d{2})\.sqlite3$')
+
+
+def is_enabled():
+    """Whether partitioned log storage is on (settings.LOG_PARTITIONING)"""
+    return getattr(settings, 'LOG_PARTITIONING', False)
+
+
+def month_start(value):
+    """First instant of the month containing value"""
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    """Month start months after (or before) the month of value"""
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def month_ranges(first, last):
+    """(start, end) of each month from the month of first up to, not including, last"""
+    start = month_start(first)
+    while start < last:
+        end = add_months(start, 1)
+        yield start, end
+        start = end
+
+
+def get_partitions(model):
+    """
+    Partition manager for a log model on the current database
+    
+    Returns:
+        PostgresPartitions, SQLiteArchive, or None when the database has no
+        partitioned layout
+    """
+    if connection.vendor == 'postgresql':
+        return PostgresPartitions(model)
+    if connection.vendor == 'sqlite':
+        return SQLiteArchive(model)
+    return None
+
+
+def _db_datetime(value):
+    return connection.ops.adapt_datetimefield_value(value)
+
+
+class PostgresPartitions:
+    """Native monthly range partitions on PostgreSQL"""
+    
+    def __init__(self, model):
+        self.model = model
+        self.table = model._meta.db_table
+    
+    def _partition_name(self, start):
+        return f'{self.table}_p{start:%Y%m}'
+    
+    def is_partitioned(self, cursor):
+        cursor.execute(
+            "SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(%s)", [self.table]
+        )
+        row = cursor.fetchone()
+        return bool(row) and row[0] == 'p'
+    
+    def partitions(self):
+        """
+        Monthly partitions
+        
+        Returns:
+            list: (month start, partition name), oldest first
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(%s)", [self.table]
+            )
+            names = [row[0] for row in cursor.fetchall()]
+        
+        result = []
+        for name in names:
+            match = PARTITION_SUFFIX.search(name)
+            if match:
+                result.append((datetime(int(match.group(1)), int(match.group(2)), 1), name))
+        return sorted(result)
+    
+    def _create_partition(self, cursor, start):
+        qn = connection.ops.quote_name
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {qn(self._partition_name(start))} PARTITION OF {qn(self.table)} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [start, add_months(start, 1)]
+        )
+    
+    @transaction.atomic
+    def convert(self):
+        """
+        Turn the table into a monthly partitioned table (one-time, locks the table)
+        
+        Returns:
+            bool: False if it was already partitioned
+        """
+        qn = connection.ops.quote_name
+        table = self.table
+        legacy = f'{table}_unpartitioned'
+        
+        with connection.cursor() as cursor:
+            if self.is_partitioned(cursor):
+                return False
+            
+            cursor.execute(f'LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE')
+            
+            # Index and foreign key definitions, recreated on the new parent table
+            cursor.execute(
+                "SELECT indexname, indexdef FROM pg_indexes "
+                "WHERE schemaname = current_schema() AND tablename = %s", [table]
+            )
+            indexes = [definition for name, definition in cursor.fetchall() if not name.endswith('_pkey')]
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = to_regclass(%s) AND contype = 'f'", [table]
+            )
+            foreign_keys = cursor.fetchall()
+            cursor.execute(
+                "SELECT is_identity FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'id'", [table]
+            )
+            identity = cursor.fetchone()[0] == 'YES'
+            cursor.execute(f'SELECT min("timestamp"), max("timestamp") FROM {qn(table)}')
+            first, last = cursor.fetchone()
+            
+            cursor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}')
+            cursor.execute(
+                f'CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                f'PARTITION BY RANGE ("timestamp")'
+            )
+            if identity:
+                # Identity sequences belong to their table, so start a new one after the old ids
+                cursor.execute(f'ALTER TABLE {qn(table)} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    f"COALESCE((SELECT max(id) FROM {qn(legacy)}), 0) + 1, false)", [table]
+                )
+            else:
+                # serial: keep the sequence alive when the old table is dropped
+                cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [legacy])
+                sequence = cursor.fetchone()[0]
+                if sequence:
+                    cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {qn(table)}.id')
+            cursor.execute(f'ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, "timestamp")')
+            
+            now = datetime.now()
+            first = first.replace(tzinfo=None) if first else now
+            for start, _ in month_ranges(min(first, now), add_months(now, self.months_ahead())):
+                self._create_partition(cursor, start)
+            cursor.execute(f'CREATE TABLE {qn(table + "_default")} PARTITION OF {qn(table)} DEFAULT')
+            
+            cursor.execute(f'INSERT INTO {qn(table)} SELECT * FROM {qn(legacy)}')
+            cursor.execute(f'DROP TABLE {qn(legacy)}')
+            
+            for definition in indexes:
+                cursor.execute(definition)
+            for name, definition in foreign_keys:
+                cursor.execute(f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}')
+        
+        logger.info("Partitioned %s by month (%s to %s)", table, first, last)
+        return True
+    
+    @staticmethod
+    def months_ahead():
+        return getattr(settings, 'LOG_PARTITION_MONTHS_AHEAD', DEFAULT_MONTHS_AHEAD)
+    
+    def maintain(self):
+        """
+        Create the partitions for the coming months
+        
+        Returns:
+            int: Partitions checked
+        """
+        now = datetime.now()
+        count = 0
+        with connection.cursor() as cursor:
+            if not self.is_partitioned(cursor):
+                return 0
+            for start, _ in month_ranges(now, add_months(now, self.months_ahead())):
+                self._create_partition(cursor, start)
+                count += 1
+        return count
+    
+    @transaction.atomic
+    def prune(self, cutoff):
+        """
+        Remove rows older than cutoff
+        
+        Months entirely before cutoff are detached and dropped; the rest is a
+        ranged DELETE that only touches the partition holding cutoff.
+        
+        Returns:
+            int: Rows removed
+        """
+        qn = connection.ops.quote_name
+        removed = 0
+        with connection.cursor() as cursor:
+            for start, name in self.partitions():
+                if add_months(start, 1) > cutoff:
+                    break
+                cursor.execute(f'SELECT count(*) FROM {qn(name)}')
+                removed += cursor.fetchone()[0]
+                cursor.execute(f'ALTER TABLE {qn(self.table)} DETACH PARTITION {qn(name)}')
+                cursor.execute(f'DROP TABLE {qn(name)}')
+        
+        deleted, _ = self.model.objects.filter(timestamp__lt=cutoff).delete()
+        return removed + deleted
+
+
+class SQLiteArchive:
+    """Closed months moved out of the main SQLite database into monthly files"""
+    
+    def __init__(self, model, directory=None):
+        self.model = model
+        self.table = model._meta.db_table
+        self.directory = directory or get_archive_dir()
+    
+    def path(self, start):
+        """Archive file of the month starting at start"""
+        return os.path.join(self.directory, f'{self.table}_{start:%Y_%m}.sqlite3')
+    
+    def months(self):
+        """
+        Archived months
+        
+        Returns:
+            list: (month start, file path), oldest first
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        result = []
+        for name in os.listdir(self.directory):
+            match = ARCHIVE_FILE.match(name)
+            if match and match.group('table') == self.table:
+                start = datetime(int(match.group('year')), int(match.group('month')), 1)
+                result.append((start, os.path.join(self.directory, name)))
+        return sorted(result)
+    
+    def _archive_schema(self, cursor):
+        """CREATE statements for the table and its indexes in the attached archive"""
+        cursor.execute(
+            "SELECT type, sql FROM main.sqlite_master WHERE tbl_name = %s AND sql IS NOT NULL "
+            "ORDER BY type DESC", [self.table]
+        )
+        statements = []
+        for kind, sql in cursor.fetchall():
+            if kind == 'table':
+                sql = sql.replace('CREATE TABLE ', 'CREATE TABLE IF NOT EXISTS archive.', 1)
+                # The referenced tables are not in the archive
+                sql = re.sub(r' REFERENCES "[^"]+" \("[^"]+"\)( DEFERRABLE INITIALLY DEFERRED)?', '', sql)
+            else:
+                sql = re.sub(r'^CREATE (UNIQUE )?INDEX ', r'CREATE \1INDEX IF NOT EXISTS archive.', sql)
+            statements.append(sql)
+        return statements
+    
+    def _archive_month(self, cursor, start, end):
+        qn = connection.ops.quote_name
+        bounds = [_db_datetime(start), _db_datetime(end)]
+        
+        cursor.execute('ATTACH DATABASE %s AS archive', [self.path(start)])
+        try:
+            with transaction.atomic():
+                for statement in self._archive_schema(cursor):
+                    cursor.execute(statement)
+                cursor.execute(
+                    f'INSERT INTO archive.{qn(self.table)} SELECT * FROM main.{qn(self.table)} '
+                    f'WHERE "timestamp" >= %s AND "timestamp" < %s', bounds
+                )
+                moved = cursor.rowcount
+                cursor.execute(
+                    f'DELETE FROM main.{qn(self.table)} WHERE "timestamp" >= %s AND "timestamp" < %s', bounds
+                )
+        finally:
+            cursor.execute('DETACH DATABASE archive')
+        return moved
+    
+    def maintain(self):
+        """
+        Move months older than LOG_PARTITION_HOT_MONTHS into archive files
+        
+        Must run outside a transaction (SQLite cannot ATTACH inside one).
+        
+        Returns:
+            int: Rows moved
+        """
+        qn = connection.ops.quote_name
+        boundary = add_months(datetime.now(), 1 - getattr(settings, 'LOG_PARTITION_HOT_MONTHS', DEFAULT_HOT_MONTHS))
+        
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT min("timestamp") FROM {qn(self.table)} WHERE "timestamp" < %s', [_db_datetime(boundary)]
+            )
+            first = cursor.fetchone()[0]
+            if not first:
+                return 0
+            
+            os.makedirs(self.directory, exist_ok=True)
+            moved = 0
+            for start, end in month_ranges(parse_datetime(first), boundary):
+                moved += self._archive_month(cursor, start, end)
+        return moved
+    
+    def read(self, filters, since=None, limit=None):
+        """
+        Rows from the archive files, newest first
+        
+        Only the files of months ending after since are attached, up to
+        ATTACH_LIMIT at a time, and read with one UNION ALL query each.
+        
+        Args:
+            filters: {column: value} equality conditions
+            since: Earliest timestamp, or None for every archived month
+            limit: Maximum number of rows
+        
+        Returns:
+            list: Model instances
+        """
+        import sqlite3
+        
+        paths = [path for start, path in self.months() if since is None or add_months(start, 1) > since]
+        if not paths:
+            return []
+        
+        fields = self.model._meta.concrete_fields
+        columns = ', '.join(f'"{field.column}"' for field in fields)
+        conditions = [f'"{column}" = ?' for column in filters]
+        params = list(filters.values())
+        if since is not None:
+            conditions.append('"timestamp" >= ?')
+            params.append(_db_datetime(since))
+        where = ' AND '.join(conditions) or '1'
+        order = ' ORDER BY "timestamp" DESC' + (f' LIMIT {int(limit)}' if limit is not None else '')
+        
+        rows = []
+        archive = sqlite3.connect(':memory:')
+        try:
+            for offset in range(0, len(paths), ATTACH_LIMIT):
+                group = paths[offset:offset + ATTACH_LIMIT]
+                for index, path in enumerate(group):
+                    archive.execute(f'ATTACH DATABASE ? AS a{index}', [path])
+                selects = [f'SELECT {columns} FROM a{index}."{self.table}" WHERE {where}' for index in range(len(group))]
+                rows.extend(archive.execute(' UNION ALL '.join(selects) + order, params * len(group)).fetchall())
+                for index in range(len(group)):
+                    archive.execute(f'DETACH DATABASE a{index}')
+        finally:
+            archive.close()
+        
+        # Same conversions the ORM applies to values read from the main database
+        converters = []
+        for field in fields:
+            column = field.get_col(self.table)
+            converters.append((column, connection.ops.get_db_converters(column) + column.get_db_converters(connection)))
+        instances = []
+        for row in rows:
+            values = []
+            for value, (column, field_converters) in zip(row, converters):
+                for converter in field_converters:
+                    value = converter(value, column, connection)
+                values.append(value)
+            instances.append(self.model.from_db(connection.alias, [field.attname for field in fields], values))
+        
+        instances.sort(key=lambda instance: instance.timestamp, reverse=True)
+        return instances[:limit] if limit is not None else instances
+    
+    def prune(self, cutoff):
+        """
+        Remove rows older than cutoff
+        
+        Archive files of months entirely before cutoff are deleted; rows
+        still in the main database are removed with one ranged DELETE.
+        
+        Returns:
+            int: Rows removed
+        """
+        import sqlite3
+        
+        removed = 0
+        for start, path in self.months():
+            if add_months(start, 1) > cutoff:
+                break
+            archive = sqlite3.connect(path)
+            try:
+                removed += archive.execute(f'SELECT count(*) FROM "{self.table}"').fetchone()[0]
+            finally:
+                archive.close()
+            os.remove(path)
+        
+        deleted, _ = self.model.objects.filter(timestamp__lt=cutoff).delete()
+        return removed + deleted
+
+
+def get_archive_dir():
+    """Directory of the monthly SQLite log archives (settings.LOG_ARCHIVE_DIR)"""
+    directory = getattr(settings, 'LOG_ARCHIVE_DIR', None)
+    if directory:
+        return directory
+    return os.path.join(getattr(settings, 'BOTSSYS', 'botssys'), 'logarchive')
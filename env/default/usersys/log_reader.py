@@ -0,0 +1,264 @@
+"""
+Log Reader
+Seek-based tail and paging for large bots log files
+
+Tail reads backwards from EOF in blocks. Offset paging and line counts use a
+sparse line-offset index persisted next to botssys, extended incrementally
+as the log grows and rebuilt when the log is rotated or truncated.
+"""
+
+import os
+import json
+import time
+import hashlib
+
+from django.conf import settings
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+    inotify_flags = None
+
+
+BLOCK_SIZE = 64 * 1024
+CHECKPOINT_STRIDE = 1000
+FOLLOW_MAX_BYTES = 256 * 1024
+POLL_INTERVAL = 0.5
+
+
+def get_index_dir():
+    """Directory holding the persisted line-offset indexes"""
+    botssys_dir = getattr(settings, 'BOTSSYS', 'botssys')
+    return os.path.join(botssys_dir, 'logindex')
+
+
+def _decode(lines):
+    return [line.decode('utf-8', errors='replace') for line in lines]
+
+
+def tail_lines(path, count, block_size=BLOCK_SIZE):
+    """
+    Read the last lines of a file without reading the whole file
+    
+    Args:
+        path: File path
+        count: Number of lines wanted
+        block_size: Bytes read per backwards step
+    
+    Returns:
+        list: Decoded lines, oldest first, with their line endings
+    """
+    if count <= 0:
+        return []
+    
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        
+        # A trailing newline ends the last line, it does not start a new one
+        needed = count + 1
+        while position > 0 and data.count(b'\n') < needed:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    
+    lines = data.splitlines(keepends=True)
+    return _decode(lines[-count:])
+
+
+class LineIndex:
+    """
+    Sparse line-offset index for one log file
+    
+    Stores the byte offset of every CHECKPOINT_STRIDE-th line, so a page at
+    any line offset costs one seek plus at most CHECKPOINT_STRIDE readline
+    calls.
+    """
+    
+    def __init__(self, path, index_dir=None):
+        self.path = path
+        self.index_dir = index_dir or get_index_dir()
+        digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+        self.index_path = os.path.join(self.index_dir, f'{digest}.json')
+        self.state = None
+    
+    def _empty_state(self, stat):
+        return {
+            'device': stat.st_dev,
+            'inode': stat.st_ino,
+            'size': 0,
+            'lines': 0,
+            'checkpoints': [0],
+        }
+    
+    def _load(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _save(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.index_path)
+    
+    def refresh(self):
+        """
+        Bring the index up to date with the file on disk
+        
+        Only bytes appended since the last refresh are scanned. A new inode
+        (rotation) or a smaller file (truncation) triggers a rebuild.
+        """
+        stat = os.stat(self.path)
+        state = self.state or self._load()
+        
+        if (not state or state.get('inode') != stat.st_ino or state.get('device') != stat.st_dev
+                or state.get('size', 0) > stat.st_size):
+            state = self._empty_state(stat)
+        
+        if state['size'] < stat.st_size:
+            lines = state['lines']
+            checkpoints = state['checkpoints']
+            
+            with open(self.path, 'rb') as f:
+                f.seek(state['size'])
+                position = state['size']
+                while True:
+                    block = f.read(BLOCK_SIZE)
+                    if not block:
+                        break
+                    start = 0
+                    while True:
+                        found = block.find(b'\n', start)
+                        if found == -1:
+                            break
+                        lines += 1
+                        if lines % CHECKPOINT_STRIDE == 0:
+                            checkpoints.append(position + found + 1)
+                        start = found + 1
+                    position += len(block)
+            
+            state['size'] = position
+            state['lines'] = lines
+            self.state = state
+            self._save()
+        
+        self.state = state
+        return self
+    
+    @property
+    def total_lines(self):
+        """Line count, including a final line without a newline"""
+        state = self.state
+        if state['size'] == 0:
+            return 0
+        
+        with open(self.path, 'rb') as f:
+            f.seek(state['size'] - 1)
+            ends_with_newline = f.read(1) == b'\n'
+        return state['lines'] + (0 if ends_with_newline else 1)
+    
+    def read_lines(self, offset, count):
+        """
+        Read count lines starting at a line offset
+        
+        Returns:
+            list: Decoded lines with their line endings
+        """
+        if count <= 0 or offset < 0:
+            return []
+        
+        checkpoints = self.state['checkpoints']
+        checkpoint = min(offset // CHECKPOINT_STRIDE, len(checkpoints) - 1)
+        
+        lines = []
+        with open(self.path, 'rb') as f:
+            f.seek(checkpoints[checkpoint])
+            for _ in range(offset - checkpoint * CHECKPOINT_STRIDE):
+                if not f.readline():
+                    return []
+            for _ in range(count):
+                line = f.readline()
+                if not line:
+                    break
+                lines.append(line)
+        return _decode(lines)
+
+
+def read_from(path, offset, max_bytes=FOLLOW_MAX_BYTES):
+    """
+    Read complete lines appended after a byte offset
+    
+    Args:
+        path: File path
+        offset: Byte offset already seen by the client
+        max_bytes: Maximum bytes returned in one call
+    
+    Returns:
+        tuple: (text, new_offset, rotated) where rotated is True when the
+        file shrank below offset and reading restarted at 0
+    """
+    size = os.path.getsize(path)
+    rotated = offset > size
+    if rotated:
+        offset = 0
+    if offset >= size:
+        return '', offset, rotated
+    
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(min(max_bytes, size - offset))
+    
+    # Hold back a partial last line until its newline is written
+    end = data.rfind(b'\n')
+    if end == -1:
+        if len(data) < max_bytes:
+            return '', offset, rotated
+        end = len(data) - 1
+    data = data[:end + 1]
+    
+    return data.decode('utf-8', errors='replace'), offset + len(data), rotated
+
+
+def wait_for_growth(path, size, timeout, poll_interval=POLL_INTERVAL):
+    """
+    Block until the file size differs from size or timeout expires
+    
+    Uses inotify when inotify_simple is installed, otherwise polls.
+    
+    Returns:
+        bool: True if the file changed
+    """
+    deadline = time.monotonic() + timeout
+    
+    def changed():
+        try:
+            return os.path.getsize(path) != size
+        except OSError:
+            return True
+    
+    if changed():
+        return True
+    
+    if INotify is not None:
+        watch_flags = inotify_flags.MODIFY | inotify_flags.MOVE_SELF | inotify_flags.DELETE_SELF
+        with INotify() as inotify:
+            inotify.add_watch(path, watch_flags)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return changed()
+                if inotify.read(timeout=int(remaining * 1000)) and changed():
+                    return True
+    
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        if changed():
+            return True
+    return False
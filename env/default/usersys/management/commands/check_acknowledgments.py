@@ -2,8 +2,12 @@
 Django management command to check EDI acknowledgments
 """
 
+import signal
+
 from django.core.management.base import BaseCommand
 from usersys.acknowledgment_tracker import AcknowledgmentTracker
+from usersys.ack_daemon import AckDaemon
+from usersys.metrics import start_http_server
 
 
 class Command(BaseCommand):
@@ -25,6 +29,31 @@ class Command(BaseCommand):
             action='store_true',
             help='Retry failed acknowledgment checks',
         )
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            help='Keep running, polling faster while acknowledgments are due (stop with SIGTERM or Ctrl-C)',
+        )
+        parser.add_argument(
+            '--min-interval',
+            type=float,
+            help='Daemon: seconds between checks while busy (default: ACK_DAEMON_MIN_INTERVAL)',
+        )
+        parser.add_argument(
+            '--max-interval',
+            type=float,
+            help='Daemon: longest wait between checks when idle (default: ACK_DAEMON_MAX_INTERVAL)',
+        )
+        parser.add_argument(
+            '--metrics-port',
+            type=int,
+            help='Daemon: serve Prometheus metrics on this port at /metrics',
+        )
+        parser.add_argument(
+            '--metrics-address',
+            default='127.0.0.1',
+            help='Daemon: address for --metrics-port (default: 127.0.0.1)',
+        )
     
     def handle(self, *args, **options):
         tracker = AcknowledgmentTracker()
@@ -70,11 +99,30 @@ class Command(BaseCommand):
             
             return
         
+        # Keep running until stopped
+        if options['daemon']:
+            daemon = AckDaemon(min_interval=options['min_interval'], max_interval=options['max_interval'])
+            signal.signal(signal.SIGTERM, daemon.stop)
+            signal.signal(signal.SIGINT, daemon.stop)
+            if options['metrics_port']:
+                start_http_server(options['metrics_port'], options['metrics_address'])
+                self.stdout.write(f"Metrics at http://{options['metrics_address']}:{options['metrics_port']}/metrics")
+            
+            self.stdout.write(f"Acknowledgment daemon running as {daemon.holder}...")
+            daemon.run()
+            self.stdout.write(self.style.SUCCESS("Acknowledgment daemon stopped"))
+            
+            return
+        
         # Default: check all pending acknowledgments
-        self.stdout.write("Checking acknowledgments for all sent transactions...")
+        self.stdout.write("Applying acknowledgments received since the last check...")
         result = tracker.check_acknowledgments()
         
         self.stdout.write(self.style.SUCCESS(
-            f"Checked {result['checked']} transactions, {result['acknowledged']} newly acknowledged"
+            f"Read {result['checked']} acknowledgments, {result['acknowledged']} transactions newly acknowledged"
         ))
+        if result['unmatched']:
+            self.stdout.write(self.style.WARNING(
+                f"{result['unmatched']} acknowledgments did not match a sent transaction"
+            ))
         self.stdout.write(f"Completed at: {result['timestamp']}")
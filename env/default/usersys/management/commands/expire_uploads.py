@@ -0,0 +1,15 @@
+"""
+Expire Uploads
+Management command to clean up abandoned resumable partner uploads
+"""
+
+from django.core.management.base import BaseCommand
+from usersys.resumable_upload import ResumableUploadService
+
+
+class Command(BaseCommand):
+    help = 'Expire idle resumable uploads and delete their partial data'
+    
+    def handle(self, *args, **options):
+        count = ResumableUploadService.expire()
+        self.stdout.write(self.style.SUCCESS(f'Expired {count} uploads'))
@@ -0,0 +1,27 @@
+"""
+Index Logs
+Management command to update the bots log search index
+"""
+
+from django.core.management.base import BaseCommand
+from usersys.log_index import LogIndexer
+
+
+class Command(BaseCommand):
+    help = 'Index new lines in the bots logging directory'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log-dir',
+            help='Logging directory (default: bots.ini [directories] logging)',
+        )
+    
+    def handle(self, *args, **options):
+        log_dir = options['log_dir']
+        if not log_dir:
+            import botsglobal
+            log_dir = botsglobal.ini.get('directories', 'logging')
+        
+        self.stdout.write(f'Indexing logs in {log_dir}...')
+        count = LogIndexer(log_dir).refresh()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} log entries'))
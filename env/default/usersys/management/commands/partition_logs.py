@@ -0,0 +1,55 @@
+"""
+Partition Logs
+Management command to maintain monthly partitions of the activity and API audit logs
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from usersys import log_partitions
+from usersys.partner_models import ActivityLog
+from usersys.api_models import APIAuditLog
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming log partitions (PostgreSQL) or archive closed months (SQLite), and prune old logs'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='PostgreSQL: convert the log tables to partitioned tables (one-time, locks the tables)',
+        )
+        parser.add_argument(
+            '--retain-days',
+            type=int,
+            help='Also remove logs older than this many days',
+        )
+    
+    def handle(self, *args, **options):
+        if not log_partitions.is_enabled():
+            raise CommandError('Set LOG_PARTITIONING = True in settings to use partitioned logs')
+        
+        for model in (ActivityLog, APIAuditLog):
+            partitions = log_partitions.get_partitions(model)
+            if partitions is None:
+                raise CommandError('Partitioned logs need PostgreSQL or SQLite')
+            name = model._meta.verbose_name_plural
+            
+            if options['convert']:
+                if not isinstance(partitions, log_partitions.PostgresPartitions):
+                    raise CommandError('--convert is only needed on PostgreSQL')
+                if partitions.convert():
+                    self.stdout.write(f'Partitioned {name}')
+            
+            count = partitions.maintain()
+            if isinstance(partitions, log_partitions.PostgresPartitions):
+                self.stdout.write(f'{name}: {count} upcoming partitions in place')
+            else:
+                self.stdout.write(f'{name}: archived {count} rows')
+            
+            if options['retain_days'] is not None:
+                cutoff = timezone.now() - timedelta(days=options['retain_days'])
+                removed = partitions.prune(cutoff)
+                self.stdout.write(self.style.SUCCESS(f'{name}: removed {removed} rows older than {cutoff:%Y-%m-%d}'))
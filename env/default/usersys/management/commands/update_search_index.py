@@ -0,0 +1,46 @@
+"""
+Update Search Index
+Management command to catch the full-text search index up with the database
+"""
+
+from django.core.management.base import BaseCommand
+from usersys.search_index import TransactionSearchIndex, TASearchIndex, is_available
+from usersys.segment_index import SegmentIndex
+from usersys.modern_edi_models import EDITransaction
+
+
+class Command(BaseCommand):
+    help = 'Index new bots ta records and pending segment values, or rebuild the transaction and segment search indexes'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Re-index all modern EDI transactions from scratch',
+        )
+        parser.add_argument(
+            '--segments',
+            action='store_true',
+            help='Rebuild the segment value index from the transaction files',
+        )
+    
+    def handle(self, *args, **options):
+        # Files too large to index during their upload, or all with --segments
+        transactions = EDITransaction.objects.only('id', 'file_path')
+        if not options['segments']:
+            transactions = transactions.filter(segments_indexed=False)
+        count = 0
+        for txn in transactions.iterator():
+            count += SegmentIndex.index_file(txn)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} segment values'))
+        
+        if not is_available():
+            self.stdout.write(self.style.WARNING('Search index is not available on this database'))
+            return
+        
+        if options['rebuild']:
+            count = TransactionSearchIndex.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Re-indexed {count} transactions'))
+        
+        count = TASearchIndex.update()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} new ta records'))
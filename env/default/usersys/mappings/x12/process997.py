@@ -1,15 +1,26 @@
 # bots mapping-script
 from bots.botsconfig import *
 from bots import botslib
+from usersys.control_numbers import ControlNumberIndex
 
 
 def main(inn, out):
     # indicate: no output form translation.
     out.ta_info['statust'] = DONE
     reference = inn.get({'BOTSID': 'ST'}, {'BOTSID': 'AK1', 'AK102': None})
-    botslib.changeq('''
-        UPDATE ta
-        SET   confirmed=%(confirmed)s, confirmidta=%(confirmidta)s
+    # the 997 comes back from the partner: its frompartner is the receiver of the acknowledged group.
+    # bots partner ids are the GS02/GS03 codes the group was sent with.
+    key = ControlNumberIndex.key('group', inn.ta_info['topartner'], inn.ta_info['frompartner'], reference)
+    # ta row linked to this group number by an earlier 997 (bots' own sends are not recorded)
+    idta = ControlNumberIndex.ta_id(key)
+    if idta and confirm(inn, 'idta=%(idta)s AND confirmed=%(notconfirmed)s', {'idta': idta, 'notconfirmed': False}):
+        return
+    # not linked yet, not sent via the modern interface, or the linked ta is already confirmed
+    # (the group control number was reused): search ta once, then link the latest send.
+    # the ta_reference_partners index (usersys migration 0019) serves this query.
+    idtas = [row['idta'] for row in botslib.query('''
+        SELECT idta
+        FROM  ta
         WHERE reference=%(reference)s
         AND   status=%(status)s
         AND   confirmasked=%(confirmasked)s
@@ -20,13 +31,34 @@ def main(inn, out):
         {
             'status': MERGED,
             'reference': reference,
-            'confirmed': True,
             'confirmtype': 'ask-x12-997',
-            'confirmidta': inn.ta_info['idta_fromfile'],
             'confirmasked': True,
             'frompartner': inn.ta_info['topartner'],
             'topartner': inn.ta_info['frompartner'],
         }
-    )
+    )]
+    if idtas:
+        ControlNumberIndex.link_ta(key, max(idtas))
+    for idta in idtas:
+        confirm(inn, 'idta=%(idta)s', {'idta': idta})
     # NOTE: no error is given when 997 can not be matched.
     # NOTE: botslib.changeq works as of bots3.0.0; before this was: botslib.change
+
+
+def confirm(inn, condition, params):
+    ''' mark the ta rows matching condition as confirmed by this 997; returns the number of rows changed.'''
+    return botslib.changeq('''
+        UPDATE ta
+        SET   confirmed=%(confirmed)s, confirmidta=%(confirmidta)s
+        WHERE ''' + condition + '''
+        AND   confirmasked=%(confirmasked)s
+        AND   confirmtype=%(confirmtype)s
+        ''',
+        dict(
+            params,
+            confirmed=True,
+            confirmtype='ask-x12-997',
+            confirmidta=inn.ta_info['idta_fromfile'],
+            confirmasked=True,
+        )
+    )
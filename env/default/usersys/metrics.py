@@ -0,0 +1,262 @@
+"""
+Metrics
+In-process counters, gauges and histograms in Prometheus text format
+
+Metrics are kept per process and served by /api/v1/admin/metrics. With
+several worker processes a scrape only sees the worker that answered it
+(edi_process_info carries its pid), so expect per-worker series. Commands
+that run without the web server can serve theirs with start_http_server().
+"""
+
+import os
+import hmac
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, for request and processing times
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    """
+    Base class of a metric family
+    
+    Args:
+        name: Metric name
+        help_text: Description for the HELP line
+        labelnames: Names of the labels every sample carries
+    """
+    
+    type_name = None
+    
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {', '.join(self.labelnames) or '(none)'}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def samples(self):
+        """Current values by label values tuple"""
+        with self._lock:
+            return {key: self._snapshot(value) for key, value in self._values.items()}
+    
+    def clear(self):
+        """Drop all samples"""
+        with self._lock:
+            self._values.clear()
+    
+    def render(self):
+        """Exposition lines of this family"""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            samples = sorted((key, self._snapshot(value)) for key, value in self._values.items())
+        for key, value in samples:
+            lines.extend(self._render_sample(key, value))
+        return lines
+    
+    def _snapshot(self, value):
+        return value
+    
+    def _render_sample(self, key, value):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}']
+
+
+class Counter(Metric):
+    """Value that only goes up"""
+    
+    type_name = 'counter'
+    
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """Value that is set to the current state"""
+    
+    type_name = 'gauge'
+    
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+    
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def value(self, **labels):
+        return self._values.get(self._key(labels))
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over fixed buckets
+    
+    Args:
+        buckets: Upper bounds, ascending (+Inf is added)
+    """
+    
+    type_name = 'histogram'
+    
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+    
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per bucket counts (not cumulative), then sum
+                state = self._values[key] = [[0] * len(self.buckets), 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+    
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+    
+    def _snapshot(self, value):
+        return list(value[0]), value[1]
+    
+    def _render_sample(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Metric families of this process, by name"""
+    
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+    
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type_name}")
+            return metric
+    
+    def counter(self, name, help_text, labelnames=()):
+        return self._get_or_create(Counter, name, help_text, labelnames)
+    
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+    
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+    
+    def render(self):
+        """All families in Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        # One line per process so scrapes from different workers can be told apart
+        lines.append('# HELP edi_process_info Process that served this scrape')
+        lines.append('# TYPE edi_process_info gauge')
+        lines.append(f'edi_process_info{{pid="{os.getpid()}"}} 1')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _bearer_matches(header):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token or not header.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(header[len('Bearer '):].strip().encode(), token.encode())
+
+
+def token_valid(request):
+    """Whether the request carries the scrape token (settings.METRICS_TOKEN) as a Bearer token"""
+    return _bearer_matches(request.META.get('HTTP_AUTHORIZATION', ''))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves registry at /metrics, behind METRICS_TOKEN when one is set"""
+    
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        if getattr(settings, 'METRICS_TOKEN', '') and not _bearer_matches(self.headers.get('Authorization', '')):
+            self.send_error(403)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, address='127.0.0.1'):
+    """
+    Serve the metrics of a process without a web server (e.g. a daemon
+    command) at http://address:port/metrics, from a background thread
+    
+    Returns:
+        ThreadingHTTPServer: call shutdown() to stop it
+    """
+    server = ThreadingHTTPServer((address, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
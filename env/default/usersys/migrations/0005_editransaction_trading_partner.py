@@ -0,0 +1,88 @@
+# Generated migration for EDITransaction -> Partner foreign key
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_trading_partner(apps, schema_editor):
+    """
+    Link existing transactions to their Partner row.
+
+    Transactions only carried the free-text partner_name and an unindexed
+    partner_id string (either the Partner UUID or the partner code), so
+    match on those in that order and update in batches.
+    """
+    Partner = apps.get_model('usersys', 'Partner')
+    EDITransaction = apps.get_model('usersys', 'EDITransaction')
+
+    by_uuid = {}
+    by_code = {}
+    by_name = {}
+    for partner_pk, code, name in Partner.objects.values_list('id', 'partner_id', 'name'):
+        by_uuid[str(partner_pk)] = partner_pk
+        by_code[code] = partner_pk
+        by_name.setdefault(name, partner_pk)
+
+    if not by_uuid:
+        return
+
+    pending = EDITransaction.objects.filter(
+        trading_partner__isnull=True
+    ).only('id', 'partner_id', 'partner_name').order_by('pk')
+
+    # Walk the table by primary key rather than holding a cursor open while
+    # writing to it (SQLite gives no isolation between the two).
+    last_pk = None
+    while True:
+        chunk = pending if last_pk is None else pending.filter(pk__gt=last_pk)
+        chunk = list(chunk[:BACKFILL_BATCH_SIZE])
+        if not chunk:
+            break
+        last_pk = chunk[-1].pk
+
+        batch = []
+        for txn in chunk:
+            partner_pk = (
+                by_uuid.get(txn.partner_id or '')
+                or by_code.get(txn.partner_id or '')
+                or by_name.get(txn.partner_name or '')
+            )
+            if partner_pk is not None:
+                txn.trading_partner_id = partner_pk
+                batch.append(txn)
+
+        if batch:
+            EDITransaction.objects.bulk_update(batch, ['trading_partner'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0004_partner_users_permissions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='editransaction',
+            name='trading_partner',
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='edi_transactions',
+                to='usersys.partner'
+            ),
+        ),
+        migrations.RunPython(backfill_trading_partner, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='editransaction',
+            index=models.Index(fields=['trading_partner', 'folder', '-created_at'], name='usersys_edi_tp_folder_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='editransaction',
+            index=models.Index(fields=['trading_partner', 'sent_at'], name='usersys_edi_tp_sent_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated migration for the transaction full-text search index
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """Create the backend specific search tables and index existing rows"""
+    from usersys.search_index import EDI_SEARCH_TABLE, METADATA_SEARCH_FIELDS, create_search_tables
+
+    create_search_tables(schema_editor)
+
+    connection = schema_editor.connection
+    if EDI_SEARCH_TABLE not in connection.introspection.table_names():
+        return
+
+    EDITransaction = apps.get_model('usersys', 'EDITransaction')
+    pk_field = EDITransaction._meta.pk
+
+    rows = []
+    fields = ('id', 'partner_name', 'partner_id', 'po_number', 'filename', 'document_type', 'metadata')
+    for txn in EDITransaction.objects.only(*fields).iterator():
+        metadata = txn.metadata if isinstance(txn.metadata, dict) else {}
+        values = [txn.partner_name, txn.partner_id, txn.po_number, txn.filename, txn.document_type]
+        values.extend(metadata.get(key) for key in METADATA_SEARCH_FIELDS)
+        rows.append((
+            pk_field.get_db_prep_value(txn.pk, connection),
+            ' '.join(str(value) for value in values if value),
+        ))
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.executemany(
+                f"INSERT INTO {EDI_SEARCH_TABLE} (transaction_id, document) "
+                "VALUES (%s, to_tsvector('simple', %s))",
+                rows
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {EDI_SEARCH_TABLE} (transaction_id, body) VALUES (%s, %s)",
+                rows
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    from usersys.search_index import drop_search_tables
+
+    drop_search_tables(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0005_editransaction_trading_partner'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
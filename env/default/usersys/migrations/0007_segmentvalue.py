@@ -0,0 +1,33 @@
+# Generated migration for the EDI segment value index
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0006_transaction_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentValue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment', models.CharField(max_length=10)),
+                ('element', models.CharField(max_length=30)),
+                ('value', models.CharField(max_length=80)),
+                ('offset', models.PositiveIntegerField()),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segment_values', to='usersys.editransaction')),
+            ],
+            options={
+                'verbose_name': 'Segment Value',
+                'verbose_name_plural': 'Segment Values',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='segmentvalue',
+            index=models.Index(fields=['value', 'segment', 'element'], name='usersys_segval_lookup_idx'),
+        ),
+    ]
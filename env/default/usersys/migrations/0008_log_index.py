@@ -0,0 +1,53 @@
+# Generated migration for the bots log search index
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0007_segmentvalue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(help_text='Path relative to the logging directory', max_length=500, unique=True)),
+                ('fingerprint', models.CharField(db_index=True, help_text='SHA-1 of the first bytes of the log', max_length=40)),
+                ('compressed', models.BooleanField(default=False)),
+                ('indexed_size', models.BigIntegerField(default=0, help_text='Uncompressed bytes indexed so far')),
+                ('modified_at', models.DateTimeField(blank=True, null=True)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Log File',
+                'verbose_name_plural': 'Log Files',
+            },
+        ),
+        migrations.CreateModel(
+            name='LogEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offset', models.BigIntegerField(help_text='Uncompressed byte offset of the line')),
+                ('timestamp', models.DateTimeField(blank=True, null=True)),
+                ('level', models.CharField(blank=True, max_length=10)),
+                ('token', models.CharField(blank=True, help_text='idta:<n> or file:<name>, empty for level-only entries', max_length=120)),
+                ('log_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='usersys.logfile')),
+            ],
+            options={
+                'verbose_name': 'Log Entry',
+                'verbose_name_plural': 'Log Entries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['token', 'timestamp'], name='usersys_logentry_token_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['level', 'timestamp'], name='usersys_logentry_level_idx'),
+        ),
+    ]
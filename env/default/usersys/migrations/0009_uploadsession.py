@@ -0,0 +1,42 @@
+# Generated migration for resumable partner uploads
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0008_log_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('document_type', models.CharField(blank=True, max_length=50)),
+                ('po_number', models.CharField(blank=True, max_length=100)),
+                ('total_size', models.BigIntegerField(help_text='Declared size of the complete file in bytes')),
+                ('offset', models.BigIntegerField(default=0, help_text='Bytes received and stored so far')),
+                ('status', models.CharField(choices=[('active', 'Active'), ('completed', 'Completed'), ('aborted', 'Aborted'), ('expired', 'Expired')], default='active', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField(help_text='Abandoned uploads are removed after this time')),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='usersys.partner')),
+                ('partner_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_sessions', to='usersys.partneruser')),
+                ('transaction', models.ForeignKey(blank=True, help_text='Transaction created when the upload completed', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_sessions', to='usersys.editransaction')),
+            ],
+            options={
+                'verbose_name': 'Upload Session',
+                'verbose_name_plural': 'Upload Sessions',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['status', 'expires_at'], name='usersys_upload_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated migration for duplicate interchange detection
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_interchange_keys(apps, schema_editor):
+    """
+    Copy the envelope identifiers of existing transactions into columns.
+
+    The parser has always stored sender_id, receiver_id and control_number
+    in metadata; lifting them out lets the duplicate check use an index.
+    """
+    EDITransaction = apps.get_model('usersys', 'EDITransaction')
+
+    pending = EDITransaction.objects.only('id', 'metadata').order_by('pk')
+
+    last_pk = None
+    while True:
+        chunk = pending if last_pk is None else pending.filter(pk__gt=last_pk)
+        chunk = list(chunk[:BACKFILL_BATCH_SIZE])
+        if not chunk:
+            break
+        last_pk = chunk[-1].pk
+
+        batch = []
+        for txn in chunk:
+            metadata = txn.metadata or {}
+            control_number = str(metadata.get('control_number') or '')[:14]
+            if control_number:
+                txn.interchange_sender = str(metadata.get('sender_id') or '')[:35]
+                txn.interchange_receiver = str(metadata.get('receiver_id') or '')[:35]
+                txn.interchange_control_number = control_number
+                batch.append(txn)
+
+        if batch:
+            EDITransaction.objects.bulk_update(
+                batch, ['interchange_sender', 'interchange_receiver', 'interchange_control_number']
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0009_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='editransaction',
+            name='interchange_sender',
+            field=models.CharField(blank=True, default='', max_length=35),
+        ),
+        migrations.AddField(
+            model_name='editransaction',
+            name='interchange_receiver',
+            field=models.CharField(blank=True, default='', max_length=35),
+        ),
+        migrations.AddField(
+            model_name='editransaction',
+            name='interchange_control_number',
+            field=models.CharField(blank=True, default='', max_length=14),
+        ),
+        migrations.AddField(
+            model_name='editransaction',
+            name='duplicate_of',
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='duplicates',
+                to='usersys.editransaction'
+            ),
+        ),
+        migrations.AlterField(
+            model_name='transactionhistory',
+            name='action',
+            field=models.CharField(choices=[
+                ('created', 'Created'),
+                ('moved', 'Moved'),
+                ('edited', 'Edited'),
+                ('sent', 'Sent'),
+                ('acknowledged', 'Acknowledged'),
+                ('deleted', 'Deleted'),
+                ('restored', 'Restored'),
+                ('permanent_delete', 'Permanently Deleted'),
+                ('duplicate_received', 'Duplicate Received'),
+            ], max_length=50),
+        ),
+        migrations.RunPython(backfill_interchange_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='editransaction',
+            index=models.Index(fields=['content_hash'], name='usersys_edi_hash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='editransaction',
+            index=models.Index(
+                fields=['interchange_sender', 'interchange_receiver', 'interchange_control_number'],
+                name='usersys_edi_icn_idx'
+            ),
+        ),
+    ]
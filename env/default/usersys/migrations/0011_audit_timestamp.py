@@ -0,0 +1,29 @@
+# Generated migration: audit timestamps are set when a row is logged
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    """
+    ActivityLog and APIAuditLog rows may be written in batches some time after
+    the event, so the timestamp now defaults to the logging time instead of
+    auto_now_add (the insert time). No database change.
+    """
+
+    dependencies = [
+        ('usersys', '0010_duplicate_interchange'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activitylog',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, help_text='When this action occurred'),
+        ),
+        migrations.AlterField(
+            model_name='apiauditlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
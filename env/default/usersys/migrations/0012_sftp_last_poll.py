@@ -0,0 +1,18 @@
+# Generated migration: last SFTP poll time per partner, for pipeline metrics
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0011_audit_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partnersftpconfig',
+            name='last_poll_at',
+            field=models.DateTimeField(blank=True, help_text="When the partner's SFTP server was last polled", null=True),
+        ),
+    ]
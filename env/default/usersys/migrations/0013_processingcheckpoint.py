@@ -0,0 +1,26 @@
+# Generated migration: checkpoints for incremental jobs (acknowledgment reconciler)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0012_sftp_last_poll'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Processing Checkpoint',
+                'verbose_name_plural': 'Processing Checkpoints',
+            },
+        ),
+    ]
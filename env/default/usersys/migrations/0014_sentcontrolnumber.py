@@ -0,0 +1,76 @@
+# Generated migration: control numbers of sent transactions, for acknowledgment matching
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_interchange_numbers(apps, schema_editor):
+    """
+    Record the interchange control numbers of transactions already sent.
+
+    Only the interchange level is known without re-reading every file;
+    acknowledgments of groups fall back to it.
+    """
+    EDITransaction = apps.get_model('usersys', 'EDITransaction')
+    SentControlNumber = apps.get_model('usersys', 'SentControlNumber')
+
+    sent = EDITransaction.objects.filter(folder='sent').exclude(
+        interchange_control_number=''
+    ).values_list(
+        'id', 'bots_ta_id', 'interchange_sender', 'interchange_receiver', 'interchange_control_number'
+    ).order_by('pk')
+
+    last_pk = None
+    while True:
+        chunk = sent if last_pk is None else sent.filter(pk__gt=last_pk)
+        chunk = list(chunk[:BACKFILL_BATCH_SIZE])
+        if not chunk:
+            break
+        last_pk = chunk[-1][0]
+
+        SentControlNumber.objects.bulk_create([
+            SentControlNumber(
+                transaction_id=pk,
+                bots_ta_id=bots_ta_id,
+                level='interchange',
+                sender=sender,
+                receiver=receiver,
+                control_number=control_number.lstrip('0') or control_number
+            )
+            for pk, bots_ta_id, sender, receiver, control_number in chunk
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0013_processingcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SentControlNumber',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bots_ta_id', models.IntegerField(blank=True, null=True)),
+                ('level', models.CharField(choices=[('interchange', 'Interchange'), ('group', 'Functional Group'), ('message', 'Message')], max_length=12)),
+                ('sender', models.CharField(max_length=35)),
+                ('receiver', models.CharField(max_length=35)),
+                ('control_number', models.CharField(max_length=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='control_numbers', to='usersys.editransaction')),
+            ],
+            options={
+                'verbose_name': 'Sent Control Number',
+                'verbose_name_plural': 'Sent Control Numbers',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='sentcontrolnumber',
+            index=models.Index(fields=['sender', 'receiver', 'level', 'control_number'], name='usersys_sentctrl_lookup_idx'),
+        ),
+        migrations.RunPython(backfill_interchange_numbers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated migration: leader lease for the acknowledgment daemon
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0014_sentcontrolnumber'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderLease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('holder', models.CharField(blank=True, default='', max_length=255)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('renewed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Leader Lease',
+                'verbose_name_plural': 'Leader Leases',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='editransaction',
+            index=models.Index(fields=['folder', 'sent_at'], name='usersys_edi_folder_sent_idx'),
+        ),
+    ]
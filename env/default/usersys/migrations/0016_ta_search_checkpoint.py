@@ -0,0 +1,22 @@
+# Generated migration: re-index bots ta rows with the idta as FTS5 rowid and a checkpointed mark
+
+from django.db import migrations
+
+
+def clear_ta_search(apps, schema_editor):
+    """Empty the ta search index; update_search_index refills it from idta 0"""
+    from usersys.search_index import TA_SEARCH_TABLE
+
+    if TA_SEARCH_TABLE in schema_editor.connection.introspection.table_names():
+        schema_editor.execute(f"DELETE FROM {TA_SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0015_leaderlease'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_ta_search, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated migration: track which transactions are in the segment value index
+
+from django.db import migrations, models
+
+
+def mark_indexed(apps, schema_editor):
+    """Transactions with segment values were indexed at ingest"""
+    EDITransaction = apps.get_model('usersys', 'EDITransaction')
+    SegmentValue = apps.get_model('usersys', 'SegmentValue')
+    EDITransaction.objects.filter(
+        id__in=SegmentValue.objects.values('transaction_id')
+    ).update(segments_indexed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0016_ta_search_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='editransaction',
+            name='segments_indexed',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(mark_indexed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated migration: one log entry per line and token
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """Drop entries indexed twice by concurrent refreshes, keeping the first"""
+    LogEntry = apps.get_model('usersys', 'LogEntry')
+    duplicates = (
+        LogEntry.objects.values('log_file', 'offset', 'token')
+        .annotate(count=Count('id'), first=Min('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates.iterator():
+        LogEntry.objects.filter(
+            log_file=row['log_file'], offset=row['offset'], token=row['token']
+        ).exclude(id=row['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0017_editransaction_segments_indexed'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='logentry',
+            constraint=models.UniqueConstraint(fields=('log_file', 'offset', 'token'), name='usersys_logentry_unique'),
+        ),
+    ]
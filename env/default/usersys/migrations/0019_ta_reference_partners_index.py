@@ -0,0 +1,55 @@
+# Generated migration: index bots ta rows by reference and partners for the process997 mapping
+
+from django.db import migrations
+
+
+TA_TABLE = 'ta'
+INDEX_NAME = 'ta_reference_partners'
+COLUMNS = ('reference', 'frompartner', 'topartner')
+
+
+def _has_ta(schema_editor):
+    return TA_TABLE in schema_editor.connection.introspection.table_names()
+
+
+def create_index(apps, schema_editor):
+    """
+    Index ta on (reference, frompartner, topartner)
+    
+    bots only indexes reference, and group control numbers such as 1 are
+    reused by every partner, so the 997 lookup otherwise reads all of them.
+    """
+    if not _has_ta(schema_editor):
+        return
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if INDEX_NAME in connection.introspection.get_constraints(cursor, TA_TABLE):
+            return
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f"CREATE INDEX {quote(INDEX_NAME)} ON {quote(TA_TABLE)} ({', '.join(quote(c) for c in COLUMNS)})"
+    )
+
+
+def drop_index(apps, schema_editor):
+    if not _has_ta(schema_editor):
+        return
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if INDEX_NAME not in connection.introspection.get_constraints(cursor, TA_TABLE):
+            return
+    schema_editor.execute(schema_editor.sql_delete_index % {
+        'table': schema_editor.quote_name(TA_TABLE),
+        'name': schema_editor.quote_name(INDEX_NAME),
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0018_logentry_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,52 @@
+# Generated migration: record API uploads for duplicate detection
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usersys', '0019_ta_reference_partners_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIUpload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255)),
+                ('file_path', models.CharField(help_text='Path in the bots infile directory', max_length=500)),
+                ('file_size', models.BigIntegerField()),
+                ('content_hash', models.CharField(max_length=64)),
+                ('interchange_sender', models.CharField(blank=True, default='', max_length=35)),
+                ('interchange_receiver', models.CharField(blank=True, default='', max_length=35)),
+                ('interchange_control_number', models.CharField(blank=True, default='', max_length=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('api_key', models.ForeignKey(
+                    null=True,
+                    on_delete=django.db.models.deletion.SET_NULL,
+                    related_name='uploads',
+                    to='usersys.apikey'
+                )),
+                ('trading_partner', models.ForeignKey(
+                    blank=True,
+                    null=True,
+                    on_delete=django.db.models.deletion.SET_NULL,
+                    related_name='api_uploads',
+                    to='usersys.partner'
+                )),
+            ],
+            options={
+                'verbose_name': 'API Upload',
+                'verbose_name_plural': 'API Uploads',
+                'indexes': [
+                    models.Index(fields=['content_hash'], name='usersys_apiupload_hash_idx'),
+                    models.Index(
+                        fields=['interchange_sender', 'interchange_receiver', 'interchange_control_number'],
+                        name='usersys_apiupload_icn_idx'
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -4,56 +4,77 @@ Rate limiting and security middleware
 """
 
 import time
-from django.core.cache import cache
 from django.http import JsonResponse
 from django.conf import settings
 
+from .rate_limiter import get_limiter
+from .request_profiler import (
+    RequestProfile, METHODS, UNRESOLVED_VIEW, should_sample, log_if_slow
+)
+
 
 class RateLimitMiddleware:
     """
     Rate limiting middleware for Modern EDI API
+    
+    Each user gets one sliding-window budget per endpoint class. Classes are
+    assigned by URL name (MODERN_EDI_RATE_LIMIT_CLASSES, default 'default'),
+    rates come from MODERN_EDI_RATE_LIMITS and can be raised or lowered for
+    individual users in MODERN_EDI_RATE_LIMIT_USERS. Counters live in the
+    shared store of rate_limiter, so the limit holds across worker processes.
     """
     
     def __init__(self, get_response):
         self.get_response = get_response
-        # Requests per minute per user
+        # Requests per minute per user, unless MODERN_EDI_RATE_LIMITS sets 'default'
         self.rate_limit = getattr(settings, 'MODERN_EDI_RATE_LIMIT', 60)
-        self.rate_window = 60  # seconds
+        self.rates = {'default': (self.rate_limit, 60)}
+        self.rates.update(getattr(settings, 'MODERN_EDI_RATE_LIMITS', {}))
+        self.classes = getattr(settings, 'MODERN_EDI_RATE_LIMIT_CLASSES', {})
+        self.user_rates = getattr(settings, 'MODERN_EDI_RATE_LIMIT_USERS', {})
     
     def __call__(self, request):
+        response = self.get_response(request)
+        return response
+    
+    def process_view(self, request, view_func, view_args, view_kwargs):
         # Only apply to Modern EDI API endpoints
         if not request.path.startswith('/modern-edi/api/'):
-            return self.get_response(request)
+            return None
         
         # Skip rate limiting for unauthenticated requests (will be handled by auth)
         if not request.user.is_authenticated:
-            return self.get_response(request)
+            return None
         
         # Check rate limit
-        if not self.check_rate_limit(request):
-            return JsonResponse({
+        result = self.check_rate_limit(request)
+        if not result.allowed:
+            response = JsonResponse({
                 'error': 'Rate limit exceeded',
-                'message': f'Maximum {self.rate_limit} requests per minute allowed'
+                'message': f'Maximum {result.limit} requests allowed, retry in {result.retry_after} seconds',
+                'retry_after': result.retry_after
             }, status=429)
+            response['Retry-After'] = str(result.retry_after)
+            return response
         
-        response = self.get_response(request)
-        return response
+        return None
+    
+    def get_rate(self, request, endpoint_class):
+        """Rate for a user and endpoint class"""
+        rates = self.user_rates.get(request.user.get_username(), {})
+        return rates.get(endpoint_class) or self.rates.get(endpoint_class) or rates.get('default') or self.rates['default']
     
     def check_rate_limit(self, request):
-        """Check if user has exceeded rate limit"""
-        user_id = request.user.id
-        cache_key = f'modern_edi_rate_limit_{user_id}'
-        
-        # Get current request count
-        request_count = cache.get(cache_key, 0)
+        """
+        Count the request against the user's budget for its endpoint class
         
-        if request_count >= self.rate_limit:
-            return False
-        
-        # Increment counter
-        cache.set(cache_key, request_count + 1, self.rate_window)
-        
-        return True
+        Returns:
+            RateLimitResult
+        """
+        match = request.resolver_match
+        endpoint_class = self.classes.get(match.url_name, 'default') if match else 'default'
+        rate = self.get_rate(request, endpoint_class)
+        return get_limiter().hit(f'modern_edi:user:{request.user.pk}:{endpoint_class}', rate)
 
 
 class SecurityHeadersMiddleware:
@@ -137,3 +158,51 @@ class AuditLoggingMiddleware:
         else:
             ip = request.META.get('REMOTE_ADDR')
         return ip
+
+
+class ProfilingMiddleware:
+    """
+    Record wall time, database queries and time, response size and cache
+    lookups per URL name (see request_profiler)
+    
+    Served in Prometheus text format at /api/v1/admin/metrics; slow requests
+    with their SQL at /api/v1/admin/metrics/slow-requests. Place it first in
+    MIDDLEWARE to include the time spent in other middleware.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        profile = RequestProfile(collect_sql=should_sample())
+        with profile:
+            response = self.get_response(request)
+        
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match and match.view_name else UNRESOLVED_VIEW
+        method = request.method if request.method in METHODS else 'other'
+        
+        if response.streaming:
+            # A streamed body runs its queries while it is sent, so the
+            # request is measured until the body is exhausted
+            response.streaming_content = self.profile_stream(
+                response.streaming_content, profile, request, view, method, response.status_code
+            )
+            return response
+        
+        size = len(response.content)
+        profile.record(view, method, response.status_code, size)
+        log_if_slow(profile, request, view, response.status_code, size)
+        return response
+    
+    @staticmethod
+    def profile_stream(content, profile, request, view, method, status):
+        size = 0
+        try:
+            with profile:
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            profile.record(view, method, status, size)
+            log_if_slow(profile, request, view, status, size)
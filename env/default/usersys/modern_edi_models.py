@@ -5,6 +5,7 @@ Database models for folder-based EDI transaction management
 
 import os
 import uuid
+from datetime import timedelta
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -40,6 +41,13 @@ class EDITransaction(models.Model):
     # Transaction Data
     partner_name = models.CharField(max_length=255, db_index=True)
     partner_id = models.CharField(max_length=100, null=True, blank=True)
+    trading_partner = models.ForeignKey(
+        'Partner',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='edi_transactions'
+    )
     document_type = models.CharField(max_length=50)
     po_number = models.CharField(max_length=100, null=True, blank=True, db_index=True)
     
@@ -48,6 +56,18 @@ class EDITransaction(models.Model):
     file_size = models.IntegerField()
     content_hash = models.CharField(max_length=64)  # SHA-256
     
+    # Interchange envelope (ISA/UNB), used to detect resent interchanges
+    interchange_sender = models.CharField(max_length=35, blank=True, default='')
+    interchange_receiver = models.CharField(max_length=35, blank=True, default='')
+    interchange_control_number = models.CharField(max_length=14, blank=True, default='')
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicates'
+    )
+    
     # Status
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, db_index=True)
     
@@ -66,6 +86,9 @@ class EDITransaction(models.Model):
     # Metadata (flexible storage for parsed EDI data)
     metadata = models.JSONField(default=dict, blank=True)
     
+    # Segment values are in SegmentValue (large files are indexed by update_search_index)
+    segments_indexed = models.BooleanField(default=False, db_index=True)
+    
     # Relationships
     created_by = models.ForeignKey(
         User, 
@@ -86,6 +109,14 @@ class EDITransaction(models.Model):
             models.Index(fields=['partner_name', '-created_at']),
             models.Index(fields=['status', '-created_at']),
             models.Index(fields=['po_number']),
+            models.Index(fields=['trading_partner', 'folder', '-created_at'], name='usersys_edi_tp_folder_idx'),
+            models.Index(fields=['trading_partner', 'sent_at'], name='usersys_edi_tp_sent_idx'),
+            models.Index(fields=['folder', 'sent_at'], name='usersys_edi_folder_sent_idx'),
+            models.Index(fields=['content_hash'], name='usersys_edi_hash_idx'),
+            models.Index(
+                fields=['interchange_sender', 'interchange_receiver', 'interchange_control_number'],
+                name='usersys_edi_icn_idx'
+            ),
         ]
     
     def __str__(self):
@@ -229,6 +260,7 @@ class TransactionHistory(models.Model):
         ('deleted', 'Deleted'),
         ('restored', 'Restored'),
         ('permanent_delete', 'Permanently Deleted'),
+        ('duplicate_received', 'Duplicate Received'),
     ]
     
     transaction = models.ForeignKey(
@@ -264,3 +296,144 @@ class TransactionHistory(models.Model):
     
     def __str__(self):
         return f"{self.action} - {self.transaction.filename} at {self.timestamp}"
+
+
+class SegmentValue(models.Model):
+    """Inverted index of segment/element values inside EDI payloads"""
+    
+    transaction = models.ForeignKey(
+        EDITransaction,
+        on_delete=models.CASCADE,
+        related_name='segment_values'
+    )
+    segment = models.CharField(max_length=10)
+    element = models.CharField(max_length=30)
+    value = models.CharField(max_length=80)
+    
+    # Character offset of the segment in the payload
+    offset = models.PositiveIntegerField()
+    
+    class Meta:
+        verbose_name = "Segment Value"
+        verbose_name_plural = "Segment Values"
+        app_label = 'usersys'
+        indexes = [
+            models.Index(fields=['value', 'segment', 'element'], name='usersys_segval_lookup_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.element}={self.value}"
+
+
+class SentControlNumber(models.Model):
+    """Envelope control number of a sent transaction (see control_numbers)"""
+    
+    LEVEL_CHOICES = [
+        ('interchange', 'Interchange'),  # ISA13, UNB 0020
+        ('group', 'Functional Group'),  # GS06, UNG 0048
+        ('message', 'Message'),  # ST02, UNH 0062
+    ]
+    
+    transaction = models.ForeignKey(
+        EDITransaction,
+        on_delete=models.CASCADE,
+        related_name='control_numbers'
+    )
+    bots_ta_id = models.IntegerField(null=True, blank=True)
+    level = models.CharField(max_length=12, choices=LEVEL_CHOICES)
+    
+    # Sender and receiver of the envelope the number belongs to
+    sender = models.CharField(max_length=35)
+    receiver = models.CharField(max_length=35)
+    
+    # Without leading zeros
+    control_number = models.CharField(max_length=14)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Sent Control Number"
+        verbose_name_plural = "Sent Control Numbers"
+        app_label = 'usersys'
+        indexes = [
+            models.Index(
+                fields=['sender', 'receiver', 'level', 'control_number'],
+                name='usersys_sentctrl_lookup_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.level} {self.control_number} ({self.sender} > {self.receiver})"
+
+class ProcessingCheckpoint(models.Model):
+    """Position of an incremental job, e.g. the last bots ta row it has read"""
+    
+    name = models.CharField(max_length=50, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Processing Checkpoint"
+        verbose_name_plural = "Processing Checkpoints"
+        app_label = 'usersys'
+    
+    def __str__(self):
+        return f"{self.name} at {self.position}"
+    
+    @classmethod
+    def locked(cls, name):
+        """
+        Get the checkpoint, locked for the current transaction
+        
+        Must be called inside transaction.atomic(); a second job with the same
+        name waits until the first commits.
+        """
+        cls.objects.get_or_create(name=name)
+        return cls.objects.select_for_update().get(name=name)
+
+
+class LeaderLease(models.Model):
+    """
+    Lease on a job that only one node may run at a time
+    
+    The holder renews it well before it expires; when a node stops or dies
+    the lease runs out and another node takes over. Node clocks should agree
+    to well within the lease time.
+    """
+    
+    name = models.CharField(max_length=50, unique=True)
+    holder = models.CharField(max_length=255, blank=True, default='')
+    expires_at = models.DateTimeField(null=True, blank=True)
+    renewed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Leader Lease"
+        verbose_name_plural = "Leader Leases"
+        app_label = 'usersys'
+    
+    def __str__(self):
+        return f"{self.name} held by {self.holder or 'nobody'}"
+    
+    @classmethod
+    def acquire(cls, name, holder, seconds):
+        """
+        Take the lease, or renew it when already held
+        
+        One conditional UPDATE, so two nodes can never both succeed.
+        
+        Returns:
+            bool: Whether holder has the lease
+        """
+        now = timezone.now()
+        cls.objects.get_or_create(name=name)
+        free = models.Q(holder=holder) | models.Q(expires_at__isnull=True) | models.Q(expires_at__lt=now)
+        return bool(cls.objects.filter(free, name=name).update(
+            holder=holder,
+            expires_at=now + timedelta(seconds=seconds),
+            renewed_at=now
+        ))
+    
+    @classmethod
+    def release(cls, name, holder):
+        """Give up the lease so another node can take over at once"""
+        cls.objects.filter(name=name, holder=holder).update(expires_at=None)
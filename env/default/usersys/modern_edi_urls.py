@@ -13,6 +13,7 @@ urlpatterns = [
     
     # Transaction CRUD endpoints
     path('api/v1/transactions/', modern_edi_views.list_transactions, name='list_transactions'),
+    path('api/v1/transactions/export/', modern_edi_views.export_transactions, name='export_transactions'),
     path('api/v1/transactions/<str:folder>/', modern_edi_views.list_transactions_by_folder, name='list_transactions_by_folder'),
     path('api/v1/transaction/<uuid:transaction_id>/', modern_edi_views.get_transaction, name='get_transaction'),
     path('api/v1/transaction/create/', modern_edi_views.create_transaction, name='create_transaction'),
@@ -38,4 +39,5 @@ urlpatterns = [
     
     # Search endpoint
     path('api/v1/search/', modern_edi_views.search_transactions, name='search_transactions'),
+    path('api/v1/search/segments/', modern_edi_views.search_segments, name='search_segments'),
 ]
@@ -5,19 +5,24 @@ REST API endpoints for transaction management
 
 import json
 from datetime import datetime
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponseNotModified
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.core.exceptions import ValidationError
-from django.db.models import Q
+from django.db.models import Q, Count, Max
 
 from .modern_edi_models import EDITransaction, TransactionHistory
 from .partner_models import Partner
 from .transaction_manager import TransactionManager
 from .file_manager import FileManager
 from .edi_parser import EDIParser
+from .search_index import TransactionSearchIndex
+from .segment_index import SegmentIndex
+from .pagination import CursorPaginator, InvalidCursor, wants_cursor, cursor_pagination_info
+from .streaming_export import StreamingExporter, InvalidExportFormat, export_options
+from .file_serving import serve_file, make_etag, etag_matches
 
 
 # Initialize services
@@ -25,6 +30,24 @@ transaction_manager = TransactionManager()
 file_manager = FileManager()
 edi_parser = EDIParser()
 
+# Columns for streamed exports: (values_list field, header)
+TRANSACTION_EXPORT_COLUMNS = [
+    ('id', 'ID'),
+    ('filename', 'Filename'),
+    ('folder', 'Folder'),
+    ('partner_name', 'Partner'),
+    ('partner_id', 'Partner ID'),
+    ('document_type', 'Document Type'),
+    ('po_number', 'PO Number'),
+    ('status', 'Status'),
+    ('file_size', 'File Size'),
+    ('created_at', 'Created'),
+    ('sent_at', 'Sent'),
+    ('received_at', 'Received'),
+    ('acknowledged_at', 'Acknowledged'),
+    ('acknowledgment_status', 'Acknowledgment Status'),
+]
+
 
 def json_response(data, status=200):
     """Helper to create JSON responses"""
@@ -48,11 +71,13 @@ def list_transactions(request):
     Query params:
         - page: Page number (default: 1)
         - page_size: Items per page (default: 50, max: 100)
+        - cursor: Opt into cursor pagination (empty for the first page)
+        - include_total: With cursor, add an estimated total when '1'
         - folder: Filter by folder
         - partner: Filter by partner name
         - document_type: Filter by document type
         - status: Filter by status
-        - search: Search in partner name, PO number, filename
+        - search: Search in partner name, PO number, filename and parsed metadata
         - date_from: Filter by created_at >= date
         - date_to: Filter by created_at <= date
     """
@@ -85,17 +110,37 @@ def list_transactions(request):
         if date_to:
             queryset = queryset.filter(created_at__lte=date_to)
         
-        # Apply search
+        # Apply search - full-text index when the backend has one
         if search:
-            queryset = queryset.filter(
-                Q(partner_name__icontains=search) |
-                Q(po_number__icontains=search) |
-                Q(filename__icontains=search)
-            )
-        
-        # Paginate
-        paginator = Paginator(queryset, page_size)
-        page_obj = paginator.get_page(page)
+            indexed = TransactionSearchIndex.filter(queryset, search)
+            if indexed is not None:
+                queryset = indexed
+            else:
+                queryset = queryset.filter(
+                    Q(partner_name__icontains=search) |
+                    Q(po_number__icontains=search) |
+                    Q(filename__icontains=search)
+                )
+        
+        # Paginate - cursor mode seeks on (created_at, id) instead of COUNT + OFFSET
+        if wants_cursor(request):
+            try:
+                page_obj = CursorPaginator(queryset, page_size).page(request.GET.get('cursor'))
+            except InvalidCursor as e:
+                return error_response(str(e), status=400)
+            include_total = request.GET.get('include_total') == '1'
+            pagination = cursor_pagination_info(page_obj, page_size, queryset if include_total else None)
+        else:
+            paginator = Paginator(queryset, page_size)
+            page_obj = paginator.get_page(page)
+            pagination = {
+                'page': page,
+                'page_size': page_size,
+                'total_pages': paginator.num_pages,
+                'total_count': paginator.count,
+                'has_next': page_obj.has_next(),
+                'has_previous': page_obj.has_previous(),
+            }
         
         # Serialize transactions
         transactions = []
@@ -123,14 +168,7 @@ def list_transactions(request):
         return json_response({
             'success': True,
             'transactions': transactions,
-            'pagination': {
-                'page': page,
-                'page_size': page_size,
-                'total_pages': paginator.num_pages,
-                'total_count': paginator.count,
-                'has_next': page_obj.has_next(),
-                'has_previous': page_obj.has_previous(),
-            }
+            'pagination': pagination,
         })
         
     except Exception as e:
@@ -158,6 +196,70 @@ def list_transactions_by_folder(request, folder):
     return list_transactions(request)
 
 
+@csrf_exempt
+@require_http_methods(["GET"])
+@login_required
+def export_transactions(request):
+    """
+    Export transactions as CSV or NDJSON, streamed
+    
+    GET /modern-edi/api/v1/transactions/export/
+    Query params:
+        - format: csv (default) or ndjson
+        - compress: gzip to download a .gz file
+        - folder, partner, document_type, status, search, date_from, date_to:
+          Same filters as list_transactions
+    """
+    try:
+        fmt, compress = export_options(request)
+        
+        folder = request.GET.get('folder')
+        partner = request.GET.get('partner')
+        document_type = request.GET.get('document_type')
+        status = request.GET.get('status')
+        search = request.GET.get('search')
+        date_from = request.GET.get('date_from')
+        date_to = request.GET.get('date_to')
+        
+        # Build query
+        queryset = EDITransaction.objects.all()
+        
+        # Apply filters
+        if folder:
+            queryset = queryset.filter(folder=folder)
+        if partner:
+            queryset = queryset.filter(partner_name__icontains=partner)
+        if document_type:
+            queryset = queryset.filter(document_type=document_type)
+        if status:
+            queryset = queryset.filter(status=status)
+        if date_from:
+            queryset = queryset.filter(created_at__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(created_at__lte=date_to)
+        
+        if search:
+            indexed = TransactionSearchIndex.filter(queryset, search)
+            if indexed is not None:
+                queryset = indexed
+            else:
+                queryset = queryset.filter(
+                    Q(partner_name__icontains=search) |
+                    Q(po_number__icontains=search) |
+                    Q(filename__icontains=search)
+                )
+        
+        queryset = queryset.order_by('-created_at', '-id')
+        
+        exporter = StreamingExporter(queryset, TRANSACTION_EXPORT_COLUMNS, fmt=fmt, compress=compress)
+        return exporter.response(f'transactions_{datetime.now().strftime("%Y%m%d")}')
+    
+    except InvalidExportFormat as e:
+        return error_response(str(e), status=400)
+    except Exception as e:
+        return error_response(f"Failed to export transactions: {str(e)}", status=500)
+
+
 @csrf_exempt
 @require_http_methods(["GET"])
 @login_required
@@ -196,6 +298,8 @@ def get_transaction(request, transaction_id):
                 'metadata': txn.metadata,
                 'created_by': txn.created_by.username if txn.created_by else None,
                 'bots_ta_id': txn.bots_ta_id,
+                'interchange_control_number': txn.interchange_control_number or None,
+                'duplicate_of': str(txn.duplicate_of_id) if txn.duplicate_of_id else None,
                 'is_editable': txn.is_editable(),
                 'is_sendable': txn.is_sendable(),
                 'is_movable': txn.is_movable(),
@@ -512,15 +616,29 @@ def get_transaction_raw(request, transaction_id):
     Get raw EDI content
     
     GET /modern-edi/api/v1/transactions/{id}/raw/
+    Query params:
+        - download: '1' to get the file itself (Range supported) instead of JSON
+    
+    Both forms send an ETag from content_hash and answer If-None-Match with 304.
     """
     try:
         # Get transaction
         txn = EDITransaction.objects.get(id=transaction_id)
         
+        if request.GET.get('download') == '1':
+            return serve_file(request, txn.file_path, filename=txn.filename, content_hash=txn.content_hash)
+        
+        # Unchanged content: skip reading the file
+        etag = make_etag(txn.file_path, txn.content_hash) if txn.content_hash else None
+        if etag and etag_matches(request, etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+        
         # Read file content
         content = file_manager.read_file(txn.file_path)
         
-        return json_response({
+        response = json_response({
             'success': True,
             'transaction_id': transaction_id,
             'filename': txn.filename,
@@ -528,6 +646,10 @@ def get_transaction_raw(request, transaction_id):
             'file_size': txn.file_size,
             'content_hash': txn.content_hash,
         })
+        if etag:
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+        return response
         
     except EDITransaction.DoesNotExist:
         return error_response(f"Transaction not found: {transaction_id}", status=404)
@@ -602,8 +724,11 @@ def get_partners(request):
     GET /modern-edi/api/v1/partners/
     """
     try:
-        # Get all partners
-        partners_qs = Partner.objects.all().order_by('name')
+        # Get all partners with transaction stats aggregated over the FK
+        partners_qs = Partner.objects.annotate(
+            transaction_count=Count('edi_transactions'),
+            last_activity=Max('edi_transactions__created_at'),
+        ).order_by('name')
         
         # Check for status filter
         status = request.GET.get('status')
@@ -612,42 +737,34 @@ def get_partners(request):
         
         partner_data = []
         for partner in partners_qs:
-            # Get transaction count for this partner
-            count = EDITransaction.objects.filter(partner_name=partner.name).count()
-            
-            # Get most recent transaction
-            recent_txn = EDITransaction.objects.filter(partner_name=partner.name).order_by('-created_at').first()
-            
             partner_data.append({
                 'id': str(partner.id),
                 'partner_id': partner.partner_id,
                 'name': partner.name,
                 'communication_method': partner.communication_method,
                 'status': partner.status,
-                'transaction_count': count,
-                'last_activity': recent_txn.created_at.isoformat() if recent_txn else None,
+                'transaction_count': partner.transaction_count,
+                'last_activity': partner.last_activity.isoformat() if partner.last_activity else None,
             })
             
-        # Also find partners in transactions that are not in Partner model
+        # Also find partners in transactions that are not linked to a Partner
         # This helps finding ad-hoc or legacy partners
-        existing_names = set(p['name'] for p in partner_data)
-        txn_partners = EDITransaction.objects.exclude(partner_name__in=existing_names).values_list('partner_name', flat=True).distinct()
-        
-        for partner_name in txn_partners:
-            if not partner_name:
-                continue
-                
-            count = EDITransaction.objects.filter(partner_name=partner_name).count()
-            recent_txn = EDITransaction.objects.filter(partner_name=partner_name).order_by('-created_at').first()
-            
+        txn_partners = EDITransaction.objects.filter(
+            trading_partner__isnull=True
+        ).exclude(partner_name='').values('partner_name').annotate(
+            transaction_count=Count('id'),
+            last_activity=Max('created_at'),
+        ).order_by()
+        
+        for row in txn_partners:
             partner_data.append({
-                'id': 'legacy_' + partner_name, # Mock ID
+                'id': 'legacy_' + row['partner_name'], # Mock ID
                 'partner_id': 'Unknown',
-                'name': partner_name,
+                'name': row['partner_name'],
                 'communication_method': 'manual', # Assume manual
                 'status': 'active', # Assume active if transacting
-                'transaction_count': count,
-                'last_activity': recent_txn.created_at.isoformat() if recent_txn else None,
+                'transaction_count': row['transaction_count'],
+                'last_activity': row['last_activity'].isoformat() if row['last_activity'] else None,
             })
             
         # Sort by name again
@@ -721,6 +838,70 @@ def search_transactions(request):
     return list_transactions(request)
 
 
+@csrf_exempt
+@require_http_methods(["GET"])
+@login_required
+def search_segments(request):
+    """
+    Find transactions by a value inside the EDI payload
+    
+    GET /modern-edi/api/v1/search/segments/?value={value}&segment=MAN&element=MAN02&document_type=856
+    Query params:
+        - value: Exact element value (required)
+        - segment: Segment tag
+        - element: Element name from the grammar (e.g. LIN03, C212.7140)
+        - document_type: Filter by document type
+        - limit: Maximum transactions (default: 100, max: 500)
+    """
+    try:
+        # Get query parameters
+        value = request.GET.get('value', '').strip()
+        segment = request.GET.get('segment', '').strip().upper()
+        element = request.GET.get('element', '').strip().upper()
+        document_type = request.GET.get('document_type', '').strip()
+        limit = min(int(request.GET.get('limit', 100)), 500)
+        
+        if not value:
+            return error_response("Missing required parameter: value", status=400)
+        
+        hits = SegmentIndex.search(
+            value,
+            segment=segment or None,
+            element=element or None,
+            document_type=document_type or None,
+            limit=limit
+        )
+        
+        # Attach transaction summaries in one query
+        transactions = EDITransaction.objects.in_bulk([hit['transaction_id'] for hit in hits])
+        results = []
+        for hit in hits:
+            txn = transactions.get(hit['transaction_id'])
+            if txn is None:
+                continue
+            results.append({
+                'id': str(txn.id),
+                'filename': txn.filename,
+                'folder': txn.folder,
+                'partner_name': txn.partner_name,
+                'document_type': txn.document_type,
+                'po_number': txn.po_number,
+                'created_at': txn.created_at.isoformat(),
+                'matches': hit['matches'],
+            })
+        
+        return json_response({
+            'success': True,
+            'results': results,
+            'count': len(results),
+        })
+        
+    except ValueError as e:
+        return error_response(f"Invalid parameter: {str(e)}", status=400)
+    except Exception as e:
+        return error_response(f"Failed to search segments: {str(e)}", status=500)
+
+
 
 @csrf_exempt
 @require_http_methods(["GET"])
@@ -0,0 +1,197 @@
+"""
+Cursor Pagination
+Keyset (seek) pagination for large, append-mostly tables
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from django.db import connections
+from django.db.models import Q
+
+
+ESTIMATE_CAP = 10000
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded"""
+
+
+def wants_cursor(request):
+    """
+    Check whether the client opted into cursor pagination
+    
+    Cursor mode is enabled by passing a ``cursor`` query parameter; an
+    empty value requests the first page.
+    """
+    return 'cursor' in request.GET
+
+
+def estimate_count(queryset, cap=ESTIMATE_CAP):
+    """
+    Cheap row count for a queryset
+    
+    Unfiltered tables on PostgreSQL use the planner statistics. Everything
+    else counts at most ``cap`` rows so the cost stays bounded.
+    
+    Returns:
+        tuple: (count, is_exact)
+    """
+    query = queryset.query
+    connection = connections[queryset.db]
+    
+    if connection.vendor == 'postgresql' and not query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0]), False
+    
+    count = queryset.order_by()[:cap + 1].count()
+    if count > cap:
+        return cap, False
+    return count, True
+
+
+class CursorPage:
+    """A single page of cursor-paginated results"""
+    
+    def __init__(self, object_list, next_cursor, prev_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+    
+    def __iter__(self):
+        return iter(self.object_list)
+    
+    def __len__(self):
+        return len(self.object_list)
+    
+    def has_next(self):
+        return self.next_cursor is not None
+    
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset newest-first on (ordering_field, pk)
+    
+    Each page is a single indexed range scan, so page 10,000 costs the same
+    as page 1. Cursors are opaque url-safe tokens holding the boundary row's
+    key and the direction to walk.
+    """
+    
+    def __init__(self, queryset, per_page, ordering_field='created_at'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering_field = ordering_field
+    
+    def encode_cursor(self, obj, direction):
+        """Build a cursor token pointing at obj"""
+        value = getattr(obj, self.ordering_field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        pk = obj.pk
+        if not isinstance(pk, int):
+            pk = str(pk)
+        payload = json.dumps({'v': value, 'pk': pk, 'd': direction}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+    
+    def decode_cursor(self, token):
+        """
+        Decode a cursor token
+        
+        Returns:
+            tuple: (value, pk, direction)
+        """
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            value, pk, direction = payload['v'], payload['pk'], payload['d']
+        except (ValueError, TypeError, KeyError):
+            raise InvalidCursor('Invalid cursor')
+        
+        if direction not in ('n', 'p'):
+            raise InvalidCursor('Invalid cursor')
+        
+        field = self.queryset.model._meta.get_field(self.ordering_field)
+        if field.get_internal_type() == 'DateTimeField':
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise InvalidCursor('Invalid cursor')
+        
+        return value, pk, direction
+    
+    def page(self, cursor=None):
+        """
+        Fetch the page after (or before) a cursor
+        
+        Args:
+            cursor: Token from a previous page, or None/'' for the first page
+        
+        Returns:
+            CursorPage
+        """
+        field = self.ordering_field
+        queryset = self.queryset
+        
+        if not cursor:
+            rows = list(queryset.order_by('-' + field, '-pk')[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            return CursorPage(
+                rows,
+                self.encode_cursor(rows[-1], 'n') if has_more else None,
+                None,
+            )
+        
+        value, pk, direction = self.decode_cursor(cursor)
+        
+        if direction == 'n':
+            seek = Q(**{field + '__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+            rows = list(queryset.filter(seek).order_by('-' + field, '-pk')[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1], 'n') if has_more else None
+            prev_cursor = self.encode_cursor(rows[0], 'p') if rows else None
+        else:
+            seek = Q(**{field + '__gt': value}) | Q(**{field: value, 'pk__gt': pk})
+            rows = list(queryset.filter(seek).order_by(field, 'pk')[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            prev_cursor = self.encode_cursor(rows[0], 'p') if has_more else None
+            next_cursor = self.encode_cursor(rows[-1], 'n') if rows else None
+        
+        return CursorPage(rows, next_cursor, prev_cursor)
+
+
+def cursor_pagination_info(page, page_size, queryset=None):
+    """
+    Build the pagination block returned by list endpoints in cursor mode
+    
+    Args:
+        page: CursorPage
+        page_size: Page size
+        queryset: Filtered queryset, only when an estimated total was requested
+    """
+    info = {
+        'mode': 'cursor',
+        'page_size': page_size,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'has_next': page.has_next(),
+        'has_previous': page.has_previous(),
+    }
+    if queryset is not None:
+        total, exact = estimate_count(queryset)
+        info['estimated_total'] = total
+        info['total_is_exact'] = exact
+    return info
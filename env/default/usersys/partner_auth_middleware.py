@@ -3,11 +3,41 @@ Partner Portal Authentication Middleware
 Handles session validation, permission checks, and session timeout
 """
 
+from django.conf import settings
 from django.http import JsonResponse
 from django.utils import timezone
 from datetime import timedelta, datetime
 
-from .partner_models import PartnerUser
+from .partner_models import PartnerUser, PartnerPermission
+from .metrics import token_valid as metrics_token_valid
+
+
+# Permission required per partner portal URL name (partner_portal_urls) and method
+PARTNER_PERMISSION_RULES = {
+    'partner_transactions_list': {'GET': 'can_view_transactions'},
+    'partner_transaction_detail': {'GET': 'can_view_transactions'},
+    'partner_file_upload': {'POST': 'can_upload_files'},
+    'partner_upload_create': {'POST': 'can_upload_files'},
+    'partner_upload_detail': {
+        'GET': 'can_upload_files',
+        'PATCH': 'can_upload_files',
+        'DELETE': 'can_upload_files',
+    },
+    'partner_files_list': {'GET': 'can_download_files'},
+    'partner_file_download': {'GET': 'can_download_files'},
+    'partner_files_bulk_download': {'POST': 'can_download_files'},
+    'partner_settings_update_contact': {'PUT': 'can_manage_settings'},
+    'partner_settings_test_connection': {'POST': 'can_manage_settings'},
+}
+
+
+def compile_permission_rules(rules):
+    """Flatten {url_name: {method: permission}} into a {(url_name, method): permission} lookup"""
+    return {
+        (url_name, method): permission
+        for url_name, methods in rules.items()
+        for method, permission in methods.items()
+    }
 
 
 class PartnerAuthMiddleware:
@@ -17,6 +47,8 @@ class PartnerAuthMiddleware:
         self.get_response = get_response
         # Session timeout in seconds (30 minutes)
         self.session_timeout = 1800
+        # last_activity is rewritten at most this often, so most requests leave the session untouched
+        self.activity_interval = getattr(settings, 'PARTNER_ACTIVITY_UPDATE_INTERVAL', 60)
     
     def __call__(self, request):
         # Check if request is for partner portal API
@@ -39,14 +71,18 @@ class PartnerAuthMiddleware:
                     }, status=401)
                 
                 # Check session timeout
+                now = timezone.now()
+                time_since_activity = None
                 last_activity_str = request.session.get('last_activity')
                 if last_activity_str:
                     try:
                         last_activity = datetime.fromisoformat(last_activity_str)
-                        if timezone.is_naive(last_activity):
+                        if timezone.is_naive(last_activity) and timezone.is_aware(now):
                             last_activity = timezone.make_aware(last_activity)
+                        elif timezone.is_aware(last_activity) and timezone.is_naive(now):
+                            last_activity = timezone.make_naive(last_activity)
                         
-                        time_since_activity = (timezone.now() - last_activity).total_seconds()
+                        time_since_activity = (now - last_activity).total_seconds()
                         
                         if time_since_activity > self.session_timeout:
                             request.session.flush()
@@ -57,12 +93,9 @@ class PartnerAuthMiddleware:
                     except (ValueError, TypeError):
                         pass
                 
-                # Load partner user
+                # Load partner user (cached snapshot with partner and permissions)
                 try:
-                    partner_user = PartnerUser.objects.select_related('partner', 'permissions').get(
-                        id=partner_user_id,
-                        is_active=True
-                    )
+                    partner_user = PartnerUser.get_cached(partner_user_id)
                     
                     # Check account lockout
                     if partner_user.is_locked():
@@ -76,8 +109,9 @@ class PartnerAuthMiddleware:
                     request.partner_user = partner_user
                     request.partner = partner_user.partner
                     
-                    # Update last activity
-                    request.session['last_activity'] = timezone.now().isoformat()
+                    # Update last activity (throttled)
+                    if time_since_activity is None or time_since_activity >= self.activity_interval:
+                        request.session['last_activity'] = now.isoformat()
                     
                 except PartnerUser.DoesNotExist:
                     request.session.flush()
@@ -91,73 +125,44 @@ class PartnerAuthMiddleware:
 
 
 class PartnerPermissionMiddleware:
-    """Middleware for checking partner permissions"""
+    """
+    Middleware for checking partner permissions
+    
+    Runs after URL resolution: the required permission is looked up by URL
+    name and method in PARTNER_PERMISSION_RULES.
+    """
     
     def __init__(self, get_response):
         self.get_response = get_response
+        self.rules = compile_permission_rules(PARTNER_PERMISSION_RULES)
     
     def __call__(self, request):
-        # Check permissions for partner portal endpoints
-        if request.path.startswith('/modern-edi/api/v1/partner-portal/'):
-            # Skip permission check for auth endpoints
-            auth_endpoints = [
-                '/modern-edi/api/v1/partner-portal/auth/',
-            ]
-            
-            skip_check = any(request.path.startswith(ep) for ep in auth_endpoints)
-            
-            if not skip_check and hasattr(request, 'partner_user'):
-                user = request.partner_user
-                permissions = user.permissions if hasattr(user, 'permissions') else None
-                
-                # If no permissions object, create default based on role
-                if not permissions:
-                    from .partner_models import PartnerPermission
-                    defaults = user.get_default_permissions()
-                    permissions = PartnerPermission.objects.create(
-                        user=user,
-                        **defaults
-                    )
-                    user.permissions = permissions
-                
-                # Check permissions based on endpoint
-                if '/files/upload' in request.path and request.method == 'POST':
-                    if not permissions.can_upload_files:
-                        return JsonResponse({
-                            'error': 'Permission denied',
-                            'code': 'PERMISSION_DENIED',
-                            'required_permission': 'can_upload_files'
-                        }, status=403)
-                
-                elif '/files/download' in request.path and request.method in ['GET', 'POST']:
-                    if not permissions.can_download_files:
-                        return JsonResponse({
-                            'error': 'Permission denied',
-                            'code': 'PERMISSION_DENIED',
-                            'required_permission': 'can_download_files'
-                        }, status=403)
-                
-                elif '/transactions' in request.path and request.method == 'GET':
-                    if not permissions.can_view_transactions:
-                        return JsonResponse({
-                            'error': 'Permission denied',
-                            'code': 'PERMISSION_DENIED',
-                            'required_permission': 'can_view_transactions'
-                        }, status=403)
-                
-                elif '/settings' in request.path and request.method in ['PUT', 'PATCH', 'POST']:
-                    if not permissions.can_manage_settings:
-                        return JsonResponse({
-                            'error': 'Permission denied',
-                            'code': 'PERMISSION_DENIED',
-                            'required_permission': 'can_manage_settings'
-                        }, status=403)
-                
-                # Attach permissions to request for easy access
-                request.partner_permissions = permissions
-        
         response = self.get_response(request)
         return response
+    
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        user = getattr(request, 'partner_user', None)
+        if user is None:
+            return None
+        
+        permissions = getattr(user, 'permissions', None)
+        if permissions is None:
+            # Rows are created with the user; fall back to role defaults without writing
+            permissions = PartnerPermission(user_id=user.pk, **user.get_default_permissions())
+        
+        # Attach permissions to request for easy access
+        request.partner_permissions = permissions
+        
+        match = request.resolver_match
+        required = self.rules.get((match.url_name, request.method)) if match else None
+        if required and not getattr(permissions, required):
+            return JsonResponse({
+                'error': 'Permission denied',
+                'code': 'PERMISSION_DENIED',
+                'required_permission': required
+            }, status=403)
+        
+        return None
 
 
 class AdminAuthMiddleware:
@@ -168,7 +173,7 @@ class AdminAuthMiddleware:
     
     def __call__(self, request):
         # Check if request is for admin dashboard API
-        if request.path.startswith('/modern-edi/api/v1/admin/'):
+        if request.path.startswith('/modern-edi/api/v1/admin/') and not self.is_metrics_scrape(request):
             # Verify user is authenticated and is staff
             if not request.user.is_authenticated:
                 return JsonResponse({
@@ -184,3 +189,7 @@ class AdminAuthMiddleware:
         
         response = self.get_response(request)
         return response
+    
+    def is_metrics_scrape(self, request):
+        # Prometheus authenticates with METRICS_TOKEN instead of a session
+        return request.path == '/modern-edi/api/v1/admin/metrics' and metrics_token_valid(request)
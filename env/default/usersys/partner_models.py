@@ -4,10 +4,15 @@ Models for managing trading partners with SFTP and API configurations
 """
 
 import uuid
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
 
+from .request_profiler import record_cache_lookup
+
 
 class Partner(models.Model):
     """Trading Partner model with communication settings"""
@@ -123,6 +128,16 @@ class Partner(models.Model):
         if not self.display_name:
             self.display_name = self.name
         super().save(*args, **kwargs)
+        self._invalidate_user_cache()
+    
+    def delete(self, *args, **kwargs):
+        self._invalidate_user_cache()
+        return super().delete(*args, **kwargs)
+    
+    def _invalidate_user_cache(self):
+        """Drop the cached portal sessions of this partner's users"""
+        if self.pk:
+            cache.delete_many([PartnerUser.cache_key(pk) for pk in self.users.values_list('pk', flat=True)])
     
     def get_display_name(self):
         """Get the display name for this partner"""
@@ -224,6 +239,11 @@ class PartnerSFTPConfig(models.Model):
         default=300,
         help_text="Polling interval in seconds (default: 5 minutes)"
     )
+    last_poll_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the partner's SFTP server was last polled"
+    )
     
     # Status
     is_active = models.BooleanField(default=True)
@@ -529,6 +549,39 @@ class PartnerUser(models.Model):
     def __str__(self):
         return f"{self.username} ({self.partner.name})"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache.delete(self.cache_key(self.pk))
+    
+    def delete(self, *args, **kwargs):
+        cache.delete(self.cache_key(self.pk))
+        return super().delete(*args, **kwargs)
+    
+    @staticmethod
+    def cache_key(user_id):
+        return f'partner_user:{user_id}'
+    
+    @classmethod
+    def get_cached(cls, user_id):
+        """
+        Load an active user with partner and permissions, via the cache
+        
+        Cached for PARTNER_SESSION_CACHE_TTL seconds. Saving or deleting the
+        user, its permissions or its partner (which includes lockouts and
+        deactivation) drops the entry from the configured cache; with a
+        per-process cache, other workers see the change only once their copy
+        expires.
+        
+        Raises:
+            PartnerUser.DoesNotExist: If there is no active user with this id
+        """
+        user = cache.get(cls.cache_key(user_id))
+        record_cache_lookup('partner_user', user is not None)
+        if user is None:
+            user = cls.objects.select_related('partner', 'permissions').get(id=user_id, is_active=True)
+            cache.set(cls.cache_key(user_id), user, getattr(settings, 'PARTNER_SESSION_CACHE_TTL', 30))
+        return user
+    
     def get_full_name(self):
         """Get user's full name"""
         return f"{self.first_name} {self.last_name}".strip()
@@ -631,6 +684,14 @@ class PartnerPermission(models.Model):
     def __str__(self):
         return f"Permissions for {self.user.username}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache.delete(PartnerUser.cache_key(self.user_id))
+    
+    def delete(self, *args, **kwargs):
+        cache.delete(PartnerUser.cache_key(self.user_id))
+        return super().delete(*args, **kwargs)
+    
     def to_dict(self):
         """Convert permissions to dictionary"""
         return {
@@ -652,7 +713,8 @@ class ActivityLog(models.Model):
     
     # Timestamp
     timestamp = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         db_index=True,
         help_text="When this action occurred"
     )
@@ -1028,3 +1090,62 @@ class ScheduledReport(models.Model):
         self.run_count += 1
         self.calculate_next_run()
         self.save(update_fields=['last_run', 'last_run_status', 'last_run_error', 'run_count', 'next_run'])
+
+
+class UploadSession(models.Model):
+    """Resumable partner upload: a partial file plus the offset received so far"""
+    
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('completed', 'Completed'),
+        ('aborted', 'Aborted'),
+        ('expired', 'Expired'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    partner = models.ForeignKey(
+        Partner,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    partner_user = models.ForeignKey(
+        PartnerUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload_sessions'
+    )
+    filename = models.CharField(max_length=255)
+    document_type = models.CharField(max_length=50, blank=True)
+    po_number = models.CharField(max_length=100, blank=True)
+    total_size = models.BigIntegerField(help_text="Declared size of the complete file in bytes")
+    offset = models.BigIntegerField(default=0, help_text="Bytes received and stored so far")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    transaction = models.ForeignKey(
+        'usersys.EDITransaction',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload_sessions',
+        help_text="Transaction created when the upload completed"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(help_text="Abandoned uploads are removed after this time")
+    
+    class Meta:
+        verbose_name = "Upload Session"
+        verbose_name_plural = "Upload Sessions"
+        app_label = 'usersys'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='usersys_upload_expiry_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.total_size})"
+    
+    def is_expired(self):
+        """Check if an active session has passed its expiry time"""
+        from django.utils import timezone
+        return self.status == 'active' and self.expires_at < timezone.now()
@@ -24,6 +24,8 @@ urlpatterns = [
     
     # File operations
     path('files/upload', partner_portal_views.partner_file_upload, name='partner_file_upload'),
+    path('files/uploads', partner_portal_views.partner_upload_create, name='partner_upload_create'),
+    path('files/uploads/<uuid:upload_id>', partner_portal_views.partner_upload_detail, name='partner_upload_detail'),
     path('files/download', partner_portal_views.partner_files_list, name='partner_files_list'),
     path('files/download/<uuid:transaction_id>', partner_portal_views.partner_file_download, name='partner_file_download'),
     path('files/download/bulk', partner_portal_views.partner_files_bulk_download, name='partner_files_bulk_download'),
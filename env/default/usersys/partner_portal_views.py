@@ -5,21 +5,32 @@ Handles all partner portal endpoints for transactions, files, and settings
 
 import json
 import os
-import zipfile
-from io import BytesIO
-from django.http import JsonResponse, FileResponse, HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.core.paginator import Paginator
 from django.db.models import Q
 from django.utils import timezone
+from django.core.exceptions import ValidationError
 
 from .analytics_service import AnalyticsService
 from .activity_logger import ActivityLogger
 from .modern_edi_models import EDITransaction
-from .partner_models import Partner, ScheduledReport
-from .file_manager import FileManager
+from .partner_models import Partner, ScheduledReport, UploadSession
 from .transaction_manager import TransactionManager
 from .report_service import ReportScheduler
+from .search_index import TransactionSearchIndex
+from .pagination import CursorPaginator, InvalidCursor, wants_cursor, cursor_pagination_info
+from .zip_stream import iter_zip
+from .file_serving import serve_file
+from .upload_ingest import get_max_upload_size
+from .duplicate_detection import DuplicateInterchange
+from .resumable_upload import (
+    ResumableUploadService, UploadGone, UploadOffsetMismatch, ChecksumMismatch,
+    parse_checksum, RECOMMENDED_CHUNK_SIZE
+)
+
+
+ALLOWED_UPLOAD_EXTENSIONS = ['.edi', '.x12', '.txt', '.xml']
 
 
 # Dashboard Endpoints
@@ -42,7 +53,7 @@ def partner_dashboard_metrics(request):
         
         # Get recent transactions
         recent_transactions = EDITransaction.objects.filter(
-            partner_id=partner_id
+            trading_partner=request.partner
         ).order_by('-created_at')[:10]
         
         transactions_data = []
@@ -78,6 +89,7 @@ def partner_transactions_list(request):
     """
     List partner transactions with search and filter
     GET /api/v1/partner-portal/transactions?search=&status=&type=&page=1
+    GET /api/v1/partner-portal/transactions?cursor=&include_total=1 (cursor mode)
     """
     if not hasattr(request, 'partner_user'):
         return JsonResponse({'error': 'Not authenticated'}, status=401)
@@ -94,14 +106,18 @@ def partner_transactions_list(request):
         per_page = int(request.GET.get('per_page', 50))
         
         # Build query - filter by partner
-        transactions = EDITransaction.objects.filter(partner_id=request.partner.id)
+        transactions = EDITransaction.objects.filter(trading_partner=request.partner)
         
         if search:
-            transactions = transactions.filter(
-                Q(po_number__icontains=search) |
-                Q(filename__icontains=search) |
-                Q(document_type__icontains=search)
-            )
+            indexed = TransactionSearchIndex.filter(transactions, search)
+            if indexed is not None:
+                transactions = indexed
+            else:
+                transactions = transactions.filter(
+                    Q(po_number__icontains=search) |
+                    Q(filename__icontains=search) |
+                    Q(document_type__icontains=search)
+                )
         
         if status:
             transactions = transactions.filter(folder=status)
@@ -112,9 +128,25 @@ def partner_transactions_list(request):
         # Order by created date descending
         transactions = transactions.order_by('-created_at')
         
-        # Paginate
-        paginator = Paginator(transactions, per_page)
-        page_obj = paginator.get_page(page)
+        # Paginate - cursor mode seeks on (created_at, id) instead of COUNT + OFFSET
+        if wants_cursor(request):
+            try:
+                page_obj = CursorPaginator(transactions, per_page).page(request.GET.get('cursor'))
+            except InvalidCursor as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            include_total = request.GET.get('include_total') == '1'
+            pagination = cursor_pagination_info(page_obj, per_page, transactions if include_total else None)
+        else:
+            paginator = Paginator(transactions, per_page)
+            page_obj = paginator.get_page(page)
+            pagination = {
+                'page': page,
+                'per_page': per_page,
+                'total': paginator.count,
+                'pages': paginator.num_pages,
+                'has_next': page_obj.has_next(),
+                'has_previous': page_obj.has_previous(),
+            }
         
         # Serialize transactions
         transactions_data = []
@@ -140,14 +172,7 @@ def partner_transactions_list(request):
         return JsonResponse({
             'success': True,
             'transactions': transactions_data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': paginator.count,
-                'pages': paginator.num_pages,
-                'has_next': page_obj.has_next(),
-                'has_previous': page_obj.has_previous(),
-            }
+            'pagination': pagination,
         })
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -169,7 +194,7 @@ def partner_transaction_detail(request, transaction_id):
         # Get transaction - ensure it belongs to this partner
         transaction = EDITransaction.objects.get(
             id=transaction_id,
-            partner_id=request.partner.id
+            trading_partner=request.partner
         )
         
         # Read file content if exists
@@ -254,37 +279,33 @@ def partner_file_upload(request):
         document_type = request.POST.get('document_type', '')
         po_number = request.POST.get('po_number', '')
         
-        # Validate file size (10 MB max)
-        max_size = 10 * 1024 * 1024  # 10 MB
+        # Validate file size - checked again while streaming
+        max_size = get_max_upload_size()
         if uploaded_file.size > max_size:
-            return JsonResponse({'error': 'File too large (max 10 MB)'}, status=400)
+            return JsonResponse({'error': f'File too large (max {max_size // (1024 * 1024)} MB)'}, status=400)
         
         # Validate file extension
-        allowed_extensions = ['.edi', '.x12', '.txt', '.xml']
         file_ext = os.path.splitext(uploaded_file.name)[1].lower()
-        if file_ext not in allowed_extensions:
+        if file_ext not in ALLOWED_UPLOAD_EXTENSIONS:
             return JsonResponse({
-                'error': f'Invalid file type. Allowed: {", ".join(allowed_extensions)}'
+                'error': f'Invalid file type. Allowed: {", ".join(ALLOWED_UPLOAD_EXTENSIONS)}'
             }, status=400)
         
-        # Create transaction in inbox
-        transaction = TransactionManager.create_transaction(
-            folder='inbox',
-            partner_name=request.partner.name,
-            partner_id=str(request.partner.id),
-            document_type=document_type,
-            po_number=po_number,
-            filename=uploaded_file.name,
-            user=request.partner_user.username
+        # Stream into the inbox: written, hashed and header-parsed in one pass
+        transaction = TransactionManager().ingest_upload(
+            'inbox',
+            uploaded_file,
+            {
+                'partner_name': request.partner.name,
+                'partner_id': str(request.partner.id),
+                'document_type': document_type,
+                'po_number': po_number,
+                'filename': uploaded_file.name,
+                'metadata': {'uploaded_by': request.partner_user.username},
+            },
+            max_size=max_size
         )
         
-        # Save file
-        file_content = uploaded_file.read()
-        if isinstance(file_content, bytes):
-            file_content = file_content.decode('utf-8', errors='ignore')
-        
-        FileManager.save_file(transaction, file_content)
-        
         # Log activity
         ActivityLogger.log_partner(
             request.partner_user,
@@ -293,8 +314,8 @@ def partner_file_upload(request):
             resource_id=str(transaction.id),
             details={
                 'filename': uploaded_file.name,
-                'size': uploaded_file.size,
-                'document_type': document_type
+                'size': transaction.file_size,
+                'document_type': transaction.document_type
             },
             request=request
         )
@@ -306,9 +327,165 @@ def partner_file_upload(request):
                 'filename': transaction.filename,
                 'document_type': transaction.document_type,
                 'po_number': transaction.po_number,
+                'file_size': transaction.file_size,
+                'content_hash': transaction.content_hash,
+                'format': transaction.metadata.get('format'),
             }
         }, status=201)
         
+    except DuplicateInterchange as e:
+        return JsonResponse({'error': f'Duplicate {e.reason}: already received'}, status=409)
+    except ValidationError as e:
+        return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+# Resumable Upload Endpoints
+
+def _upload_session_data(session):
+    """Serialize an upload session"""
+    return {
+        'id': str(session.id),
+        'filename': session.filename,
+        'status': session.status,
+        'offset': session.offset,
+        'size': session.total_size,
+        'expires_at': session.expires_at.isoformat(),
+        'transaction_id': str(session.transaction_id) if session.transaction_id else None,
+    }
+
+
+def _upload_response(session, status=200):
+    response = JsonResponse({'success': True, 'upload': _upload_session_data(session)}, status=status)
+    response['Upload-Offset'] = str(session.offset)
+    response['Upload-Length'] = str(session.total_size)
+    return response
+
+
+@require_http_methods(["POST"])
+def partner_upload_create(request):
+    """
+    Start a resumable upload
+    POST /api/v1/partner-portal/files/uploads
+    Body: {filename, size, document_type (optional), po_number (optional)}
+    
+    Then PATCH /files/uploads/<id> with Upload-Offset (and optionally
+    Upload-Checksum: sha256 <base64>) once per chunk; the last chunk creates
+    the transaction. GET /files/uploads/<id> returns the offset to resume from;
+    an empty PATCH at the full size retries creating the transaction.
+    """
+    if not hasattr(request, 'partner_user'):
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
+    
+    if not request.partner_permissions.can_upload_files:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    try:
+        data = json.loads(request.body)
+        filename = os.path.basename(data.get('filename', '').strip())
+        
+        if not filename:
+            return JsonResponse({'error': 'filename is required'}, status=400)
+        
+        file_ext = os.path.splitext(filename)[1].lower()
+        if file_ext not in ALLOWED_UPLOAD_EXTENSIONS:
+            return JsonResponse({
+                'error': f'Invalid file type. Allowed: {", ".join(ALLOWED_UPLOAD_EXTENSIONS)}'
+            }, status=400)
+        
+        session = ResumableUploadService.create(
+            request.partner_user,
+            filename,
+            int(data.get('size', 0)),
+            document_type=data.get('document_type', ''),
+            po_number=data.get('po_number', '')
+        )
+        
+        response = _upload_response(session, status=201)
+        response['Location'] = f'{request.path.rstrip("/")}/{session.id}'
+        response['Upload-Chunk-Size'] = str(RECOMMENDED_CHUNK_SIZE)
+        return response
+    
+    except ValidationError as e:
+        return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'error': f'Invalid request: {str(e)}'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@require_http_methods(["GET", "PATCH", "DELETE"])
+def partner_upload_detail(request, upload_id):
+    """
+    Resumable upload status, chunk append and cancel
+    GET    /api/v1/partner-portal/files/uploads/<id>
+    PATCH  /api/v1/partner-portal/files/uploads/<id>  (chunk bytes as body)
+    DELETE /api/v1/partner-portal/files/uploads/<id>
+    """
+    if not hasattr(request, 'partner_user'):
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
+    
+    if not request.partner_permissions.can_upload_files:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    try:
+        if request.method == 'GET':
+            session = ResumableUploadService.get(upload_id, request.partner)
+            return _upload_response(session)
+        
+        if request.method == 'DELETE':
+            session = ResumableUploadService.get(upload_id, request.partner)
+            ResumableUploadService.abort(session)
+            return _upload_response(session)
+        
+        # PATCH - append a chunk
+        offset = request.META.get('HTTP_UPLOAD_OFFSET')
+        if offset is None:
+            return JsonResponse({'error': 'Upload-Offset header required'}, status=400)
+        
+        session = ResumableUploadService.append(
+            upload_id,
+            request.partner,
+            int(offset),
+            request,
+            int(request.META.get('CONTENT_LENGTH') or 0),
+            checksum=parse_checksum(request.META.get('HTTP_UPLOAD_CHECKSUM'))
+        )
+        
+        if session.status == 'completed':
+            ActivityLogger.log_partner(
+                request.partner_user,
+                'file_uploaded',
+                resource_type='transaction',
+                resource_id=str(session.transaction_id),
+                details={
+                    'filename': session.filename,
+                    'size': session.total_size,
+                    'resumable': True
+                },
+                request=request
+            )
+            return _upload_response(session, status=201)
+        
+        return _upload_response(session)
+    
+    except UploadSession.DoesNotExist:
+        return JsonResponse({'error': 'Upload not found'}, status=404)
+    except UploadGone as e:
+        return JsonResponse({'error': str(e)}, status=410)
+    except UploadOffsetMismatch as e:
+        response = JsonResponse({'error': str(e), 'offset': e.offset}, status=409)
+        response['Upload-Offset'] = str(e.offset)
+        return response
+    except DuplicateInterchange as e:
+        return JsonResponse({'error': f'Duplicate {e.reason}: already received'}, status=409)
+    except ChecksumMismatch as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid request: {str(e)}'}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -330,7 +507,7 @@ def partner_files_list(request):
     try:
         # Get files in received and sent folders for this partner
         files = EDITransaction.objects.filter(
-            partner_id=request.partner.id,
+            trading_partner=request.partner,
             folder__in=['received', 'sent']
         ).order_by('-created_at')
         
@@ -360,6 +537,7 @@ def partner_file_download(request, transaction_id):
     """
     Download a specific file
     GET /api/v1/partner-portal/files/download/<id>
+    Supports If-None-Match (ETag is the content hash) and Range
     """
     if not hasattr(request, 'partner_user'):
         return JsonResponse({'error': 'Not authenticated'}, status=401)
@@ -371,34 +549,40 @@ def partner_file_download(request, transaction_id):
         # Get transaction - ensure it belongs to this partner
         transaction = EDITransaction.objects.get(
             id=transaction_id,
-            partner_id=request.partner.id
+            trading_partner=request.partner
         )
         
         # Check file exists
         if not transaction.file_path or not os.path.exists(transaction.file_path):
             return JsonResponse({'error': 'File not found'}, status=404)
         
-        # Mark as downloaded
-        metadata = transaction.metadata or {}
-        metadata['downloaded'] = True
-        metadata['download_count'] = metadata.get('download_count', 0) + 1
-        metadata['last_download'] = timezone.now().isoformat()
-        transaction.metadata = metadata
-        transaction.save(update_fields=['metadata'])
-        
-        # Log activity
-        ActivityLogger.log_partner(
-            request.partner_user,
-            'file_downloaded',
-            resource_type='transaction',
-            resource_id=str(transaction.id),
-            details={'filename': transaction.filename},
-            request=request
+        response = serve_file(
+            request,
+            transaction.file_path,
+            filename=transaction.filename,
+            content_hash=transaction.content_hash
         )
         
-        # Return file
-        response = FileResponse(open(transaction.file_path, 'rb'))
-        response['Content-Disposition'] = f'attachment; filename="{transaction.filename}"'
+        # Revalidations and resumed ranges are not new downloads
+        if response.status_code == 200 or request.META.get('HTTP_RANGE', '').startswith('bytes=0-'):
+            # Mark as downloaded
+            metadata = transaction.metadata or {}
+            metadata['downloaded'] = True
+            metadata['download_count'] = metadata.get('download_count', 0) + 1
+            metadata['last_download'] = timezone.now().isoformat()
+            transaction.metadata = metadata
+            transaction.save(update_fields=['metadata'])
+            
+            # Log activity
+            ActivityLogger.log_partner(
+                request.partner_user,
+                'file_downloaded',
+                resource_type='transaction',
+                resource_id=str(transaction.id),
+                details={'filename': transaction.filename},
+                request=request
+            )
+        
         return response
         
     except EDITransaction.DoesNotExist:
@@ -430,27 +614,22 @@ def partner_files_bulk_download(request):
         # Get transactions - ensure they belong to this partner
         transactions = EDITransaction.objects.filter(
             id__in=transaction_ids,
-            partner_id=request.partner.id
+            trading_partner=request.partner
         )
         
-        # Create ZIP file in memory
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for txn in transactions:
-                if txn.file_path and os.path.exists(txn.file_path):
-                    zip_file.write(txn.file_path, txn.filename)
+        # Only paths and names are loaded; file data is streamed into the ZIP
+        files = list(transactions.values_list('file_path', 'filename'))
         
         # Log activity
         ActivityLogger.log_partner(
             request.partner_user,
             'files_bulk_downloaded',
-            details={'count': len(transactions)},
+            details={'count': len(files)},
             request=request
         )
         
         # Return ZIP
-        zip_buffer.seek(0)
-        response = HttpResponse(zip_buffer.read(), content_type='application/zip')
+        response = StreamingHttpResponse(iter_zip(files), content_type='application/zip')
         response['Content-Disposition'] = 'attachment; filename="edi_files.zip"'
         return response
         
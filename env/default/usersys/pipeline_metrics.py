@@ -0,0 +1,205 @@
+"""
+Pipeline Metrics
+Counters, gauges and histograms for the EDI pipeline
+
+Services record events in-process as they happen: record_ingest,
+record_parse, record_send, record_ack and record_sftp_poll. Folder depths,
+the oldest outbox item and the last SFTP polls are read with two small
+queries at most every METRICS_REFRESH_SECONDS, when the metrics or the
+system status are requested, so monitoring does not run the analytics
+queries.
+"""
+
+import time
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .metrics import registry
+
+
+DEFAULT_REFRESH_SECONDS = 15
+
+# Outbox items older than this count as stuck
+STUCK_AFTER = timedelta(hours=24)
+
+# A poller is stale after missing this many of its intervals
+SFTP_STALE_INTERVALS = 3
+
+# api_services is 'degraded' above this share of 5xx responses
+API_ERROR_RATE_THRESHOLD = 0.05
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ACK_LATENCY_BUCKETS = (60, 300, 900, 1800, 3600, 7200, 14400, 43200, 86400, 172800, 604800)
+
+INGEST_FILES = registry.counter('edi_ingest_files_total', 'Files received', ['folder'])
+INGEST_BYTES = registry.counter('edi_ingest_bytes_total', 'Bytes received', ['folder'])
+PARSE_ERRORS = registry.counter('edi_parse_errors_total', 'Files whose envelope could not be parsed', ['format'])
+SENDS = registry.counter('edi_sends_total', 'Send attempts', ['result'])
+ACKS = registry.counter('edi_acks_total', 'Acknowledgments applied', ['status'])
+
+FOLDER_DEPTH = registry.gauge('edi_folder_depth', 'Transactions per folder', ['folder'])
+OUTBOX_OLDEST_AGE = registry.gauge('edi_outbox_oldest_age_seconds', 'Age of the oldest outbox transaction')
+OUTBOX_STUCK = registry.gauge('edi_outbox_stuck', 'Outbox transactions older than 24 hours')
+SFTP_LAST_POLL = registry.gauge(
+    'edi_sftp_last_poll_timestamp_seconds', 'Unix time of the last SFTP poll', ['partner']
+)
+
+PARSE_SECONDS = registry.histogram('edi_parse_seconds', 'Envelope parse time', ['format'], buckets=LATENCY_BUCKETS)
+SEND_SECONDS = registry.histogram('edi_send_seconds', 'Time to hand a transaction to Bots', ['result'], buckets=LATENCY_BUCKETS)
+ACK_LATENCY = registry.histogram(
+    'edi_ack_latency_seconds', 'Time from send to acknowledgment', ['status'], buckets=ACK_LATENCY_BUCKETS
+)
+ACK_APPLY_LAG = registry.histogram(
+    'edi_ack_apply_lag_seconds', 'Time from bots receiving an acknowledgment to applying it', buckets=LATENCY_BUCKETS
+)
+
+
+def _timestamp(value):
+    if timezone.is_naive(value):
+        return time.mktime(value.timetuple()) + value.microsecond / 1e6
+    return value.timestamp()
+
+
+def record_ingest(folder, size):
+    """Count a received file"""
+    INGEST_FILES.inc(folder=folder)
+    INGEST_BYTES.inc(size, folder=folder)
+
+
+def record_parse(format_type, seconds, metadata):
+    """Time an envelope parse; metadata with a parse_error counts as an error"""
+    format_type = format_type or 'UNKNOWN'
+    PARSE_SECONDS.observe(seconds, format=format_type)
+    if metadata.get('parse_error'):
+        PARSE_ERRORS.inc(format=format_type)
+
+
+def record_send(result, seconds):
+    """Count a send ('sent' or 'failed') and its duration"""
+    SENDS.inc(result=result)
+    SEND_SECONDS.observe(seconds, result=result)
+
+
+def record_ack(status, sent_at=None, acknowledged_at=None):
+    """Count an applied acknowledgment, its latency from the send and how long it waited to be applied"""
+    ACKS.inc(status=status)
+    if sent_at and acknowledged_at:
+        ACK_LATENCY.observe(max(0.0, (acknowledged_at - sent_at).total_seconds()), status=status)
+    if acknowledged_at:
+        ACK_APPLY_LAG.observe(max(0.0, (timezone.now() - acknowledged_at).total_seconds()))
+
+
+def record_sftp_poll(sftp_config, when=None):
+    """
+    Store the time of an SFTP poll
+    
+    Kept on PartnerSFTPConfig.last_poll_at, so the poller may run in another
+    process than the one serving the metrics.
+    """
+    from .partner_models import PartnerSFTPConfig
+    
+    when = when or timezone.now()
+    PartnerSFTPConfig.objects.filter(pk=sftp_config.pk).update(last_poll_at=when)
+    sftp_config.last_poll_at = when
+    SFTP_LAST_POLL.set(_timestamp(when), partner=sftp_config.partner.name)
+
+
+class PipelineSnapshot:
+    """Folder and poller state from the database, refreshed at most every few seconds"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refreshed = 0
+        self._data = None
+    
+    def get(self, force=False):
+        """
+        Current snapshot, re-read when older than METRICS_REFRESH_SECONDS
+        
+        Returns:
+            dict: depths, oldest_outbox, stuck, recent, sftp_polls, sftp_polling
+        """
+        interval = getattr(settings, 'METRICS_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS)
+        with self._lock:
+            if force or self._data is None or time.monotonic() - self._refreshed >= interval:
+                self._data = self._read()
+                self._refreshed = time.monotonic()
+                self._publish(self._data)
+            return self._data
+    
+    def _read(self):
+        from .modern_edi_models import EDITransaction
+        from .partner_models import PartnerSFTPConfig
+        
+        now = timezone.now()
+        folders = EDITransaction.objects.values('folder').annotate(
+            count=Count('id'),
+            oldest=Min('created_at'),
+            stuck=Count('id', filter=Q(created_at__lt=now - STUCK_AFTER)),
+            recent=Count('id', filter=Q(created_at__gte=now - timedelta(hours=1)))
+        ).order_by()
+        
+        data = {'depths': {}, 'oldest_outbox': None, 'stuck': 0, 'recent': 0, 'sftp_polls': {}}
+        for row in folders:
+            data['depths'][row['folder']] = row['count']
+            data['recent'] += row['recent']
+            if row['folder'] == 'outbox':
+                data['oldest_outbox'] = row['oldest']
+                data['stuck'] = row['stuck']
+        
+        pollers = PartnerSFTPConfig.objects.filter(is_active=True, poll_enabled=True).values_list(
+            'partner__name', 'poll_interval', 'last_poll_at'
+        )
+        data['sftp_polls'] = {name: (interval, last_poll) for name, interval, last_poll in pollers}
+        data['sftp_polling'] = self._polling_status(data['sftp_polls'], now)
+        return data
+    
+    @staticmethod
+    def _polling_status(polls, now):
+        if not polls:
+            return 'not_configured'
+        # Only pollers that call record_sftp_poll have a last_poll_at to judge
+        polled = [(interval, last_poll) for interval, last_poll in polls.values() if last_poll is not None]
+        if not polled:
+            return 'unknown'
+        for interval, last_poll in polled:
+            if now - last_poll > timedelta(seconds=interval * SFTP_STALE_INTERVALS):
+                return 'stale'
+        return 'healthy'
+    
+    @staticmethod
+    def _publish(data):
+        FOLDER_DEPTH.clear()
+        for folder, count in data['depths'].items():
+            FOLDER_DEPTH.set(count, folder=folder)
+        oldest = data['oldest_outbox']
+        OUTBOX_OLDEST_AGE.set((timezone.now() - oldest).total_seconds() if oldest else 0)
+        OUTBOX_STUCK.set(data['stuck'])
+        SFTP_LAST_POLL.clear()
+        for partner, (_, last_poll) in data['sftp_polls'].items():
+            if last_poll:
+                SFTP_LAST_POLL.set(_timestamp(last_poll), partner=partner)
+
+
+snapshot = PipelineSnapshot()
+
+
+def api_status():
+    """
+    'healthy', 'degraded' or 'unknown', from the 5xx share of requests this
+    process has served (needs ProfilingMiddleware)
+    """
+    from .request_profiler import REQUESTS
+    
+    total = errors = 0
+    for (view, method, status), count in REQUESTS.samples().items():
+        total += count
+        if status.startswith('5'):
+            errors += count
+    if not total:
+        return 'unknown'
+    return 'degraded' if errors / total > API_ERROR_RATE_THRESHOLD else 'healthy'
@@ -0,0 +1,260 @@
+"""
+Rate Limiter
+Sliding-window request limits shared by all worker processes
+
+Requests are counted per fixed window with an atomic increment in a store
+that every process sees. The count of the previous window is added with the
+weight of the part that still overlaps the last `period` seconds, the usual
+sliding-window estimate. Rejected requests are counted too.
+
+The store is chosen by settings.RATE_LIMIT_STORE:
+
+    cache   the Django cache RATE_LIMIT_CACHE; use Redis or Memcached when
+            several worker processes or hosts serve the API
+    sqlite  a SQLite file (RATE_LIMIT_SQLITE_PATH) shared by the processes
+            of one host; increments run under its write lock
+    auto    cache, unless that cache is process-local (LocMem, Dummy); then sqlite
+"""
+
+import os
+import math
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+
+DEFAULT_STORE = 'auto'
+DEFAULT_CACHE = 'default'
+SQLITE_TIMEOUT = 5
+
+# Expired SQLite counters are deleted at most this often per process
+SQLITE_PRUNE_INTERVAL = 300
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'retry_after', 'count'])
+RateLimitResult.__doc__ = """
+Outcome of a rate limit check
+
+allowed: whether the request may proceed; remaining: requests left in the
+sliding window; retry_after: seconds until the next request is allowed (0
+when allowed); count: requests in the current fixed window
+"""
+
+
+def parse_rate(rate):
+    """
+    Parse a rate
+    
+    Args:
+        rate: 'count/period' with period s, m, h or d (optionally with a
+            multiplier, '100/5m'), or a (count, seconds) tuple
+    
+    Returns:
+        tuple: (count, seconds)
+    
+    Raises:
+        ImproperlyConfigured: If the rate is malformed
+    """
+    try:
+        if isinstance(rate, (tuple, list)):
+            count, seconds = rate
+        else:
+            count, period = str(rate).replace(' ', '').split('/')
+            multiplier, unit = period[:-1] or '1', period[-1].lower()
+            seconds = int(multiplier) * PERIODS[unit]
+        count, seconds = int(count), int(seconds)
+    except (TypeError, ValueError, KeyError, IndexError):
+        raise ImproperlyConfigured(f"Invalid rate '{rate}', expected e.g. '60/m'")
+    if count < 0 or seconds <= 0:
+        raise ImproperlyConfigured(f"Invalid rate '{rate}'")
+    return count, seconds
+
+
+class CacheCounterStore:
+    """Counters in a Django cache"""
+    
+    def __init__(self, alias=DEFAULT_CACHE):
+        self.cache = caches[alias]
+    
+    def incr(self, key, ttl):
+        """Atomically add one to a counter and return the new value"""
+        self.cache.add(key, 0, ttl)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Evicted between add and incr
+            self.cache.set(key, 1, ttl)
+            return 1
+    
+    def get_many(self, keys):
+        """Current values of counters, missing ones left out"""
+        return self.cache.get_many(keys)
+
+
+class SQLiteCounterStore:
+    """
+    Counters in a SQLite file, for hosts without a shared cache server
+    
+    Each thread uses its own connection. An increment is one short
+    BEGIN IMMEDIATE transaction, so increments from all processes on the
+    host are serialised by SQLite's file lock.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._last_prune = 0
+    
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rate_counter ('
+            'key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires REAL NOT NULL)'
+        )
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+    
+    def incr(self, key, ttl):
+        """Atomically add one to a counter and return the new value"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO rate_counter (key, count, expires) VALUES (?, 1, ?) '
+                'ON CONFLICT(key) DO UPDATE SET '
+                'count = CASE WHEN expires < ? THEN 1 ELSE count + 1 END, '
+                'expires = CASE WHEN expires < ? THEN excluded.expires ELSE expires END',
+                (key, now + ttl, now, now)
+            )
+            count = conn.execute('SELECT count FROM rate_counter WHERE key = ?', (key,)).fetchone()[0]
+            if now - self._last_prune > SQLITE_PRUNE_INTERVAL:
+                self._last_prune = now
+                conn.execute('DELETE FROM rate_counter WHERE expires < ?', (now,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return count
+    
+    def get_many(self, keys):
+        """Current values of counters, missing ones left out"""
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._connection().execute(
+            f'SELECT key, count FROM rate_counter WHERE key IN ({placeholders}) AND expires >= ?',
+            (*keys, time.time())
+        )
+        return dict(rows.fetchall())
+
+
+class RateLimiter:
+    """
+    Sliding-window limiter over a counter store
+    
+    Args:
+        store: CacheCounterStore or SQLiteCounterStore
+    """
+    
+    def __init__(self, store):
+        self.store = store
+    
+    def hit(self, key, rate, now=None):
+        """
+        Count a request and check it against the rate
+        
+        Args:
+            key: What is limited, e.g. 'user:42:export'
+            rate: See parse_rate()
+            now: Timestamp (for tests)
+        
+        Returns:
+            RateLimitResult
+        """
+        limit, period = parse_rate(rate)
+        now = time.time() if now is None else now
+        current_key, previous_key = self._keys(key, period, now)
+        count = self.store.incr(current_key, period * 2)
+        previous = self.store.get_many([previous_key]).get(previous_key, 0)
+        return self._result(limit, period, now, count, previous)
+    
+    @staticmethod
+    def _keys(key, period, now):
+        window = int(now // period)
+        return f'ratelimit:{key}:{period}:{window}', f'ratelimit:{key}:{period}:{window - 1}'
+    
+    @staticmethod
+    def _result(limit, period, now, count, previous):
+        # count includes the request being checked
+        elapsed = (now % period) / period
+        usage = count + previous * (1 - elapsed)
+        if usage <= limit:
+            return RateLimitResult(True, limit, int(limit - usage), 0, count)
+        
+        # When would a further request (count + 1) fit?
+        following = count + 1
+        if following <= limit and previous:
+            # Once enough of the previous window has slid out
+            wait = period * (1 - (limit - following) / previous - elapsed)
+        else:
+            # In the next window, once enough of this one has slid out
+            wait = period * (1 - elapsed) + period * (1 - (limit - 1) / max(count, 1))
+        return RateLimitResult(False, limit, 0, max(1, math.ceil(wait)), count)
+
+
+def get_sqlite_path():
+    """Counter file for the sqlite store (settings.RATE_LIMIT_SQLITE_PATH)"""
+    path = getattr(settings, 'RATE_LIMIT_SQLITE_PATH', None)
+    if path:
+        return path
+    return os.path.join(getattr(settings, 'BOTSSYS', 'botssys'), 'ratelimit.sqlite3')
+
+
+def create_store():
+    """Counter store configured by settings.RATE_LIMIT_STORE"""
+    kind = getattr(settings, 'RATE_LIMIT_STORE', DEFAULT_STORE)
+    alias = getattr(settings, 'RATE_LIMIT_CACHE', DEFAULT_CACHE)
+    if kind == 'auto':
+        backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+        kind = 'sqlite' if backend in PROCESS_LOCAL_CACHES else 'cache'
+    
+    if kind == 'cache':
+        return CacheCounterStore(alias)
+    if kind == 'sqlite':
+        return SQLiteCounterStore(get_sqlite_path())
+    raise ImproperlyConfigured("RATE_LIMIT_STORE must be 'auto', 'cache' or 'sqlite'")
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Shared RateLimiter for this process"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(create_store())
+    return _limiter
@@ -0,0 +1,172 @@
+"""
+Request Profiler
+Per-request timing, query and cache counts for ProfilingMiddleware
+
+While a request is profiled, every SQL statement passes through a
+connection.execute_wrapper that counts and times it, and cached lookups
+(APIKey.get_cached, PartnerUser.get_cached) report hits and misses through
+record_cache_lookup(). The totals go into histograms per URL name in the
+metrics registry. Requests slower than PROFILING_SLOW_REQUEST_MS are kept,
+with their SQL when sampled (PROFILING_SLOW_SAMPLE_RATE), in a small ring
+buffer for /api/v1/admin/metrics/slow-requests.
+"""
+
+import time
+import random
+import threading
+from collections import deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .metrics import registry
+
+
+DEFAULT_SLOW_REQUEST_MS = 1000
+DEFAULT_SLOW_SAMPLE_RATE = 1.0
+DEFAULT_SLOW_LOG_SIZE = 50
+
+# SQL statements kept per sampled request
+MAX_SAMPLED_QUERIES = 200
+MAX_SQL_LENGTH = 2000
+
+UNRESOLVED_VIEW = '<unresolved>'
+METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+REQUEST_SECONDS = registry.histogram(
+    'edi_http_request_duration_seconds', 'Wall time of requests', ['view', 'method']
+)
+REQUESTS = registry.counter(
+    'edi_http_requests_total', 'Requests by response status', ['view', 'method', 'status']
+)
+DB_QUERIES = registry.histogram(
+    'edi_http_request_db_queries', 'Database queries per request', ['view'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+DB_SECONDS = registry.histogram(
+    'edi_http_request_db_seconds', 'Database time per request', ['view']
+)
+RESPONSE_BYTES = registry.histogram(
+    'edi_http_response_bytes', 'Response body size', ['view'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+)
+CACHE_LOOKUPS = registry.counter(
+    'edi_cache_lookups_total', 'Cached lookups by outcome', ['view', 'cache', 'result']
+)
+
+_current = ContextVar('edi_request_profile', default=None)
+
+
+def record_cache_lookup(cache_name, hit):
+    """Count a cached lookup for the request being profiled (no-op outside one)"""
+    profile = _current.get()
+    if profile is not None:
+        profile.cache_lookups.append((cache_name, 'hit' if hit else 'miss'))
+
+
+class RequestProfile:
+    """
+    Measurements of one request
+    
+    May be entered again, e.g. while a streamed body is sent; the counts add
+    up and elapsed runs from creation to the last exit.
+    
+    Args:
+        collect_sql: Keep the SQL of each statement (for slow request samples)
+    """
+    
+    def __init__(self, collect_sql=False):
+        self.collect_sql = collect_sql
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.sql = []
+        self.cache_lookups = []
+        self._token = None
+    
+    def __enter__(self):
+        self._token = _current.set(self)
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self._execute))
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        _current.reset(self._token)
+        self.elapsed = time.perf_counter() - self.started
+        return False
+    
+    def _execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += duration
+            if self.collect_sql and len(self.sql) < MAX_SAMPLED_QUERIES:
+                self.sql.append({'sql': sql[:MAX_SQL_LENGTH], 'ms': round(duration * 1000, 2), 'many': many})
+    
+    def record(self, view, method, status, size):
+        """Add this request to the metrics"""
+        REQUEST_SECONDS.observe(self.elapsed, view=view, method=method)
+        REQUESTS.inc(view=view, method=method, status=status)
+        DB_QUERIES.observe(self.queries, view=view)
+        DB_SECONDS.observe(self.db_seconds, view=view)
+        if size is not None:
+            RESPONSE_BYTES.observe(size, view=view)
+        for cache_name, result in self.cache_lookups:
+            CACHE_LOOKUPS.inc(view=view, cache=cache_name, result=result)
+
+
+class SlowRequestLog:
+    """Most recent slow requests of this process"""
+    
+    def __init__(self):
+        self._entries = deque(maxlen=getattr(settings, 'PROFILING_SLOW_LOG_SIZE', DEFAULT_SLOW_LOG_SIZE))
+        self._lock = threading.Lock()
+    
+    def add(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+    
+    def entries(self):
+        """Logged requests, newest first"""
+        with self._lock:
+            return list(reversed(self._entries))
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_requests = SlowRequestLog()
+
+
+def should_sample():
+    """Whether to keep the SQL of this request in case it turns out slow"""
+    rate = getattr(settings, 'PROFILING_SLOW_SAMPLE_RATE', DEFAULT_SLOW_SAMPLE_RATE)
+    return rate >= 1 or random.random() < rate
+
+
+def log_if_slow(profile, request, view, status, size):
+    """Add the request to slow_requests when it took longer than PROFILING_SLOW_REQUEST_MS"""
+    elapsed_ms = profile.elapsed * 1000
+    if elapsed_ms < getattr(settings, 'PROFILING_SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS):
+        return
+    slow_requests.add({
+        'time': timezone.now().isoformat(),
+        'method': request.method,
+        'path': request.path,
+        'view': view,
+        'status': status,
+        'duration_ms': round(elapsed_ms, 1),
+        'db_queries': profile.queries,
+        'db_ms': round(profile.db_seconds * 1000, 1),
+        'bytes': size,
+        'sql': profile.sql if profile.collect_sql else None,
+    })
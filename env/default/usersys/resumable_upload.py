@@ -0,0 +1,322 @@
+"""
+Resumable Upload
+Offset-based chunked uploads for the partner portal
+
+A session is opened with the declared file size. Each PATCH then carries one
+chunk for the current offset (tus-style Upload-Offset and Upload-Checksum
+headers). The chunk is streamed to its own file, verified, and appended to
+the partial upload under a short row lock, so a dropped connection only
+costs the chunk in flight and no request lives longer than one chunk
+transfer. When the last byte arrives the file is moved into an
+EDITransaction through TransactionManager.ingest_local_file. If that does not
+finish (worker killed, timeout), an empty PATCH at the full offset retries it.
+"""
+
+import os
+import uuid
+import base64
+import hashlib
+import shutil
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .partner_models import UploadSession
+from .transaction_manager import TransactionManager
+from .upload_ingest import staging_path
+
+
+DEFAULT_MAX_SIZE = 2 * 1024 * 1024 * 1024
+DEFAULT_TTL_HOURS = 24
+RECOMMENDED_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadGone(Exception):
+    """Session completed, aborted or expired"""
+    pass
+
+
+class UploadOffsetMismatch(Exception):
+    """Chunk offset does not match the bytes stored so far"""
+    
+    def __init__(self, offset):
+        super().__init__(f"Upload offset is {offset}")
+        self.offset = offset
+
+
+class ChecksumMismatch(ValueError):
+    """Chunk data does not match its Upload-Checksum"""
+    pass
+
+
+def get_upload_dir():
+    """Directory holding partial uploads"""
+    botssys_dir = getattr(settings, 'BOTSSYS', 'botssys')
+    return os.path.join(botssys_dir, 'modern-edi', 'uploads')
+
+
+def get_max_size():
+    """Largest resumable upload in bytes (settings.RESUMABLE_UPLOAD_MAX_SIZE)"""
+    return getattr(settings, 'RESUMABLE_UPLOAD_MAX_SIZE', DEFAULT_MAX_SIZE)
+
+
+def get_ttl():
+    """Idle time after which an unfinished upload expires"""
+    return timedelta(hours=getattr(settings, 'RESUMABLE_UPLOAD_TTL_HOURS', DEFAULT_TTL_HOURS))
+
+
+def parse_checksum(header):
+    """
+    Parse an Upload-Checksum header
+    
+    Args:
+        header: 'sha256 <base64 digest>' or empty
+    
+    Returns:
+        bytes or None: Expected SHA-256 digest
+    
+    Raises:
+        ValidationError: For another algorithm or a malformed value
+    """
+    if not header:
+        return None
+    try:
+        algorithm, value = header.strip().split(' ', 1)
+        digest = base64.b64decode(value.strip(), validate=True)
+    except ValueError:
+        raise ValidationError("Malformed Upload-Checksum header")
+    if algorithm.lower() != 'sha256' or len(digest) != 32:
+        raise ValidationError("Upload-Checksum must be 'sha256 <base64>'")
+    return digest
+
+
+class ResumableUploadService:
+    """Create, append to, commit and expire resumable uploads"""
+    
+    @staticmethod
+    def part_path(session):
+        """Path of the partial file for a session"""
+        return os.path.join(get_upload_dir(), f'{session.id}.part')
+    
+    @staticmethod
+    def staged_path(session):
+        """Staging path a session's file is moved to while it is committed"""
+        return staging_path(os.path.dirname(get_upload_dir()), session.id.hex)
+    
+    @staticmethod
+    def create(partner_user, filename, total_size, document_type='', po_number=''):
+        """
+        Open an upload session
+        
+        Args:
+            partner_user: PartnerUser uploading the file
+            filename: Original file name
+            total_size: Size of the complete file in bytes
+            document_type: Optional document type
+            po_number: Optional PO number
+        
+        Returns:
+            UploadSession instance
+        
+        Raises:
+            ValidationError: If the size is missing or too large
+        """
+        max_size = get_max_size()
+        if total_size <= 0:
+            raise ValidationError("Upload size must be positive")
+        if total_size > max_size:
+            raise ValidationError(f"File too large (max {max_size // (1024 * 1024)} MB)")
+        
+        session = UploadSession.objects.create(
+            partner=partner_user.partner,
+            partner_user=partner_user,
+            filename=os.path.basename(filename),
+            document_type=document_type or '',
+            po_number=po_number or '',
+            total_size=total_size,
+            expires_at=timezone.now() + get_ttl()
+        )
+        
+        os.makedirs(get_upload_dir(), exist_ok=True)
+        open(ResumableUploadService.part_path(session), 'wb').close()
+        return session
+    
+    @staticmethod
+    def get(session_id, partner):
+        """
+        Get a partner's upload session
+        
+        Raises:
+            UploadSession.DoesNotExist: If the session does not belong to the partner
+        """
+        return UploadSession.objects.get(id=session_id, partner=partner)
+    
+    @staticmethod
+    def append(session_id, partner, offset, stream, length, checksum=None):
+        """
+        Append one chunk at offset
+        
+        A chunk of length 0 at the full offset commits an upload whose last
+        chunk was stored but not committed.
+        
+        Args:
+            session_id: UploadSession id
+            partner: Partner owning the session
+            offset: Upload-Offset sent by the client
+            stream: File-like request body
+            length: Content-Length of the chunk
+            checksum: Expected SHA-256 digest (bytes) or None
+        
+        Returns:
+            UploadSession instance (completed when this was the last chunk)
+        
+        Raises:
+            UploadGone, UploadOffsetMismatch, ChecksumMismatch, ValidationError;
+            any error creating the transaction (e.g. DuplicateInterchange)
+            aborts the upload
+        """
+        session = ResumableUploadService.get(session_id, partner)
+        if session.status != 'active' or session.is_expired():
+            raise UploadGone(f"Upload is {'expired' if session.is_expired() else session.status}")
+        if offset != session.offset:
+            raise UploadOffsetMismatch(session.offset)
+        if length == 0 and offset == session.total_size:
+            return ResumableUploadService._finish(session)
+        if length <= 0 or length > MAX_CHUNK_SIZE:
+            raise ValidationError(f"Chunk size must be between 1 and {MAX_CHUNK_SIZE} bytes")
+        if offset + length > session.total_size:
+            raise ValidationError("Chunk extends past the declared upload size")
+        
+        # Receive the chunk into its own file, outside any lock
+        chunk_path = f'{ResumableUploadService.part_path(session)}.{offset}.{uuid.uuid4().hex}.chunk'
+        digest = hashlib.sha256()
+        received = 0
+        try:
+            with open(chunk_path, 'wb') as chunk_file:
+                while received < length:
+                    block = stream.read(min(READ_BLOCK_SIZE, length - received))
+                    if not block:
+                        break
+                    chunk_file.write(block)
+                    digest.update(block)
+                    received += len(block)
+            
+            if received < length:
+                raise ValidationError("Chunk incomplete, resend from the current offset")
+            if checksum is not None and digest.digest() != checksum:
+                raise ChecksumMismatch("Chunk checksum mismatch")
+            
+            # Append under the row lock so concurrent retries cannot interleave
+            with transaction.atomic():
+                session = UploadSession.objects.select_for_update().get(pk=session.pk)
+                if session.status != 'active':
+                    raise UploadGone(f"Upload is {session.status}")
+                if session.offset != offset:
+                    raise UploadOffsetMismatch(session.offset)
+                
+                with open(ResumableUploadService.part_path(session), 'r+b') as part_file, \
+                        open(chunk_path, 'rb') as chunk_file:
+                    part_file.seek(offset)
+                    part_file.truncate()
+                    shutil.copyfileobj(chunk_file, part_file, READ_BLOCK_SIZE)
+                
+                session.offset = offset + received
+                session.expires_at = timezone.now() + get_ttl()
+                session.save(update_fields=['offset', 'expires_at', 'updated_at'])
+        finally:
+            if os.path.exists(chunk_path):
+                os.remove(chunk_path)
+        
+        if session.offset == session.total_size:
+            session = ResumableUploadService._finish(session)
+        return session
+    
+    @staticmethod
+    def _finish(session):
+        try:
+            return ResumableUploadService.commit(session)
+        except Exception:
+            # The ingest has consumed the part file, so the session
+            # cannot be committed again
+            ResumableUploadService.abort(session)
+            raise
+    
+    @staticmethod
+    @transaction.atomic
+    def commit(session):
+        """
+        Turn a complete upload into an inbox EDITransaction
+        
+        Returns:
+            UploadSession instance with its transaction set
+        """
+        session = UploadSession.objects.select_for_update().select_related('partner', 'partner_user').get(pk=session.pk)
+        if session.status != 'active':
+            return session
+        
+        part = ResumableUploadService.part_path(session)
+        staged = ResumableUploadService.staged_path(session)
+        if not os.path.exists(part) and os.path.exists(staged):
+            # An earlier commit was interrupted after staging the file
+            os.replace(staged, part)
+        
+        partner = session.partner
+        txn = TransactionManager().ingest_local_file(
+            'inbox',
+            part,
+            {
+                'partner_name': partner.name,
+                'partner_id': str(partner.id),
+                'document_type': session.document_type,
+                'po_number': session.po_number,
+                'filename': session.filename,
+                'metadata': {
+                    'uploaded_by': session.partner_user.username if session.partner_user else None,
+                    'upload_session': str(session.id),
+                },
+            },
+            staged=staged
+        )
+        
+        session.status = 'completed'
+        session.transaction = txn
+        session.save(update_fields=['status', 'transaction', 'updated_at'])
+        return session
+    
+    @staticmethod
+    def abort(session):
+        """Cancel an unfinished upload and remove its data"""
+        if session.status == 'active':
+            session.status = 'aborted'
+            session.save(update_fields=['status', 'updated_at'])
+        ResumableUploadService._remove_part(session)
+    
+    @staticmethod
+    def expire(now=None):
+        """
+        Remove the data of abandoned uploads
+        
+        Returns:
+            int: Number of sessions expired
+        """
+        now = now or timezone.now()
+        expired = UploadSession.objects.filter(status='active', expires_at__lt=now)
+        
+        count = 0
+        for session in expired.iterator():
+            # Re-check per row: a chunk may have extended the session meanwhile
+            if UploadSession.objects.filter(pk=session.pk, status='active', expires_at__lt=now).update(status='expired'):
+                ResumableUploadService._remove_part(session)
+                count += 1
+        return count
+    
+    @staticmethod
+    def _remove_part(session):
+        for path in (ResumableUploadService.part_path(session), ResumableUploadService.staged_path(session)):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,374 @@
+"""
+Transaction Search Index
+Full-text search over EDI transactions and bots ta records
+
+SQLite uses FTS5 virtual tables and PostgreSQL uses tsvector columns with
+GIN indexes. On any other backend, or when FTS5 is not compiled in, the
+index reports itself unavailable and callers fall back to icontains.
+"""
+
+import re
+import logging
+from datetime import timedelta
+
+from django.db import connection, connections, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from django.db.models.expressions import RawSQL
+
+from .modern_edi_models import EDITransaction, ProcessingCheckpoint
+
+
+logger = logging.getLogger('modern_edi.search')
+
+EDI_SEARCH_TABLE = 'usersys_edi_search'
+TA_SEARCH_TABLE = 'usersys_ta_search'
+
+# Parsed metadata keys that are worth searching on
+METADATA_SEARCH_FIELDS = (
+    'buyer_name',
+    'seller_name',
+    'supplier_name',
+    'ship_to_name',
+    'delivery_name',
+    'document_number',
+    'po_number',
+)
+
+TA_SEARCH_FIELDS = ('filename', 'frompartner', 'topartner', 'reference')
+
+TA_BATCH_SIZE = 1000
+TA_CHECKPOINT_NAME = 'ta_search_index'
+
+# ta rows a crashed bots run left open are indexed as they are after this long
+TA_OPEN_GRACE = timedelta(hours=12)
+
+_available = {}
+
+
+def create_search_tables(schema_editor):
+    """
+    Create the search tables for the current database backend
+    
+    Called from the usersys migration. Does nothing on unsupported backends.
+    """
+    vendor = schema_editor.connection.vendor
+    
+    if vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                logger.warning("SQLite built without FTS5, transaction search index disabled")
+                return
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {EDI_SEARCH_TABLE} "
+            "USING fts5(transaction_id UNINDEXED, body, tokenize='unicode61')"
+        )
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TA_SEARCH_TABLE} "
+            "USING fts5(idta UNINDEXED, body, tokenize='unicode61')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {EDI_SEARCH_TABLE} ("
+            "transaction_id uuid PRIMARY KEY REFERENCES usersys_editransaction (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {EDI_SEARCH_TABLE}_doc_idx "
+            f"ON {EDI_SEARCH_TABLE} USING GIN (document)"
+        )
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TA_SEARCH_TABLE} ("
+            "idta integer PRIMARY KEY, document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TA_SEARCH_TABLE}_doc_idx "
+            f"ON {TA_SEARCH_TABLE} USING GIN (document)"
+        )
+
+
+def drop_search_tables(schema_editor):
+    """Drop the search tables (migration reverse)"""
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {EDI_SEARCH_TABLE}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TA_SEARCH_TABLE}")
+
+
+def is_available(using='default'):
+    """Check whether the search tables exist on this database"""
+    if using not in _available:
+        conn = connections[using]
+        _available[using] = (
+            conn.vendor in ('sqlite', 'postgresql')
+            and EDI_SEARCH_TABLE in conn.introspection.table_names()
+        )
+    return _available[using]
+
+
+def _terms(text):
+    """Split free text into search terms"""
+    return re.findall(r'\w+', text or '')
+
+
+def build_match_query(text, vendor):
+    """
+    Turn user input into a prefix-matching full-text query
+    
+    Every term must match (AND), and each term matches as a prefix so
+    partial PO numbers and partner names still hit.
+    
+    Returns:
+        str or None: Backend query string, or None when there are no terms
+    """
+    terms = _terms(text)
+    if not terms:
+        return None
+    if vendor == 'postgresql':
+        return ' & '.join(f"{term.lower()}:*" for term in terms)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+class TransactionSearchIndex:
+    """Keeps the EDITransaction full-text index in sync and queries it"""
+    
+    @staticmethod
+    def document(txn):
+        """
+        Build the indexed text for a transaction
+        
+        Args:
+            txn: EDITransaction instance
+        
+        Returns:
+            str: Space separated searchable values
+        """
+        values = [txn.partner_name, txn.partner_id, txn.po_number, txn.filename, txn.document_type]
+        metadata = txn.metadata if isinstance(txn.metadata, dict) else {}
+        values.extend(metadata.get(key) for key in METADATA_SEARCH_FIELDS)
+        return ' '.join(str(value) for value in values if value)
+    
+    @staticmethod
+    def index(txn):
+        """
+        Add or replace a transaction in the index
+        
+        Args:
+            txn: EDITransaction instance
+        """
+        if not is_available():
+            return
+        
+        pk = EDITransaction._meta.pk.get_db_prep_value(txn.pk, connection)
+        body = TransactionSearchIndex.document(txn)
+        
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"INSERT INTO {EDI_SEARCH_TABLE} (transaction_id, document) "
+                    "VALUES (%s, to_tsvector('simple', %s)) "
+                    "ON CONFLICT (transaction_id) DO UPDATE SET document = EXCLUDED.document",
+                    [pk, body]
+                )
+            else:
+                cursor.execute(f"DELETE FROM {EDI_SEARCH_TABLE} WHERE transaction_id = %s", [pk])
+                cursor.execute(
+                    f"INSERT INTO {EDI_SEARCH_TABLE} (transaction_id, body) VALUES (%s, %s)",
+                    [pk, body]
+                )
+    
+    @staticmethod
+    def remove(transaction_id):
+        """
+        Remove a transaction from the index
+        
+        Args:
+            transaction_id: UUID of the transaction
+        """
+        if not is_available():
+            return
+        
+        pk = EDITransaction._meta.pk.get_db_prep_value(transaction_id, connection)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {EDI_SEARCH_TABLE} WHERE transaction_id = %s", [pk])
+    
+    @staticmethod
+    def rebuild(batch_size=1000):
+        """
+        Re-index every transaction
+        
+        Returns:
+            int: Number of transactions indexed
+        """
+        if not is_available():
+            return 0
+        
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {EDI_SEARCH_TABLE}")
+        
+        count = 0
+        fields = ('id', 'partner_name', 'partner_id', 'po_number', 'filename', 'document_type', 'metadata')
+        for txn in EDITransaction.objects.only(*fields).iterator(chunk_size=batch_size):
+            TransactionSearchIndex.index(txn)
+            count += 1
+        return count
+    
+    @staticmethod
+    def filter(queryset, text):
+        """
+        Restrict a queryset to transactions matching the search text
+        
+        Args:
+            queryset: EDITransaction queryset
+            text: User search input
+        
+        Returns:
+            Filtered queryset, or None when the index cannot serve the query
+        """
+        if not is_available(queryset.db):
+            return None
+        
+        vendor = connections[queryset.db].vendor
+        match = build_match_query(text, vendor)
+        if match is None:
+            return queryset
+        
+        if vendor == 'postgresql':
+            sql = (f"SELECT transaction_id FROM {EDI_SEARCH_TABLE} "
+                   "WHERE document @@ to_tsquery('simple', %s)")
+        else:
+            sql = (f"SELECT transaction_id FROM {EDI_SEARCH_TABLE} "
+                   f"WHERE {EDI_SEARCH_TABLE} MATCH %s")
+        return queryset.filter(id__in=RawSQL(sql, [match]))
+
+
+class TASearchIndex:
+    """
+    Full-text index over the bots ta table
+    
+    The bots engine writes ta rows directly and fills in their partners and
+    reference as a run proceeds, so this index is filled incrementally up to
+    the first row still open (see the update_search_index command). The
+    idta high-water mark is kept in ProcessingCheckpoint; rows above it are
+    matched with icontains so results never lag behind the engine. On SQLite
+    the FTS5 rowid is the idta, so re-indexing a range is a rowid range scan.
+    """
+    
+    @staticmethod
+    def high_water_mark():
+        """Highest idta covered by the index"""
+        position = ProcessingCheckpoint.objects.filter(name=TA_CHECKPOINT_NAME).values_list('position', flat=True)
+        return int(position.first() or 0)
+    
+    @staticmethod
+    def update(batch_size=TA_BATCH_SIZE):
+        """
+        Index ta rows finished since the last run
+        
+        Stops below the first ta row whose run is still going (statust OPEN),
+        so rows are indexed once their values are final.
+        
+        Returns:
+            int: Number of ta rows indexed
+        """
+        if not is_available():
+            return 0
+        
+        from bots.models import ta
+        from bots.botsconfig import OPEN
+        
+        last_idta = TASearchIndex.high_water_mark()
+        first_open = ta.objects.filter(
+            idta__gt=last_idta, statust=OPEN, ts__gte=timezone.now() - TA_OPEN_GRACE
+        ).aggregate(first=Min('idta'))['first']
+        if first_open is not None:
+            top = first_open - 1
+        else:
+            top = ta.objects.aggregate(top=Max('idta'))['top'] or 0
+        
+        count = 0
+        while True:
+            with transaction.atomic():
+                checkpoint = ProcessingCheckpoint.locked(TA_CHECKPOINT_NAME)
+                if checkpoint.position >= top:
+                    break
+                
+                rows = list(
+                    ta.objects.filter(idta__gt=checkpoint.position, idta__lte=top)
+                    .order_by('idta')
+                    .values_list('idta', *TA_SEARCH_FIELDS)[:batch_size]
+                )
+                end = rows[-1][0] if len(rows) == batch_size else top
+                TASearchIndex._replace(checkpoint.position, end, rows)
+                
+                checkpoint.position = end
+                checkpoint.save(update_fields=['position', 'updated_at'])
+            count += len(rows)
+        return count
+    
+    @staticmethod
+    def _replace(start, end, rows):
+        """Replace the index rows for idta in (start, end]"""
+        params = [(row[0], ' '.join(str(value) for value in row[1:] if value)) for row in rows]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f"DELETE FROM {TA_SEARCH_TABLE} WHERE idta > %s AND idta <= %s", [start, end])
+                cursor.executemany(
+                    f"INSERT INTO {TA_SEARCH_TABLE} (idta, document) VALUES (%s, to_tsvector('simple', %s))",
+                    params
+                )
+            else:
+                cursor.execute(f"DELETE FROM {TA_SEARCH_TABLE} WHERE rowid > %s AND rowid <= %s", [start, end])
+                cursor.executemany(
+                    f"INSERT INTO {TA_SEARCH_TABLE} (rowid, idta, body) VALUES (%s, %s, %s)",
+                    [(idta, idta, body) for idta, body in params]
+                )
+    
+    @staticmethod
+    def prune():
+        """Drop index rows whose ta record no longer exists"""
+        if not is_available():
+            return
+        
+        from bots.models import ta
+        
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {TA_SEARCH_TABLE} WHERE idta NOT IN "
+                f"(SELECT idta FROM {ta._meta.db_table})"
+            )
+    
+    @staticmethod
+    def filter(queryset, text):
+        """
+        Restrict a ta queryset to records matching the search text
+        
+        Args:
+            queryset: bots ta queryset
+            text: User search input
+        
+        Returns:
+            Filtered queryset, or None when the index cannot serve the query
+        """
+        if not is_available(queryset.db):
+            return None
+        
+        vendor = connections[queryset.db].vendor
+        match = build_match_query(text, vendor)
+        if match is None:
+            return queryset
+        
+        if vendor == 'postgresql':
+            sql = f"SELECT idta FROM {TA_SEARCH_TABLE} WHERE document @@ to_tsquery('simple', %s)"
+        else:
+            sql = f"SELECT idta FROM {TA_SEARCH_TABLE} WHERE {TA_SEARCH_TABLE} MATCH %s"
+        
+        # Rows the index has not caught up with yet are matched the slow way
+        unindexed = Q(idta__gt=TASearchIndex.high_water_mark()) & (
+            Q(filename__icontains=text) |
+            Q(frompartner__icontains=text) |
+            Q(topartner__icontains=text) |
+            Q(reference__icontains=text)
+        )
+        return queryset.filter(Q(idta__in=RawSQL(sql, [match])) | unindexed)
@@ -0,0 +1,288 @@
+"""
+Segment Value Index
+Inverted index of (segment, element, value) inside EDI payloads
+
+Built at ingest from the EDIParser segment stream, read from the file in
+chunks; files above SEGMENT_INDEX_REQUEST_MAX_BYTES are left to the
+update_search_index command. Element names come from the bots grammar
+recorddefs (LIN03, C212.7140, ...) so operators can ask for "every 856 with
+MAN02 = <SSCC>" without scanning files on disk.
+"""
+
+import io
+import os
+import importlib
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from .edi_parser import EDIParser, READ_CHUNK_SIZE
+from .modern_edi_models import EDITransaction, SegmentValue
+
+
+logger = logging.getLogger('modern_edi.segment_index')
+
+MAX_VALUE_LENGTH = 80
+MIN_VALUE_LENGTH = 4
+MAX_VALUES_PER_TRANSACTION = 50000
+INDEXED_TYPES = ('AN', 'A', 'ID')
+
+# Matches returned by one search, over all its transactions
+MAX_SEARCH_MATCHES = 50000
+BATCH_SIZE = 1000
+
+# Files larger than this are indexed by update_search_index, not during the upload
+DEFAULT_REQUEST_MAX_BYTES = 10 * 1024 * 1024
+
+_recorddefs_cache = {}
+
+
+def load_recorddefs(editype, version):
+    """
+    Load grammar recorddefs for an editype/version
+    
+    Args:
+        editype: 'x12' or 'edifact'
+        version: X12 version ('004010') or EDIFACT directory ('D96A')
+    
+    Returns:
+        dict or None: recorddefs, or None when no grammar is installed
+    """
+    key = (editype, version)
+    if key in _recorddefs_cache:
+        return _recorddefs_cache[key]
+    
+    if editype == 'x12':
+        candidates = [f'records{version}']
+    else:
+        candidates = [f'records{version}UN', f'{version}records']
+    
+    recorddefs = None
+    for name in candidates:
+        try:
+            module = importlib.import_module(f'usersys.grammars.{editype}.{name}')
+        except ImportError:
+            continue
+        recorddefs = getattr(module, 'recorddefs', None)
+        if recorddefs:
+            break
+    
+    if recorddefs is None:
+        logger.debug("No recorddefs for %s %s, using positional element names", editype, version)
+    _recorddefs_cache[key] = recorddefs
+    return recorddefs
+
+
+def _grammar_version(format_type, segment_id, elements, component_sep):
+    """Pick the grammar version out of a GS or UNH segment"""
+    if format_type == 'X12' and segment_id == 'GS' and len(elements) >= 8:
+        return 'x12', elements[7].strip()[:6]
+    if format_type == 'EDIFACT' and segment_id == 'UNH' and len(elements) >= 2:
+        parts = elements[1].split(component_sep)
+        if len(parts) >= 3:
+            return 'edifact', parts[1] + parts[2]
+    return None
+
+
+def _should_index(field, value):
+    """Skip qualifiers, dates and amounts; keep identifiers and names"""
+    if not value or len(value) > MAX_VALUE_LENGTH:
+        return False
+    if field is None:
+        return len(value) >= MIN_VALUE_LENGTH
+    field_type = field[3] if len(field) > 3 else 'AN'
+    max_length = field[2]
+    if isinstance(max_length, tuple):
+        # (min, max) length
+        max_length = max_length[-1]
+    if not isinstance(max_length, int):
+        max_length = 0
+    return field_type in INDEXED_TYPES and max_length >= MIN_VALUE_LENGTH
+
+
+def request_limit():
+    """Largest file indexed during a request (settings.SEGMENT_INDEX_REQUEST_MAX_BYTES)"""
+    return getattr(settings, 'SEGMENT_INDEX_REQUEST_MAX_BYTES', DEFAULT_REQUEST_MAX_BYTES)
+
+
+class SegmentIndex:
+    """Build and query the segment value index"""
+    
+    @staticmethod
+    def extract(content):
+        """
+        Tokenize a payload into index entries
+        
+        Args:
+            content: X12 or EDIFACT content
+        
+        Returns:
+            list: (segment, element, value, offset) tuples
+        """
+        return list(SegmentIndex.iter_entries(io.StringIO(content)))
+    
+    @staticmethod
+    def iter_entries(f):
+        """
+        Tokenize an open text file into index entries, one segment at a time
+        
+        Args:
+            f: File opened in text mode
+        
+        Yields:
+            tuple: (segment, element, value, offset), at most
+            MAX_VALUES_PER_TRANSACTION of them
+        """
+        parser = EDIParser()
+        head = f.read(READ_CHUNK_SIZE)
+        delimiters = parser.get_delimiters(head)
+        if not delimiters:
+            return
+        
+        format_type = delimiters['format']
+        component_sep = delimiters['component']
+        release = delimiters['release']
+        recorddefs = None
+        count = 0
+        
+        for offset, segment_id, elements in parser.iter_file_segments(f, head=head):
+            version = _grammar_version(format_type, segment_id, elements, component_sep)
+            if version:
+                recorddefs = load_recorddefs(*version) or recorddefs
+            
+            fields = recorddefs.get(segment_id) if recorddefs else None
+            entries = []
+            
+            for position, element in enumerate(elements, start=1):
+                field = fields[position] if fields and position < len(fields) else None
+                
+                if field is not None and isinstance(field[2], list):
+                    # Composite: index each component under its own name
+                    components = parser._split(element, component_sep, release)
+                    for index, component in enumerate(components):
+                        subfield = field[2][index] if index < len(field[2]) else None
+                        value = component.strip()
+                        if subfield is not None and _should_index(subfield, value):
+                            entries.append((segment_id, subfield[0], value, offset))
+                    continue
+                
+                if field is None and format_type == 'EDIFACT' and component_sep in element:
+                    components = parser._split(element, component_sep, release)
+                    for index, component in enumerate(components, start=1):
+                        value = component.strip()
+                        if _should_index(None, value):
+                            entries.append((segment_id, f'{segment_id}{position:02d}.{index}', value, offset))
+                    continue
+                
+                value = element.strip()
+                if _should_index(field, value):
+                    name = field[0] if field is not None else f'{segment_id}{position:02d}'
+                    entries.append((segment_id, name, value, offset))
+            
+            for entry in entries:
+                if count >= MAX_VALUES_PER_TRANSACTION:
+                    logger.warning("Segment index truncated at %d values", MAX_VALUES_PER_TRANSACTION)
+                    return
+                count += 1
+                yield entry
+    
+    @staticmethod
+    def index_transaction(txn, content):
+        """
+        Replace the index entries for a transaction
+        
+        Args:
+            txn: EDITransaction instance
+            content: Payload content (str)
+        
+        Returns:
+            int: Number of entries written
+        """
+        return SegmentIndex._write(txn, io.StringIO(content))
+    
+    @staticmethod
+    def index_file(txn, max_bytes=None):
+        """
+        Index a transaction from its file on disk
+        
+        The file is read in chunks and entries are inserted BATCH_SIZE at a
+        time, so memory use does not grow with the file.
+        
+        Args:
+            txn: EDITransaction instance
+            max_bytes: Leave larger files for update_search_index (see
+                request_limit()); None indexes any size
+        
+        Returns:
+            int: Number of entries written, 0 if the file is missing or deferred
+        """
+        try:
+            if max_bytes is not None and os.path.getsize(txn.file_path) > max_bytes:
+                logger.info("Segment indexing of %s deferred to update_search_index", txn.id)
+                return 0
+            with open(txn.file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                return SegmentIndex._write(txn, f)
+        except (OSError, TypeError):
+            return 0
+    
+    @staticmethod
+    @transaction.atomic
+    def _write(txn, f):
+        SegmentValue.objects.filter(transaction=txn).delete()
+        
+        count = 0
+        batch = []
+        for segment, element, value, offset in SegmentIndex.iter_entries(f):
+            batch.append(SegmentValue(transaction=txn, segment=segment, element=element, value=value, offset=offset))
+            if len(batch) >= BATCH_SIZE:
+                SegmentValue.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            SegmentValue.objects.bulk_create(batch)
+            count += len(batch)
+        
+        EDITransaction.objects.filter(pk=txn.pk).update(segments_indexed=True)
+        txn.segments_indexed = True
+        return count
+    
+    @staticmethod
+    def search(value, segment=None, element=None, document_type=None, limit=100):
+        """
+        Find transactions containing a segment/element value
+        
+        Args:
+            value: Exact element value
+            segment: Optional segment tag (MAN, LIN, ...)
+            element: Optional element name (MAN02, C212.7140, ...)
+            document_type: Optional transaction document type
+            limit: Maximum number of transactions
+        
+        Returns:
+            list: One dict per transaction with the matching offsets, newest
+            transaction first
+        """
+        matches = SegmentValue.objects.filter(value=value)
+        if segment:
+            matches = matches.filter(segment=segment)
+        if element:
+            matches = matches.filter(element=element)
+        
+        # The newest matching transactions first, then their matches
+        transactions = EDITransaction.objects.filter(id__in=matches.values('transaction_id'))
+        if document_type:
+            transactions = transactions.filter(document_type=document_type)
+        ids = list(transactions.order_by('-created_at').values_list('id', flat=True)[:limit])
+        
+        results = {txn_id: {'transaction_id': txn_id, 'matches': []} for txn_id in ids}
+        rows = matches.filter(transaction_id__in=ids).order_by('transaction_id', 'offset').values(
+            'transaction_id', 'segment', 'element', 'offset'
+        )[:MAX_SEARCH_MATCHES]
+        for row in rows:
+            results[row['transaction_id']]['matches'].append({
+                'segment': row['segment'],
+                'element': row['element'],
+                'offset': row['offset'],
+            })
+        return list(results.values())
@@ -0,0 +1,156 @@
+"""
+Streaming Export
+Constant-memory CSV and NDJSON downloads for large querysets
+
+Rows are read with values_list(...).iterator(chunk_size=...), so the queryset
+never caches its results, and written to the response in blocks of about
+FLUSH_BYTES. With compression the blocks are gzipped on the fly.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+
+
+class InvalidExportFormat(ValueError):
+    """Raised for an unknown export format or compression"""
+    pass
+
+
+def export_options(request):
+    """
+    Read export options from the query string
+    
+    ?format=csv|ndjson (default csv), ?compress=gzip
+    
+    Returns:
+        tuple: (format, compress)
+    """
+    fmt = request.GET.get('format', 'csv').strip().lower() or 'csv'
+    if fmt not in EXPORT_FORMATS:
+        raise InvalidExportFormat(f"Unsupported export format '{fmt}'")
+    
+    compress = request.GET.get('compress', '').strip().lower()
+    if compress not in ('', 'gzip'):
+        raise InvalidExportFormat(f"Unsupported compression '{compress}'")
+    
+    return fmt, compress == 'gzip'
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=DjangoJSONEncoder) if value else ''
+    return value
+
+
+class StreamingExporter:
+    """
+    Stream a queryset as CSV or NDJSON
+    
+    Args:
+        queryset: Filtered and ordered queryset
+        columns: (field, header) pairs; field is a values_list lookup and
+            doubles as the NDJSON key
+        fmt: 'csv' or 'ndjson'
+        compress: gzip the output
+        chunk_size: Rows fetched per database round-trip
+    """
+    
+    def __init__(self, queryset, columns, fmt='csv', compress=False, chunk_size=CHUNK_SIZE):
+        if fmt not in EXPORT_FORMATS:
+            raise InvalidExportFormat(f"Unsupported export format '{fmt}'")
+        self.queryset = queryset
+        self.columns = columns
+        self.fmt = fmt
+        self.compress = compress
+        self.chunk_size = chunk_size
+    
+    def _rows(self):
+        fields = [field for field, _ in self.columns]
+        return self.queryset.values_list(*fields).iterator(chunk_size=self.chunk_size)
+    
+    def _csv_chunks(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([header for _, header in self.columns])
+        
+        for row in self._rows():
+            writer.writerow([_csv_value(value) for value in row])
+            if buffer.tell() >= FLUSH_BYTES:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+        
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+    
+    def _ndjson_chunks(self):
+        keys = [field for field, _ in self.columns]
+        lines = []
+        size = 0
+        
+        for row in self._rows():
+            line = json.dumps(dict(zip(keys, row)), cls=DjangoJSONEncoder, separators=(',', ':'))
+            lines.append(line)
+            size += len(line) + 1
+            if size >= FLUSH_BYTES:
+                lines.append('')
+                yield '\n'.join(lines).encode('utf-8')
+                lines = []
+                size = 0
+        
+        if lines:
+            lines.append('')
+            yield '\n'.join(lines).encode('utf-8')
+    
+    def _gzip(self, chunks):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    
+    def __iter__(self):
+        chunks = self._csv_chunks() if self.fmt == 'csv' else self._ndjson_chunks()
+        if self.compress:
+            chunks = self._gzip(chunks)
+        return iter(chunks)
+    
+    def response(self, filename):
+        """
+        Build the download response
+        
+        Args:
+            filename: Base file name without extension
+        
+        Returns:
+            StreamingHttpResponse
+        """
+        filename = f'{filename}.{self.fmt}'
+        content_type = EXPORT_FORMATS[self.fmt]
+        if self.compress:
+            filename += '.gz'
+            content_type = 'application/gzip'
+        
+        response = StreamingHttpResponse(iter(self), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
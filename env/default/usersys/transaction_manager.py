@@ -4,6 +4,8 @@ Business logic for EDI transaction operations
 """
 
 import os
+import time
+import uuid
 import subprocess
 import hashlib
 from datetime import datetime
@@ -11,7 +13,14 @@ from django.conf import settings
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from .modern_edi_models import EDITransaction, TransactionHistory
+from .partner_models import Partner
 from .edi_parser import EDIParser
+from .search_index import TransactionSearchIndex
+from .segment_index import SegmentIndex, request_limit
+from .upload_ingest import UploadIngest, READ_CHUNK_SIZE, staging_path
+from .control_numbers import ControlNumberIndex
+from .duplicate_detection import DuplicateDetector, DuplicateInterchange, interchange_key, get_action
+from . import pipeline_metrics
 
 
 class TransactionManager:
@@ -47,6 +56,33 @@ class TransactionManager:
         
         return True
     
+    def _resolve_partner(self, partner_id=None, partner_name=None):
+        """
+        Resolve the Partner row a transaction belongs to
+        
+        Args:
+            partner_id: Partner UUID or partner code (e.g., ACME001)
+            partner_name: Partner company name
+        
+        Returns:
+            Partner instance or None if no match
+        """
+        if partner_id:
+            partner_id = str(partner_id)
+            try:
+                return Partner.objects.get(id=uuid.UUID(partner_id))
+            except (ValueError, Partner.DoesNotExist):
+                pass
+            
+            partner = Partner.objects.filter(partner_id=partner_id).first()
+            if partner:
+                return partner
+        
+        if partner_name:
+            return Partner.objects.filter(name=partner_name).first()
+        
+        return None
+    
     @transaction.atomic
     def create_transaction(self, folder, data, user=None):
         """
@@ -73,6 +109,7 @@ class TransactionManager:
             folder=folder,
             partner_name=data['partner_name'],
             partner_id=data.get('partner_id'),
+            trading_partner=self._resolve_partner(data.get('partner_id'), data['partner_name']),
             document_type=data['document_type'],
             po_number=data.get('po_number'),
             filename=data.get('filename', f"{data['document_type']}_{datetime.now().strftime('%Y%m%d%H%M%S')}.edi"),
@@ -92,6 +129,7 @@ class TransactionManager:
         file_path = os.path.join(folder_path, f"{txn.id}.edi")
         txn.file_path = file_path
         txn.save()
+        TransactionSearchIndex.index(txn)
         
         # Create history entry
         TransactionHistory.objects.create(
@@ -104,6 +142,119 @@ class TransactionManager:
         
         return txn
     
+    @transaction.atomic
+    def ingest_upload(self, folder, uploaded_file, data, user=None, max_size=None):
+        """
+        Create a transaction from an uploaded file in a single pass
+        
+        The file is streamed to disk while its SHA-256 and envelope headers
+        are computed (see UploadIngest), then the transaction is created and
+        the file moved to its final path.
+        
+        Args:
+            folder: Target folder ('inbox' or 'outbox')
+            uploaded_file: Django UploadedFile
+            data: Dictionary with transaction data; document_type and
+                po_number fall back to the parsed header
+            user: User creating the transaction
+            max_size: Size limit in bytes (default: settings.MAX_UPLOAD_SIZE)
+        
+        Returns:
+            EDITransaction instance
+        """
+        self._validate_folder(folder)
+        
+        staged = staging_path(self.modern_edi_base)
+        result = UploadIngest.ingest(uploaded_file, staged, max_size=max_size)
+        
+        data = dict(data)
+        data.setdefault('filename', uploaded_file.name)
+        return self._create_from_ingest(folder, result, data, user)
+    
+    @transaction.atomic
+    def ingest_local_file(self, folder, file_path, data, user=None, staged=None):
+        """
+        Create a transaction from a complete file already on disk
+        
+        Used to commit resumable uploads. The file is hashed and its envelope
+        parsed in one read, then moved (not copied) to its final path.
+        
+        Args:
+            folder: Target folder ('inbox' or 'outbox')
+            file_path: Path of the assembled file; it is moved away
+            data: Dictionary with transaction data, as for ingest_upload
+            user: User creating the transaction
+            staged: Path to stage the file at (default: a new one)
+        
+        Returns:
+            EDITransaction instance
+        """
+        self._validate_folder(folder)
+        
+        staged = staged or staging_path(self.modern_edi_base)
+        result = UploadIngest.adopt(file_path, staged)
+        
+        data = dict(data)
+        data.setdefault('filename', os.path.basename(file_path))
+        return self._create_from_ingest(folder, result, data, user)
+    
+    def _create_from_ingest(self, folder, result, data, user):
+        """
+        Create the transaction for an ingested file and move the file to its final path
+        
+        Resent interchanges and files are handled per DUPLICATE_INTERCHANGE_ACTION
+        (see duplicate_detection): rejected, linked to the original (which is
+        returned instead), or stored and flagged with duplicate_of.
+        """
+        staging_path = result['path']
+        pipeline_metrics.record_ingest(folder, result['size'])
+        try:
+            header = result['metadata']
+            data['document_type'] = data.get('document_type') or header.get('document_type_code') or result['format']
+            data['po_number'] = data.get('po_number') or header.get('po_number')
+            data['metadata'] = {**header, **data.get('metadata', {})}
+            
+            key = interchange_key(header)
+            partner = self._resolve_partner(data.get('partner_id'), data.get('partner_name'))
+            original, reason = DuplicateDetector.find(partner, result['sha256'], key)
+            if original:
+                action = get_action()
+                if action == 'reject':
+                    raise DuplicateInterchange(original, reason)
+                if action == 'link':
+                    DuplicateDetector.link(
+                        original, reason, staging_path, user,
+                        filename=data.get('filename'),
+                        content_hash=result['sha256']
+                    )
+                    return original
+                data['metadata']['duplicate'] = {'of': str(original.id), 'reason': reason}
+            
+            txn = self.create_transaction(folder, data, user)
+            os.makedirs(os.path.dirname(txn.file_path), exist_ok=True)
+            os.replace(staging_path, txn.file_path)
+            staging_path = txn.file_path
+            
+            txn.file_size = result['size']
+            txn.content_hash = result['sha256']
+            if key:
+                txn.interchange_sender, txn.interchange_receiver, txn.interchange_control_number = key
+            txn.duplicate_of = original
+            txn.save(update_fields=[
+                'file_size', 'content_hash', 'interchange_sender', 'interchange_receiver',
+                'interchange_control_number', 'duplicate_of', 'modified_at'
+            ])
+            
+            # Index segment values for payload search
+            SegmentIndex.index_file(txn, max_bytes=request_limit())
+        except BaseException:
+            # The transaction rolls back, so the file must go too
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+            raise
+        
+        return txn
+    
     @transaction.atomic
     def update_transaction(self, transaction_id, data, user=None):
         """
@@ -145,8 +296,15 @@ class TransactionManager:
             txn.po_number = data['po_number']
         if 'metadata' in data:
             txn.metadata = data['metadata']
+        if 'partner_name' in data or 'partner_id' in data:
+            txn.trading_partner = self._resolve_partner(txn.partner_id, txn.partner_name)
+        
+        content_changed = self._refresh_content(txn)
         
         txn.save()
+        TransactionSearchIndex.index(txn)
+        if content_changed:
+            SegmentIndex.index_file(txn, max_bytes=request_limit())
         
         # Create history entry
         TransactionHistory.objects.create(
@@ -161,6 +319,31 @@ class TransactionManager:
         
         return txn
     
+    def _refresh_content(self, txn):
+        """
+        Pick up a file edited in place since it was stored
+        
+        Returns:
+            bool: Whether the content differs from txn.content_hash (file_size
+            and content_hash are then updated, not saved)
+        """
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(txn.file_path, 'rb') as f:
+                for block in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+                    digest.update(block)
+                    size += len(block)
+        except (OSError, TypeError):
+            return False
+        
+        content_hash = digest.hexdigest()
+        if content_hash == txn.content_hash:
+            return False
+        txn.content_hash = content_hash
+        txn.file_size = size
+        return True
+    
     @transaction.atomic
     def move_transaction(self, transaction_id, target_folder, user=None):
         """
@@ -253,6 +436,7 @@ class TransactionManager:
         # Update status to processing
         txn.status = 'processing'
         txn.save()
+        started = time.monotonic()
         
         try:
             # Copy file to Bots outfile directory for processing
@@ -267,6 +451,9 @@ class TransactionManager:
             else:
                 raise ValidationError(f"Transaction file not found: {txn.file_path}")
             
+            # Envelope control numbers, to match the acknowledgments against
+            ControlNumberIndex.record(txn, parser=self.edi_parser)
+            
             # Execute Bots engine (this would trigger actual EDI transmission)
             # For now, we'll simulate success
             # In production, you would call: subprocess.run(['bots-engine'], ...)
@@ -298,6 +485,7 @@ class TransactionManager:
                 details={'sent_at': txn.sent_at.isoformat()}
             )
             
+            pipeline_metrics.record_send('sent', time.monotonic() - started)
             return txn
             
         except Exception as e:
@@ -314,6 +502,7 @@ class TransactionManager:
                 details={'error': str(e), 'status': 'failed'}
             )
             
+            pipeline_metrics.record_send('failed', time.monotonic() - started)
             raise ValidationError(f"Failed to send transaction: {str(e)}")
     
     @transaction.atomic
@@ -353,6 +542,7 @@ class TransactionManager:
                 os.remove(file_path)
             
             # Delete database record
+            TransactionSearchIndex.remove(txn.id)
             txn.delete()
             
             return None
@@ -406,6 +596,9 @@ class TransactionManager:
             txn.content_hash = hashlib.sha256(f.read()).hexdigest()
         txn.save()
         
+        # Index segment values for payload search
+        SegmentIndex.index_transaction(txn, content)
+        
         return txn.file_path
     
     def check_acknowledgment(self, transaction_id):
@@ -0,0 +1,139 @@
+"""
+Upload Ingest
+Single-pass ingest for uploaded EDI files
+
+uploaded_file.chunks() is consumed once. Each chunk is written to the store,
+added to a SHA-256 digest and, until it has the envelope, fed to the
+incremental header parser. Memory use is one chunk whatever the file size,
+and the stored bytes are exactly the uploaded bytes.
+"""
+
+import os
+import uuid
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from .edi_parser import HeaderParser
+
+
+DEFAULT_MAX_UPLOAD_SIZE = 100 * 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+STAGING_DIR = 'staging'
+
+
+def get_max_upload_size():
+    """Largest accepted upload in bytes (settings.MAX_UPLOAD_SIZE)"""
+    return getattr(settings, 'MAX_UPLOAD_SIZE', DEFAULT_MAX_UPLOAD_SIZE)
+
+
+def staging_path(base_dir, name=None):
+    """
+    Path to hold an upload until it is accepted
+    
+    A directory of its own under base_dir keeps partial and rejected files out
+    of folder listings, and on the same file system the final move is a rename.
+    
+    Args:
+        base_dir: Modern EDI base directory
+        name: Fixed name, to find the file again (default: a new random one)
+    """
+    return os.path.join(base_dir, STAGING_DIR, f'upload-{name or uuid.uuid4().hex}.edi')
+
+
+class UploadIngest:
+    """Write, hash and sniff an upload in one pass"""
+    
+    @staticmethod
+    def ingest(uploaded_file, dest_path, max_size=None):
+        """
+        Store an uploaded file
+        
+        The data is written to a hidden temporary file next to dest_path and
+        renamed into place once complete, so directory pollers never see a
+        partial file.
+        
+        Args:
+            uploaded_file: Django UploadedFile
+            dest_path: Final file path
+            max_size: Size limit in bytes (default: get_max_upload_size())
+        
+        Returns:
+            Dictionary with path, size, sha256, format and header metadata
+        
+        Raises:
+            ValidationError: If the upload exceeds max_size
+        """
+        if max_size is None:
+            max_size = get_max_upload_size()
+        if max_size and uploaded_file.size and uploaded_file.size > max_size:
+            raise ValidationError(f"File too large (max {max_size // (1024 * 1024)} MB)")
+        
+        directory = os.path.dirname(dest_path)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f'.{os.path.basename(dest_path)}.{uuid.uuid4().hex}.part')
+        
+        digest = hashlib.sha256()
+        header = HeaderParser()
+        size = 0
+        
+        try:
+            with open(tmp_path, 'wb') as destination:
+                for chunk in uploaded_file.chunks():
+                    size += len(chunk)
+                    if max_size and size > max_size:
+                        raise ValidationError(f"File too large (max {max_size // (1024 * 1024)} MB)")
+                    
+                    destination.write(chunk)
+                    digest.update(chunk)
+                    if not header.done:
+                        header.feed(chunk)
+            
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        return UploadIngest._result(dest_path, size, digest, header)
+    
+    @staticmethod
+    def adopt(src_path, dest_path):
+        """
+        Move an already stored file into place, hashing and parsing it on the way
+        
+        Used for resumable uploads, whose data was written by earlier requests.
+        
+        Args:
+            src_path: Complete file on disk
+            dest_path: Final file path (same file system as src_path)
+        
+        Returns:
+            Dictionary with path, size, sha256, format and header metadata
+        """
+        digest = hashlib.sha256()
+        header = HeaderParser()
+        size = 0
+        
+        with open(src_path, 'rb') as source:
+            for chunk in iter(lambda: source.read(READ_CHUNK_SIZE), b''):
+                size += len(chunk)
+                digest.update(chunk)
+                if not header.done:
+                    header.feed(chunk)
+        
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        os.replace(src_path, dest_path)
+        return UploadIngest._result(dest_path, size, digest, header)
+    
+    @staticmethod
+    def _result(path, size, digest, header):
+        metadata = header.close()
+        return {
+            'path': path,
+            'size': size,
+            'sha256': digest.hexdigest(),
+            'format': metadata.get('format', 'UNKNOWN'),
+            'metadata': metadata,
+        }
@@ -333,7 +333,7 @@ class UserManager:
         from .activity_logger import ActivityLogger
         
         # Get activity count
-        activity_count = ActivityLogger.get_user_activity('partner', user.id, limit=1000).count()
+        activity_count = len(ActivityLogger.get_user_activity('partner', user.id, limit=1000))
         
         # Get login count
         login_count = ActivityLogger.get_action_count('login', user_type='partner', days=30)
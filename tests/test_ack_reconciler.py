@@ -0,0 +1,151 @@
+"""
+Tests for acknowledgment parsing and reconciliation
+"""
+
+import pytest
+from django.test import TestCase
+from datetime import datetime
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'env', 'default'))
+
+try:
+    from usersys.ack_reconciler import AckReconciler, parse_acknowledgments
+    from usersys.control_numbers import ControlNumberIndex
+    from usersys.modern_edi_models import EDITransaction, TransactionHistory, SentControlNumber, LeaderLease
+except ImportError:
+    pytest.skip("Bots environment not initialized", allow_module_level=True)
+
+
+X12_997 = (
+    "ISA*00*          *00*          *ZZ*PARTNER        *ZZ*OURID          *230101*1200*U*00401*000000900*0*P*>~"
+    "GS*FA*PARTNER*OURID*20230101*1200*900*X*004010~"
+    "ST*997*0001~AK1*PO*101~AK9*A*1*1*1~SE*4*0001~"
+    "ST*997*0002~AK1*PO*102~AK9*R*1*1*0~SE*4*0002~"
+    "GE*2*900~IEA*1*000000900~"
+)
+
+CONTRL = (
+    "UNA:+.? 'UNB+UNOA:2+PARTNER:ZZ+OURID:ZZ+230101:1200+55'"
+    "UNH+1+CONTRL:D:3:UN'UCI+REF77+OURID:ZZ+PARTNER:ZZ+4'UNT+3+1'UNZ+1+55'"
+)
+
+
+class TestParseAcknowledgments(TestCase):
+    """Test reading acknowledged interchanges"""
+    
+    def test_997_groups(self):
+        """Each AK1/AK9 pair acknowledges one group, keyed from our side"""
+        acks = parse_acknowledgments(X12_997)
+        
+        self.assertEqual(
+            [ack['key'] for ack in acks],
+            [('group', 'OURID', 'PARTNER', '101'), ('group', 'OURID', 'PARTNER', '102')]
+        )
+        self.assertEqual(acks[0]['fallback'], ('interchange', 'OURID', 'PARTNER', '101'))
+        self.assertEqual([ack['status'] for ack in acks], ['accepted', 'rejected'])
+    
+    def test_contrl(self):
+        """UCI names the original interchange"""
+        acks = parse_acknowledgments(CONTRL)
+        
+        self.assertEqual(acks[0]['key'], ('interchange', 'OURID', 'PARTNER', 'REF77'))
+        self.assertEqual(acks[0]['status'], 'rejected')
+
+
+class TestControlNumbers(TestCase):
+    """Test control numbers recorded at send time"""
+    
+    def test_extract_levels(self):
+        """Each envelope level is keyed with its own sender and receiver, without leading zeros"""
+        content = (
+            "ISA*00*          *00*          *ZZ*OURID          *ZZ*PARTNER        *230101*1200*U*00401*000000101*0*P*>~"
+            "GS*PO*OURAPP*PARTAPP*20230101*1200*7*X*004010~ST*850*0001~SE*2*0001~GE*1*7~IEA*1*000000101~"
+        )
+        
+        self.assertEqual(ControlNumberIndex.extract(content), [
+            ('interchange', 'OURID', 'PARTNER', '101'),
+            ('group', 'OURAPP', 'PARTAPP', '7'),
+            ('message', 'OURAPP', 'PARTAPP', '1'),
+        ])
+
+    
+    def test_reused_number_links_latest_send(self):
+        """A reused control number resolves to its latest send, not the bots ta of an earlier one"""
+        key = ControlNumberIndex.key('group', 'OURID', 'PARTNER', '101')
+        rows = []
+        for sent_at in (datetime(2023, 1, 1), datetime(2024, 1, 1)):
+            txn = EDITransaction.objects.create(
+                filename='test.edi', folder='sent', partner_name='Test Partner', document_type='850',
+                file_path='/tmp/test.edi', file_size=1, status='sent', sent_at=sent_at
+            )
+            rows.append(SentControlNumber.objects.create(
+                transaction=txn, level='group', sender='OURID', receiver='PARTNER', control_number='101'
+            ))
+        SentControlNumber.objects.filter(pk=rows[0].pk).update(bots_ta_id=10)
+        
+        self.assertIsNone(ControlNumberIndex.ta_id(key))
+        
+        ControlNumberIndex.link_ta(key, 20)
+        
+        self.assertEqual(ControlNumberIndex.ta_id(key), 20)
+        self.assertEqual(SentControlNumber.objects.get(pk=rows[0].pk).bots_ta_id, 10)
+
+
+class TestApply(TestCase):
+    """Test matching acknowledgments to sent transactions"""
+    
+    def _sent(self, control_number, group=True):
+        txn = EDITransaction.objects.create(
+            filename='test.edi', folder='sent', partner_name='Test Partner', document_type='850',
+            file_path='/tmp/test.edi', file_size=1, status='sent', sent_at=datetime.now()
+        )
+        content = (
+            f"ISA*00*          *00*          *ZZ*OURID          *ZZ*PARTNER        *230101*1200*U*00401*{control_number:0>9}*0*P*>~"
+            f"GS*PO*OURID*PARTNER*20230101*1200*{control_number}*X*004010~ST*850*0001~SE*2*0001~"
+        )
+        ControlNumberIndex.record(txn, content)
+        if not group:
+            # Sent before group numbers were recorded
+            SentControlNumber.objects.filter(transaction=txn).exclude(level='interchange').delete()
+        return txn
+    
+    def test_bulk_update_and_history(self):
+        """Groups match, interchange numbers are the fallback, other transactions are untouched"""
+        accepted = self._sent('101')
+        rejected = self._sent('102', group=False)
+        pending = self._sent('103')
+        acks = parse_acknowledgments(X12_997) + [
+            {'key': ('group', 'OURID', 'PARTNER', '555'), 'status': 'accepted', 'message': ''}
+        ]
+        
+        result = AckReconciler.apply(acks)
+        
+        self.assertEqual(result, {'acknowledged': 2, 'unmatched': 1})
+        accepted.refresh_from_db()
+        rejected.refresh_from_db()
+        pending.refresh_from_db()
+        self.assertEqual((accepted.status, accepted.acknowledgment_status), ('acknowledged', 'accepted'))
+        self.assertEqual(rejected.acknowledgment_status, 'rejected')
+        self.assertIsNone(pending.acknowledgment_status)
+        self.assertEqual(TransactionHistory.objects.filter(action='acknowledged').count(), 2)
+        
+        # Applying the same acknowledgments again changes nothing
+        self.assertEqual(AckReconciler.apply(acks)['acknowledged'], 0)
+
+
+class TestLeaderLease(TestCase):
+    """Test the lease electing one acknowledgment daemon"""
+    
+    def test_one_holder_until_released(self):
+        """A second node is refused while the lease is held, and takes over once released"""
+        self.assertTrue(LeaderLease.acquire('ack_daemon', 'node-a', 90))
+        self.assertTrue(LeaderLease.acquire('ack_daemon', 'node-a', 90))
+        self.assertFalse(LeaderLease.acquire('ack_daemon', 'node-b', 90))
+        
+        LeaderLease.release('ack_daemon', 'node-a')
+        
+        self.assertTrue(LeaderLease.acquire('ack_daemon', 'node-b', 90))
+        self.assertFalse(LeaderLease.acquire('ack_daemon', 'node-a', 90))
@@ -84,13 +84,26 @@ class TestAPIAuthentication(TestCase):
     
     def test_rate_limit_check(self):
         """Test rate limiting"""
-        self.api_key.current_usage = 50
-        self.api_key.save()
-        self.assertTrue(self.api_key.check_rate_limit())
+        self.api_key.rate_limit = 3
+        for _ in range(3):
+            self.assertTrue(self.api_key.increment_usage())
+        self.assertEqual(self.api_key.retry_after, 0)
+        
+        self.assertFalse(self.api_key.increment_usage())
+        self.assertEqual(self.api_key.current_usage, 4)
+        self.assertGreater(self.api_key.retry_after, 0)
+    
+    def test_cached_key_invalidated_on_revoke(self):
+        """Test revoking a key takes effect despite the cache"""
+        cached = APIKey.get_cached(self.api_key.key)
+        self.assertTrue(cached.has_permission('test_permission'))
         
-        self.api_key.current_usage = 100
+        self.api_key.permissions.remove(self.permission)
+        self.assertFalse(APIKey.get_cached(self.api_key.key).has_permission('test_permission'))
+        
+        self.api_key.is_active = False
         self.api_key.save()
-        self.assertFalse(self.api_key.check_rate_limit())
+        self.assertFalse(APIKey.get_cached(self.api_key.key).is_valid())
     
     def test_ip_whitelist_empty(self):
         """Test IP whitelist when empty (allows all)"""
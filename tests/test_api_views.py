@@ -133,9 +133,12 @@ class TestAPIViews(TestCase):
         """Test rate limiting"""
         # Set low rate limit
         self.api_key.rate_limit = 2
-        self.api_key.current_usage = 2
         self.api_key.save()
         
+        for _ in range(2):
+            response = self.client.get('/api/v1/status', **self.headers)
+            self.assertEqual(response.status_code, 200)
+        
         response = self.client.get('/api/v1/status', **self.headers)
         self.assertEqual(response.status_code, 429)
         
@@ -0,0 +1,102 @@
+"""
+Tests for batched audit row writes
+"""
+
+import pytest
+from django.test import TransactionTestCase, override_settings
+from django.db import transaction, OperationalError
+from unittest.mock import patch
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'env', 'default'))
+
+try:
+    from usersys.partner_models import ActivityLog
+    from usersys import audit_buffer
+    from usersys.audit_buffer import AuditBuffer, WRITE_RETRIES
+except ImportError:
+    pytest.skip("Bots environment not initialized", allow_module_level=True)
+
+
+def row(name, user_id=1):
+    return ActivityLog(user_type='admin', user_id=user_id, user_name=name, action='view')
+
+
+# TestCase wraps each test in a transaction, where add() saves directly
+@override_settings(AUDIT_BUFFER_ENABLED=True, AUDIT_BUFFER_BATCH_SIZE=5, AUDIT_BUFFER_FLUSH_MS=50)
+class TestAuditBuffer(TransactionTestCase):
+    """Test queued batch writes, flush and the row-by-row fallback"""
+    
+    def setUp(self):
+        self.buffer = AuditBuffer(ActivityLog)
+        self.addCleanup(self.buffer.flush, 1)
+    
+    def names(self):
+        return sorted(ActivityLog.objects.values_list('user_name', flat=True))
+    
+    def test_rows_written_in_batches(self):
+        """The writer thread saves queued rows with bulk_create, at most a batch at a time"""
+        sizes = []
+        bulk_create = ActivityLog.objects.bulk_create
+        
+        def record(batch, *args, **kwargs):
+            sizes.append(len(batch))
+            return bulk_create(batch, *args, **kwargs)
+        
+        with patch.object(ActivityLog.objects, 'bulk_create', side_effect=record):
+            for i in range(12):
+                self.buffer.add(row(f'user{i:02d}'))
+            self.buffer.flush()
+        
+        self.assertEqual(self.names(), [f'user{i:02d}' for i in range(12)])
+        self.assertEqual(sum(sizes), 12)
+        self.assertLessEqual(max(sizes), 5)
+        self.assertLess(len(sizes), 12)
+    
+    def test_flush_writes_rows_left_on_queue(self):
+        """Rows the writer never picked up are written by the flushing thread"""
+        with patch.object(AuditBuffer, '_run', lambda self: None):
+            for i in range(3):
+                self.buffer.add(row(f'user{i}'))
+            self.assertEqual(ActivityLog.objects.count(), 0)
+            
+            self.buffer.flush()
+        
+        self.assertEqual(self.names(), ['user0', 'user1', 'user2'])
+        self.assertEqual(self.buffer._queue.unfinished_tasks, 0)
+    
+    def test_saved_directly_in_transaction(self):
+        """Rows logged inside a transaction roll back with it"""
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.buffer.add(row('inside'))
+                self.assertEqual(ActivityLog.objects.count(), 1)
+                raise RuntimeError
+        
+        self.assertEqual(ActivityLog.objects.count(), 0)
+        self.assertIsNone(self.buffer._queue)
+    
+    def test_locked_database_falls_back_to_rows(self):
+        """A batch that stays locked is retried, then inserted row by row"""
+        batch = [row('user0'), row('user1')]
+        
+        with patch.object(audit_buffer, 'RETRY_DELAY', 0), \
+                patch.object(ActivityLog.objects, 'bulk_create', side_effect=OperationalError('database is locked')) as bulk_create, \
+                self.assertLogs('modern_edi.audit', 'WARNING') as logs:
+            self.buffer._write(batch)
+        
+        self.assertEqual(bulk_create.call_count, WRITE_RETRIES + 1)
+        self.assertEqual(len(logs.records), WRITE_RETRIES)
+        self.assertEqual(self.names(), ['user0', 'user1'])
+    
+    def test_bad_row_dropped_alone(self):
+        """Only the rows that fail on their own are lost"""
+        batch = [row('user0'), row('broken', user_id=None), row('user2')]
+        
+        with self.assertLogs('modern_edi.audit', 'ERROR') as logs:
+            self.buffer._write(batch)
+        
+        self.assertEqual(self.names(), ['user0', 'user2'])
+        self.assertIn('Dropped 1 of 3 ActivityLog rows', logs.output[-1])
@@ -0,0 +1,175 @@
+"""
+Tests for duplicate interchange detection
+"""
+
+import pytest
+from django.test import TestCase, RequestFactory, override_settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from unittest.mock import Mock, patch
+import inspect
+import json
+import shutil
+import tempfile
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'env', 'default'))
+
+try:
+    from usersys.api_models import APIKey, APIUpload
+    from usersys.partner_models import Partner
+    from usersys.modern_edi_models import EDITransaction, TransactionHistory
+    from usersys.transaction_manager import TransactionManager
+    from usersys.duplicate_detection import DuplicateDetector, DuplicateInterchange
+except ImportError:
+    pytest.skip("Bots environment not initialized", allow_module_level=True)
+
+
+def x12(control_number, po_number):
+    """An 850 interchange with the given ISA13"""
+    return (
+        "ISA*00*          *00*          *ZZ*SENDER         *ZZ*RECEIVER       "
+        f"*240101*1200*U*00401*{control_number}*0*P*>~"
+        "GS*PO*SND*RCV*20240101*1200*1*X*004010~ST*850*0001~"
+        f"BEG*00*SA*{po_number}**20240101~SE*3*0001~"
+    ).encode()
+
+
+class TestTransactionDuplicates(TestCase):
+    """Test reject, link and flag for files stored as transactions"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.override = override_settings(BOTSSYS=self.tmpdir)
+        self.override.enable()
+        self.manager = TransactionManager()
+        self.partner = Partner.objects.create(partner_id='ACME', name='Acme')
+        self.original = self.ingest('po.edi', x12('000000101', 'PO-1'))
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+    
+    def ingest(self, filename, content, partner_name='Acme'):
+        return self.manager.ingest_upload(
+            'inbox', SimpleUploadedFile(filename, content), {'partner_name': partner_name}
+        )
+    
+    def staged_files(self):
+        staging = os.path.join(self.tmpdir, 'modern-edi', 'staging')
+        return os.listdir(staging) if os.path.isdir(staging) else []
+    
+    def test_flag(self):
+        """A resent interchange is stored and points at the original"""
+        txn = self.ingest('resend.edi', x12('000000101', 'PO-2'))
+        
+        self.assertNotEqual(txn.id, self.original.id)
+        self.assertEqual(txn.duplicate_of_id, self.original.id)
+        self.assertEqual(txn.metadata['duplicate']['reason'], 'interchange')
+    
+    @override_settings(DUPLICATE_INTERCHANGE_ACTION='reject')
+    def test_reject(self):
+        """A resent file is refused and nothing is kept"""
+        with self.assertRaises(DuplicateInterchange) as cm:
+            self.ingest('copy.edi', x12('000000101', 'PO-1'))
+        
+        self.assertEqual(cm.exception.original, self.original)
+        self.assertEqual(EDITransaction.objects.count(), 1)
+        self.assertEqual(self.staged_files(), [])
+    
+    @override_settings(DUPLICATE_INTERCHANGE_ACTION='link')
+    def test_link(self):
+        """A resend is recorded on the original instead of stored"""
+        txn = self.ingest('copy.edi', x12('000000101', 'PO-1'))
+        
+        self.assertEqual(txn.id, self.original.id)
+        self.assertEqual(EDITransaction.objects.count(), 1)
+        history = TransactionHistory.objects.get(transaction=self.original, action='duplicate_received')
+        self.assertEqual(history.details['filename'], 'copy.edi')
+        self.assertEqual(self.staged_files(), [])
+    
+    def test_other_partner_not_matched(self):
+        """Originals are looked up per trading partner"""
+        other = Partner.objects.create(partner_id='OTHER', name='Other')
+        
+        self.assertEqual(DuplicateDetector.find(other, self.original.content_hash), (None, None))
+        self.assertEqual(
+            DuplicateDetector.find(self.partner, self.original.content_hash),
+            (self.original, 'file')
+        )
+
+
+class TestAPIUploadDuplicates(TestCase):
+    """Test duplicate detection for files uploaded through the API"""
+    
+    def setUp(self):
+        try:
+            from usersys import api_views
+        except ImportError:
+            self.skipTest("bots is not installed")
+        
+        self.tmpdir = tempfile.mkdtemp()
+        ini = Mock()
+        ini.get.return_value = self.tmpdir
+        patcher = patch.object(api_views.bots.botsglobal, 'ini', ini, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.tmpdir, True)
+        
+        self.view = inspect.unwrap(api_views.upload_file)
+        self.factory = RequestFactory()
+        user = User.objects.create_user(username='integration', password='testpass123')
+        self.api_key = APIKey.objects.create(name='Integration', user=user)
+    
+    def upload(self, filename, content):
+        request = self.factory.post('/api/v1/files/upload', {'file': SimpleUploadedFile(filename, content)})
+        request.api_key = self.api_key
+        response = self.view(request)
+        return response.status_code, json.loads(response.content)
+    
+    def infile(self):
+        return sorted(os.listdir(os.path.join(self.tmpdir, 'infile')))
+    
+    def test_first_upload_is_recorded(self):
+        """Queued uploads are kept for later duplicate checks"""
+        status, body = self.upload('po.edi', x12('000000201', 'PO-1'))
+        
+        self.assertEqual(status, 201)
+        self.assertIsNone(body['duplicate'])
+        upload = APIUpload.objects.get()
+        self.assertEqual(upload.interchange_control_number, '000000201')
+        self.assertEqual(upload.content_hash, body['file']['sha256'])
+    
+    def test_flag(self):
+        """A resend of an API upload is queued and reported"""
+        self.upload('po.edi', x12('000000201', 'PO-1'))
+        status, body = self.upload('resend.edi', x12('000000201', 'PO-1'))
+        
+        self.assertEqual(status, 201)
+        self.assertEqual(body['duplicate']['kind'], 'api_upload')
+        self.assertEqual(body['duplicate']['action'], 'flag')
+        self.assertEqual(self.infile(), ['po.edi', 'resend.edi'])
+    
+    @override_settings(DUPLICATE_INTERCHANGE_ACTION='reject')
+    def test_reject(self):
+        """A resent interchange is refused before it reaches bots"""
+        self.upload('po.edi', x12('000000201', 'PO-1'))
+        status, body = self.upload('resend.edi', x12('000000201', 'PO-2'))
+        
+        self.assertEqual(status, 409)
+        self.assertEqual(body['kind'], 'api_upload')
+        self.assertEqual(self.infile(), ['po.edi'])
+        self.assertEqual(APIUpload.objects.count(), 1)
+    
+    @override_settings(DUPLICATE_INTERCHANGE_ACTION='link')
+    def test_link(self):
+        """A resent file is dropped without queueing it"""
+        self.upload('po.edi', x12('000000201', 'PO-1'))
+        status, body = self.upload('resend.edi', x12('000000201', 'PO-1'))
+        
+        self.assertEqual(status, 200)
+        self.assertEqual(body['duplicate']['action'], 'link')
+        self.assertEqual(self.infile(), ['po.edi'])
+        self.assertEqual(os.listdir(os.path.join(self.tmpdir, 'staging')), [])
@@ -0,0 +1,127 @@
+"""
+Tests for conditional and ranged file downloads
+"""
+
+import pytest
+from django.test import TestCase, RequestFactory, override_settings
+import hashlib
+import tempfile
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'env', 'default'))
+
+try:
+    from usersys.file_serving import serve_file, make_etag
+except ImportError:
+    pytest.skip("Bots environment not initialized", allow_module_level=True)
+
+
+CONTENT = bytes(range(256)) * 4
+
+
+@override_settings(FILE_SERVE_BACKEND=None)
+class TestServeFile(TestCase):
+    """Test ETags, Range and If-Range"""
+    
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.edi')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(CONTENT)
+        self.addCleanup(os.remove, self.path)
+        self.content_hash = hashlib.sha256(CONTENT).hexdigest()
+        self.factory = RequestFactory()
+    
+    def serve(self, content_hash=None, **headers):
+        request = self.factory.get('/download', **headers)
+        return serve_file(request, self.path, content_hash=content_hash)
+    
+    def body(self, response):
+        content = b''.join(response.streaming_content)
+        response.close()
+        return content
+    
+    def test_full_file(self):
+        """Without Range the whole file is sent with a strong ETag"""
+        response = self.serve(content_hash=self.content_hash)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{self.content_hash}"')
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(self.body(response), CONTENT)
+    
+    def test_single_range(self):
+        """A closed range is answered with 206 and only those bytes"""
+        response = self.serve(HTTP_RANGE='bytes=10-19')
+        
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(self.body(response), CONTENT[10:20])
+    
+    def test_open_and_suffix_ranges(self):
+        """Open ranges run to the end; suffix ranges take the last bytes"""
+        response = self.serve(HTTP_RANGE='bytes=1000-')
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1023/{len(CONTENT)}')
+        self.assertEqual(self.body(response), CONTENT[1000:])
+        
+        response = self.serve(HTTP_RANGE='bytes=-100')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 924-1023/{len(CONTENT)}')
+        self.assertEqual(self.body(response), CONTENT[-100:])
+        
+        # A suffix longer than the file is the whole file
+        response = self.serve(HTTP_RANGE='bytes=-5000')
+        self.assertEqual(response['Content-Range'], f'bytes 0-1023/{len(CONTENT)}')
+        self.assertEqual(self.body(response), CONTENT)
+    
+    def test_unsatisfiable_range(self):
+        """Ranges past the end or empty suffixes answer 416"""
+        for header in ('bytes=2000-', 'bytes=20-10', 'bytes=-0'):
+            with self.subTest(range=header):
+                response = self.serve(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+    
+    def test_malformed_range_sends_full_file(self):
+        """Multi-range and malformed headers fall back to the whole file"""
+        for header in ('bytes=0-1,5-6', 'lines=1-2'):
+            with self.subTest(range=header):
+                response = self.serve(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.body(response), CONTENT)
+    
+    def test_if_range_strong_etag(self):
+        """If-Range with the current strong ETag keeps the range, another ETag does not"""
+        etag = f'"{self.content_hash}"'
+        response = self.serve(content_hash=self.content_hash, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), CONTENT[:10])
+        
+        response = self.serve(content_hash=self.content_hash, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), CONTENT)
+    
+    def test_if_range_weak_etag(self):
+        """A weak ETag never satisfies If-Range, so the whole file is sent"""
+        etag = make_etag(self.path)
+        self.assertTrue(etag.startswith('W/'))
+        
+        response = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.body(response), CONTENT)
+    
+    def test_if_none_match(self):
+        """A matching If-None-Match answers 304, weak or strong"""
+        etag = f'"{self.content_hash}"'
+        for header in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+            with self.subTest(if_none_match=header):
+                response = self.serve(content_hash=self.content_hash, HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+        
+        response = self.serve(content_hash=self.content_hash, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+        response.close()
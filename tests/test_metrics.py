@@ -0,0 +1,115 @@
+"""
+Tests for the metrics registry and request profiling
+"""
+
+import pytest
+from django.test import TestCase, RequestFactory, override_settings
+from django.http import HttpResponse
+from django.utils import timezone
+from datetime import timedelta
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'env', 'default'))
+
+try:
+    from usersys.metrics import Registry
+    from usersys.request_profiler import REQUESTS, DB_QUERIES, slow_requests
+    from usersys.modern_edi_middleware import ProfilingMiddleware
+    from usersys.partner_models import Partner
+    from usersys.modern_edi_models import EDITransaction
+    from usersys.pipeline_metrics import snapshot, PipelineSnapshot, FOLDER_DEPTH, OUTBOX_STUCK
+except ImportError:
+    pytest.skip("Bots environment not initialized", allow_module_level=True)
+
+
+class TestRegistry(TestCase):
+    """Test Prometheus text rendering"""
+    
+    def test_counter_and_gauge(self):
+        """Samples carry their labels, with quotes escaped"""
+        registry = Registry()
+        registry.counter('files_total', 'Files', ['partner']).inc(2, partner='A"B')
+        registry.gauge('depth', 'Depth').set(7)
+        text = registry.render()
+        
+        self.assertIn('# TYPE files_total counter', text)
+        self.assertIn('files_total{partner="A\\"B"} 2', text)
+        self.assertIn('depth 7', text)
+    
+    def test_histogram_buckets_are_cumulative(self):
+        """Buckets count every observation up to their bound"""
+        registry = Registry()
+        histogram = registry.histogram('took_seconds', 'Time', buckets=(1, 5))
+        for value in (0.5, 2, 2, 10):
+            histogram.observe(value)
+        text = registry.render()
+        
+        self.assertIn('took_seconds_bucket{le="1"} 1', text)
+        self.assertIn('took_seconds_bucket{le="5"} 3', text)
+        self.assertIn('took_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn('took_seconds_sum 14.5', text)
+        self.assertIn('took_seconds_count 4', text)
+    
+    def test_labels_are_checked(self):
+        """Observations need exactly the declared labels"""
+        counter = Registry().counter('sent_total', 'Sends', ['partner'])
+        with self.assertRaises(ValueError):
+            counter.inc(channel='x')
+
+
+class TestProfilingMiddleware(TestCase):
+    """Test per-view request figures"""
+    
+    def test_queries_counted_per_view(self):
+        """Queries run by the view are counted under its name"""
+        def view(request):
+            list(Partner.objects.all())
+            list(Partner.objects.all())
+            return HttpResponse('ok')
+        
+        request = RequestFactory().get('/x')
+        before = DB_QUERIES.count(view='<unresolved>')
+        slow_requests.clear()
+        with override_settings(PROFILING_SLOW_REQUEST_MS=0):
+            response = ProfilingMiddleware(view)(request)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DB_QUERIES.count(view='<unresolved>'), before + 1)
+        self.assertGreaterEqual(REQUESTS.value(view='<unresolved>', method='GET', status=200), 1)
+        
+        sample = slow_requests.entries()[0]
+        self.assertEqual(sample['db_queries'], 2)
+        self.assertEqual(len(sample['sql']), 2)
+        self.assertEqual(sample['bytes'], 2)
+
+
+class TestPipelineSnapshot(TestCase):
+    """Test folder gauges read from the database"""
+    
+    def test_depths_and_stuck_outbox(self):
+        """Depths come from one grouped query; old outbox items count as stuck"""
+        for folder in ('inbox', 'outbox', 'outbox'):
+            EDITransaction.objects.create(
+                filename='test.edi', folder=folder, partner_name='Test Partner',
+                document_type='850', file_path='/tmp/test.edi', file_size=1
+            )
+        EDITransaction.objects.filter(folder='outbox').update(created_at=timezone.now() - timedelta(days=2))
+        
+        state = snapshot.get(force=True)
+        
+        self.assertEqual(state['depths'], {'inbox': 1, 'outbox': 2})
+        self.assertEqual(state['stuck'], 2)
+        self.assertEqual(state['sftp_polling'], 'not_configured')
+        self.assertEqual(FOLDER_DEPTH.value(folder='outbox'), 2)
+        self.assertEqual(OUTBOX_STUCK.value(), 2)
+    
+    def test_sftp_polling_status(self):
+        """Pollers that never recorded a poll are unknown, not stale"""
+        now = timezone.now()
+        status = PipelineSnapshot._polling_status
+        
+        self.assertEqual(status({'Acme': (300, None)}, now), 'unknown')
+        self.assertEqual(status({'Acme': (300, now - timedelta(minutes=1)), 'Other': (300, None)}, now), 'healthy')
+        self.assertEqual(status({'Acme': (300, now - timedelta(hours=1))}, now), 'stale')
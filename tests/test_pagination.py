@@ -0,0 +1,92 @@
+"""
+Tests for cursor pagination
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from django.test import TestCase, RequestFactory
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'env', 'default'))
+
+try:
+    from usersys.partner_models import ActivityLog
+    from usersys.pagination import (
+        CursorPaginator, InvalidCursor, wants_cursor, estimate_count, cursor_pagination_info
+    )
+except ImportError:
+    pytest.skip("Bots environment not initialized", allow_module_level=True)
+
+
+class TestCursorPaginator(TestCase):
+    """Test keyset pagination over ActivityLog"""
+    
+    def setUp(self):
+        """Create logs, several sharing a timestamp to exercise the id tie-break"""
+        base = datetime(2024, 1, 1, 12, 0, 0)
+        for i in range(25):
+            log = ActivityLog.objects.create(
+                user_type='admin',
+                user_id=1,
+                user_name='admin',
+                action='login',
+            )
+            ActivityLog.objects.filter(pk=log.pk).update(timestamp=base + timedelta(minutes=i // 3))
+        self.logs = ActivityLog.objects.all()
+        self.expected = list(self.logs.order_by('-timestamp', '-pk').values_list('pk', flat=True))
+    
+    def paginator(self, per_page=10):
+        return CursorPaginator(self.logs, per_page, ordering_field='timestamp')
+    
+    def test_first_page(self):
+        """First page has no previous cursor"""
+        page = self.paginator().page()
+        
+        self.assertEqual([log.pk for log in page], self.expected[:10])
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+    
+    def test_walk_forward(self):
+        """Following next cursors visits every row exactly once"""
+        seen = []
+        cursor = ''
+        while True:
+            page = self.paginator().page(cursor)
+            seen.extend(log.pk for log in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        
+        self.assertEqual(seen, self.expected)
+    
+    def test_walk_back(self):
+        """A prev cursor returns the preceding page in display order"""
+        first = self.paginator().page()
+        second = self.paginator().page(first.next_cursor)
+        back = self.paginator().page(second.prev_cursor)
+        
+        self.assertEqual([log.pk for log in back], self.expected[:10])
+        self.assertFalse(back.has_previous())
+        self.assertEqual(back.next_cursor, first.next_cursor)
+    
+    def test_invalid_cursor(self):
+        """Garbage tokens raise InvalidCursor"""
+        with self.assertRaises(InvalidCursor):
+            self.paginator().page('not-a-cursor')
+    
+    def test_estimated_total(self):
+        """Counts are capped and flagged as estimates past the cap"""
+        self.assertEqual(estimate_count(self.logs.filter(user_id=1)), (25, True))
+        self.assertEqual(estimate_count(self.logs.filter(user_id=1), cap=10), (10, False))
+        
+        info = cursor_pagination_info(self.paginator().page(), 10, self.logs.filter(user_id=1))
+        self.assertEqual(info['estimated_total'], 25)
+    
+    def test_wants_cursor(self):
+        """Cursor mode is opt-in via the cursor parameter"""
+        factory = RequestFactory()
+        
+        self.assertTrue(wants_cursor(factory.get('/', {'cursor': ''})))
+        self.assertFalse(wants_cursor(factory.get('/', {'page': 2})))
@@ -0,0 +1,163 @@
+"""
+Tests for the shared rate limiter
+"""
+
+import pytest
+from django.test import TestCase, RequestFactory, override_settings
+from django.core.exceptions import ImproperlyConfigured
+from unittest.mock import Mock
+import shutil
+import tempfile
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'env', 'default'))
+
+try:
+    from usersys.rate_limiter import (
+        RateLimiter, SQLiteCounterStore, CacheCounterStore, parse_rate, create_store
+    )
+    from usersys.modern_edi_middleware import RateLimitMiddleware
+except ImportError:
+    pytest.skip("Bots environment not initialized", allow_module_level=True)
+
+
+# Start of a 60 second window
+WINDOW_START = 6000
+
+
+class TestParseRate(TestCase):
+    """Test rate parsing"""
+    
+    def test_valid_rates(self):
+        """Periods, multipliers and tuples"""
+        self.assertEqual(parse_rate('60/m'), (60, 60))
+        self.assertEqual(parse_rate('100/5m'), (100, 300))
+        self.assertEqual(parse_rate('10 / H'), (10, 3600))
+        self.assertEqual(parse_rate((5, 30)), (5, 30))
+    
+    def test_invalid_rates(self):
+        """Malformed rates are configuration errors"""
+        for rate in ('/m', 'x/m', '60/', '60/w', '60', '60/m/s', (5,), ('a', 30), (-1, 60), (5, 0)):
+            with self.subTest(rate=rate):
+                with self.assertRaises(ImproperlyConfigured):
+                    parse_rate(rate)
+
+
+class TestSQLiteCounterStore(TestCase):
+    """Test the SQLite counter store"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = SQLiteCounterStore(os.path.join(self.tmpdir, 'counters', 'ratelimit.sqlite3'))
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+    
+    def test_incr(self):
+        """Counters increment independently"""
+        self.assertEqual(self.store.incr('a', 60), 1)
+        self.assertEqual(self.store.incr('a', 60), 2)
+        self.assertEqual(self.store.incr('b', 60), 1)
+        self.assertEqual(self.store.get_many(['a', 'b', 'c']), {'a': 2, 'b': 1})
+        self.assertEqual(self.store.get_many([]), {})
+    
+    def test_expired_counter_restarts(self):
+        """An expired counter is hidden and starts again at one"""
+        self.store.incr('a', -1)
+        self.assertEqual(self.store.get_many(['a']), {})
+        self.assertEqual(self.store.incr('a', 60), 1)
+
+
+class TestRateLimiter(TestCase):
+    """Test the sliding-window arithmetic with a fixed clock"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.limiter = RateLimiter(SQLiteCounterStore(os.path.join(self.tmpdir, 'ratelimit.sqlite3')))
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+    
+    def test_limit_within_window(self):
+        """Requests count down to the limit, the next waits for the window"""
+        results = [self.limiter.hit('user:1', '3/m', now=WINDOW_START) for _ in range(4)]
+        
+        self.assertEqual([r.allowed for r in results], [True, True, True, False])
+        self.assertEqual([r.remaining for r in results], [2, 1, 0, 0])
+        self.assertEqual([r.retry_after for r in results], [0, 0, 0, 90])
+        self.assertEqual(results[-1].count, 4)
+    
+    def test_previous_window_slides_out(self):
+        """The previous window counts with the weight still overlapping"""
+        for _ in range(4):
+            self.limiter.hit('user:1', '3/m', now=WINDOW_START)
+        
+        # Half way through the next window: 4 * 0.5 from the previous one
+        now = WINDOW_START + 90
+        result = self.limiter.hit('user:1', '3/m', now=now)
+        self.assertTrue(result.allowed)
+        self.assertEqual(result.remaining, 0)
+        
+        result = self.limiter.hit('user:1', '3/m', now=now)
+        self.assertFalse(result.allowed)
+        self.assertEqual(result.retry_after, 30)
+    
+    def test_keys_are_separate(self):
+        """Each key has its own budget"""
+        self.limiter.hit('user:1', '1/m', now=WINDOW_START)
+        self.assertFalse(self.limiter.hit('user:1', '1/m', now=WINDOW_START).allowed)
+        self.assertTrue(self.limiter.hit('user:2', '1/m', now=WINDOW_START).allowed)
+
+
+class TestStoreSelection(TestCase):
+    """Test RATE_LIMIT_STORE"""
+    
+    LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    SHARED = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp'}}
+    
+    def test_explicit_store(self):
+        """sqlite and cache as configured, anything else is an error"""
+        with override_settings(RATE_LIMIT_STORE='sqlite', RATE_LIMIT_SQLITE_PATH='/tmp/ratelimit.sqlite3'):
+            store = create_store()
+            self.assertIsInstance(store, SQLiteCounterStore)
+            self.assertEqual(store.path, '/tmp/ratelimit.sqlite3')
+        with override_settings(RATE_LIMIT_STORE='cache', CACHES=self.LOCMEM):
+            self.assertIsInstance(create_store(), CacheCounterStore)
+        with override_settings(RATE_LIMIT_STORE='redis'):
+            with self.assertRaises(ImproperlyConfigured):
+                create_store()
+    
+    def test_auto_avoids_process_local_cache(self):
+        """auto uses the cache only when other processes share it"""
+        with override_settings(RATE_LIMIT_STORE='auto', CACHES=self.LOCMEM):
+            self.assertIsInstance(create_store(), SQLiteCounterStore)
+        with override_settings(RATE_LIMIT_STORE='auto', CACHES=self.SHARED):
+            self.assertIsInstance(create_store(), CacheCounterStore)
+
+
+class TestRateLimitMiddleware(TestCase):
+    """Test which rate applies to a request"""
+    
+    @override_settings(
+        MODERN_EDI_RATE_LIMIT=60,
+        MODERN_EDI_RATE_LIMITS={'export': '10/m'},
+        MODERN_EDI_RATE_LIMIT_USERS={
+            'batch': {'default': '600/m'},
+            'auditor': {'export': '100/m'},
+        },
+    )
+    def test_get_rate_precedence(self):
+        """User class rate, then class rate, then user default, then default"""
+        middleware = RateLimitMiddleware(Mock())
+        request = RequestFactory().get('/modern-edi/api/')
+        
+        def rate(username, endpoint_class):
+            request.user = Mock(get_username=Mock(return_value=username))
+            return middleware.get_rate(request, endpoint_class)
+        
+        self.assertEqual(rate('auditor', 'export'), '100/m')
+        self.assertEqual(rate('batch', 'export'), '10/m')
+        self.assertEqual(rate('batch', 'upload'), '600/m')
+        self.assertEqual(rate('other', 'upload'), (60, 60))
@@ -0,0 +1,134 @@
+"""
+Tests for resumable partner uploads
+"""
+
+import pytest
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from datetime import timedelta
+from unittest.mock import patch
+import hashlib
+import shutil
+import tempfile
+import io
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'env', 'default'))
+
+try:
+    from usersys.partner_models import Partner, PartnerUser, UploadSession
+    from usersys.resumable_upload import (
+        ResumableUploadService, UploadGone, UploadOffsetMismatch, ChecksumMismatch
+    )
+except ImportError:
+    pytest.skip("Bots environment not initialized", allow_module_level=True)
+
+
+X12 = (
+    b"ISA*00*          *00*          *ZZ*SENDER         *ZZ*RECEIVER       *240101*1200*U*00401*000000001*0*P*>~"
+    b"GS*PO*SND*RCV*20240101*1200*1*X*004010~ST*850*0001~BEG*00*SA*PO-1**20240101~SE*3*0001~"
+    b"GE*1*1~IEA*1*000000001~"
+)
+
+
+class TestResumableUpload(TestCase):
+    """Test chunk appends, commit, abort and expiry"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.override = override_settings(BOTSSYS=self.tmpdir)
+        self.override.enable()
+        
+        self.partner = Partner.objects.create(partner_id='ACME', name='Acme')
+        self.user = PartnerUser.objects.create(
+            partner=self.partner,
+            username='uploader',
+            email='uploader@example.com',
+            password_hash='x',
+            first_name='Up',
+            last_name='Loader'
+        )
+        self.session = ResumableUploadService.create(self.user, 'po.edi', len(X12))
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+    
+    def append(self, offset, chunk, **kwargs):
+        return ResumableUploadService.append(
+            self.session.id, self.partner, offset, io.BytesIO(chunk), len(chunk), **kwargs
+        )
+    
+    def test_chunks_commit_transaction(self):
+        """The last chunk creates the transaction and consumes the part file"""
+        session = self.append(0, X12[:100], checksum=hashlib.sha256(X12[:100]).digest())
+        self.assertEqual(session.status, 'active')
+        self.assertEqual(session.offset, 100)
+        
+        session = self.append(100, X12[100:])
+        self.assertEqual(session.status, 'completed')
+        with open(session.transaction.file_path, 'rb') as f:
+            self.assertEqual(f.read(), X12)
+        self.assertFalse(os.path.exists(ResumableUploadService.part_path(session)))
+    
+    def test_offset_mismatch(self):
+        """A chunk for another offset reports the stored offset"""
+        self.append(0, X12[:100])
+        
+        with self.assertRaises(UploadOffsetMismatch) as cm:
+            self.append(50, X12[50:150])
+        self.assertEqual(cm.exception.offset, 100)
+    
+    def test_checksum_mismatch(self):
+        """A corrupted chunk is not stored"""
+        with self.assertRaises(ChecksumMismatch):
+            self.append(0, X12[:100], checksum=hashlib.sha256(b'other').digest())
+        
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.offset, 0)
+        self.assertEqual(os.path.getsize(ResumableUploadService.part_path(self.session)), 0)
+    
+    def test_interrupted_commit_is_retried(self):
+        """An empty chunk at the full offset finishes a staged upload"""
+        with patch.object(ResumableUploadService, 'commit', side_effect=lambda session: session):
+            session = self.append(0, X12)
+        self.assertEqual(session.status, 'active')
+        self.assertEqual(session.offset, len(X12))
+        
+        # The worker died after moving the file to staging
+        staged = ResumableUploadService.staged_path(session)
+        os.makedirs(os.path.dirname(staged), exist_ok=True)
+        os.replace(ResumableUploadService.part_path(session), staged)
+        
+        session = self.append(len(X12), b'')
+        self.assertEqual(session.status, 'completed')
+        self.assertIsNotNone(session.transaction_id)
+        self.assertFalse(os.path.exists(staged))
+    
+    def test_abort(self):
+        """An aborted upload accepts no more chunks"""
+        self.append(0, X12[:100])
+        ResumableUploadService.abort(self.session)
+        
+        self.assertFalse(os.path.exists(ResumableUploadService.part_path(self.session)))
+        with self.assertRaises(UploadGone):
+            self.append(100, X12[100:])
+    
+    def test_expire(self):
+        """Idle uploads expire with their part and staged files"""
+        staged = ResumableUploadService.staged_path(self.session)
+        os.makedirs(os.path.dirname(staged), exist_ok=True)
+        open(staged, 'wb').close()
+        fresh = ResumableUploadService.create(self.user, 'other.edi', len(X12))
+        UploadSession.objects.filter(pk=self.session.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        
+        self.assertEqual(ResumableUploadService.expire(), 1)
+        self.session.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(self.session.status, 'expired')
+        self.assertEqual(fresh.status, 'active')
+        self.assertFalse(os.path.exists(ResumableUploadService.part_path(self.session)))
+        self.assertFalse(os.path.exists(staged))
+        self.assertTrue(os.path.exists(ResumableUploadService.part_path(fresh)))
@@ -0,0 +1,89 @@
+"""
+Tests for streamed CSV/NDJSON exports
+"""
+
+import pytest
+import csv
+import gzip
+import io
+import json
+from django.test import TestCase, RequestFactory
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'env', 'default'))
+
+try:
+    from usersys.partner_models import ActivityLog
+    from usersys import streaming_export
+    from usersys.streaming_export import StreamingExporter, InvalidExportFormat, export_options
+except ImportError:
+    pytest.skip("Bots environment not initialized", allow_module_level=True)
+
+
+COLUMNS = [
+    ('user_name', 'User'),
+    ('action', 'Action'),
+    ('details', 'Details'),
+]
+
+
+class TestStreamingExporter(TestCase):
+    """Test exporting ActivityLog rows"""
+    
+    def setUp(self):
+        for i in range(50):
+            ActivityLog.objects.create(
+                user_type='admin',
+                user_id=1,
+                user_name=f'user{i}',
+                action='login',
+                details={'attempt': i} if i % 2 else {},
+            )
+        self.logs = ActivityLog.objects.order_by('pk')
+    
+    def test_csv_rows(self):
+        """CSV has a header and one row per record"""
+        body = b''.join(StreamingExporter(self.logs, COLUMNS)).decode('utf-8')
+        rows = list(csv.reader(io.StringIO(body)))
+        
+        self.assertEqual(rows[0], ['User', 'Action', 'Details'])
+        self.assertEqual(len(rows), 51)
+        self.assertEqual(rows[1], ['user0', 'login', ''])
+        self.assertEqual(json.loads(rows[2][2]), {'attempt': 1})
+    
+    def test_ndjson_gzip(self):
+        """NDJSON lines survive gzip and keep field names as keys"""
+        exporter = StreamingExporter(self.logs, COLUMNS, fmt='ndjson', compress=True)
+        lines = gzip.decompress(b''.join(exporter)).decode('utf-8').splitlines()
+        
+        self.assertEqual(len(lines), 50)
+        self.assertEqual(json.loads(lines[1]), {'user_name': 'user1', 'action': 'login', 'details': {'attempt': 1}})
+    
+    def test_output_is_chunked(self):
+        """Large exports are written in several blocks"""
+        original = streaming_export.FLUSH_BYTES
+        streaming_export.FLUSH_BYTES = 100
+        try:
+            chunks = list(StreamingExporter(self.logs, COLUMNS))
+        finally:
+            streaming_export.FLUSH_BYTES = original
+        self.assertGreater(len(chunks), 1)
+    
+    def test_response_headers(self):
+        """Compressed downloads get a .gz name and gzip content type"""
+        response = StreamingExporter(self.logs, COLUMNS, fmt='ndjson', compress=True).response('logs')
+        
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('logs.ndjson.gz', response['Content-Disposition'])
+    
+    def test_export_options(self):
+        """Unknown formats are rejected"""
+        factory = RequestFactory()
+        
+        self.assertEqual(export_options(factory.get('/')), ('csv', False))
+        self.assertEqual(export_options(factory.get('/', {'format': 'ndjson', 'compress': 'gzip'})), ('ndjson', True))
+        with self.assertRaises(InvalidExportFormat):
+            export_options(factory.get('/', {'format': 'xml'}))